@@ -0,0 +1,175 @@
+# bench/fake_openai.py
+
+import json
+import time
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt % args)
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, model, pieces):
+        """
+        Ответ chat completions в режиме stream: SSE-события с фрагментами
+        (delta.content) через token_latency секунд, затем [DONE].
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        def event(delta, finish=None):
+            chunk = {'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk',
+                     'created': int(time.time()), 'model': model,
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        event({'role': 'assistant', 'content': ''})
+        for piece in pieces:
+            time.sleep(self.server.token_latency)
+            event({'content': piece})
+        event({}, 'stop')
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _chat(self, body):
+        srv = self.server
+        req = json.loads(body or b'{}')
+        prompt = req.get('messages', [{}])[-1].get('content', '')
+        with srv.lock:
+            srv.prompts.append(prompt)
+        content = f"Summary of {len(prompt)} chars."
+        if req.get('stream'):
+            words = [content] + [f" word{i}" for i in range(srv.stream_tokens)]
+            self._send_stream(req.get('model', 'fake'), words)
+            return
+        self._send_json({
+            'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': req.get('model', 'fake'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': 5,
+                      'total_tokens': len(prompt) // 4 + 5},
+        })
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        srv = self.server
+        with srv.lock:
+            srv.requests += 1
+            srv.bytes_received += length
+
+        if self.path.endswith('/chat/completions'):
+            with srv.lock:
+                limited = srv.rate_limit > 0
+                if limited:
+                    srv.rate_limit -= 1
+                else:
+                    srv.in_flight += 1
+                    srv.max_in_flight = max(srv.max_in_flight, srv.in_flight)
+            if limited:
+                self._send_json({'error': {'message': 'Rate limit reached', 'type': 'requests',
+                                           'code': 'rate_limit_exceeded'}},
+                                status=429, headers={'Retry-After': '0'})
+                return
+            try:
+                time.sleep(srv.latency)
+                self._chat(body)
+            finally:
+                with srv.lock:
+                    srv.in_flight -= 1
+        elif self.path.endswith('/audio/transcriptions'):
+            time.sleep(srv.latency)
+            with srv.lock:
+                srv.uploads.append(length)
+            # длительность неизвестна без декодирования — отдаём один сегмент
+            self._send_json({'text': 'bench', 'language': 'ru', 'duration': 1.0,
+                             'segments': [{'id': 0, 'start': 0.0, 'end': 1.0, 'text': ' bench'}]})
+        else:
+            self._send_json({'error': {'message': f'unknown path {self.path}'}}, status=404)
+
+
+class FakeOpenAIServer:
+    """
+    Локальная заглушка OpenAI API (chat completions, audio transcriptions)
+    с настраиваемой задержкой ответа. base_url — для gpt_summary.base_url.
+    prompts — промпты полученных запросов chat completions (по порядку прихода),
+    uploads — размеры запросов audio transcriptions в байтах.
+    Запросы chat completions со stream=true получают stream_tokens
+    фрагментов с паузой token_latency между ними. Первые rate_limit
+    запросов chat completions получают 429 (Retry-After: 0);
+    max_in_flight — наибольшее число одновременно обрабатываемых.
+    """
+
+    def __init__(self, latency=0.05, host='127.0.0.1', port=0, stream_tokens=50, token_latency=0.02,
+                 rate_limit=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.latency = latency
+        self.httpd.stream_tokens = stream_tokens
+        self.httpd.token_latency = token_latency
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.httpd.bytes_received = 0
+        self.httpd.prompts = []
+        self.httpd.uploads = []
+        self.httpd.rate_limit = rate_limit
+        self.httpd.in_flight = 0
+        self.httpd.max_in_flight = 0
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def prompts(self):
+        with self.httpd.lock:
+            return list(self.httpd.prompts)
+
+    @property
+    def max_in_flight(self):
+        return self.httpd.max_in_flight
+
+    @property
+    def uploads(self):
+        with self.httpd.lock:
+            return list(self.httpd.uploads)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
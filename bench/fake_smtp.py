@@ -0,0 +1,159 @@
+# bench/fake_smtp.py
+
+import threading
+import logging
+import socketserver
+
+logger = logging.getLogger(__name__)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    Минимальный диалог SMTP: EHLO/HELO, AUTH PLAIN/LOGIN (принимается любой
+    пароль), MAIL, RCPT, DATA, RSET, NOOP, QUIT. STARTTLS не поддерживается —
+    для заглушки в настройках ставится email.starttls: false.
+    """
+
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode('utf-8'))
+
+    def _readline(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        return line.decode('utf-8', 'replace').rstrip("\r\n")
+
+    def handle(self):
+        srv = self.server
+        with srv.lock:
+            srv.connections += 1
+        self._reply("220 fake-smtp ready")
+        mail_from, rcpts = None, []
+        while True:
+            line = self._readline()
+            if line is None:
+                return
+            cmd = line.split(' ', 1)[0].upper()
+            arg = line[len(cmd):].strip()
+            if cmd == 'EHLO':
+                self._reply("250-fake-smtp")
+                self._reply("250 AUTH PLAIN LOGIN")
+            elif cmd == 'HELO':
+                self._reply("250 fake-smtp")
+            elif cmd == 'AUTH':
+                if arg.upper().startswith('LOGIN'):
+                    self._reply("334 VXNlcm5hbWU6")
+                    self._readline()
+                    self._reply("334 UGFzc3dvcmQ6")
+                    self._readline()
+                elif arg.upper() == 'PLAIN':
+                    self._reply("334 ")
+                    self._readline()
+                with srv.lock:
+                    srv.logins += 1
+                self._reply("235 Authentication successful")
+            elif cmd == 'MAIL':
+                mail_from, rcpts = arg.split(':', 1)[-1].strip('<> '), []
+                self._reply("250 OK")
+            elif cmd == 'RCPT':
+                addr = arg.split(':', 1)[-1].strip('<> ')
+                with srv.lock:
+                    deferred = srv.defer.get(addr, 0)
+                    if deferred:
+                        srv.defer[addr] = deferred - 1
+                if addr in srv.reject:
+                    self._reply("550 No such user")
+                elif deferred:
+                    self._reply("451 Try again later")
+                else:
+                    rcpts.append(addr)
+                    self._reply("250 OK")
+            elif cmd == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self._readline()
+                    if data is None or data == '.':
+                        break
+                    lines.append(data[1:] if data.startswith('..') else data)
+                with srv.lock:
+                    srv.messages.append({'from': mail_from, 'to': list(rcpts),
+                                         'data': "\n".join(lines)})
+                self._reply("250 OK queued")
+            elif cmd == 'RSET':
+                mail_from, rcpts = None, []
+                self._reply("250 OK")
+            elif cmd == 'NOOP':
+                self._reply("250 OK")
+            elif cmd == 'QUIT':
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSMTPServer:
+    """
+    Локальная заглушка SMTP-сервера для проверки рассылки.
+
+    reject — адреса, отклоняемые кодом 550; defer — {адрес: сколько раз
+    ответить 451}. Принятые письма складываются в messages, число
+    соединений и авторизаций — в connections и logins.
+    Настройки для core.email_sender: smtp=host, port=port, starttls: false.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, reject=(), defer=None):
+        self.server = _Server((host, port), _Handler)
+        self.server.lock = threading.Lock()
+        self.server.connections = 0
+        self.server.logins = 0
+        self.server.messages = []
+        self.server.reject = set(reject)
+        self.server.defer = dict(defer or {})
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def messages(self):
+        return self.server.messages
+
+    @property
+    def connections(self):
+        return self.server.connections
+
+    @property
+    def logins(self):
+        return self.server.logins
+
+    def email_config(self, **extra):
+        cfg = {'from': 'bench@example.com', 'password': 'bench', 'smtp': self.host,
+               'port': self.port, 'starttls': False}
+        cfg.update(extra)
+        return cfg
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,358 @@
+# bench/run.py
+"""
+Бенчмарк конвейера на синтетическом совещании:
+
+    python -m bench.run --minutes 10 --speakers 4 --out bench.json
+
+Каждый этап (recorder, transcribe, diarize, summary) запускается в отдельном
+процессе, чтобы пиковая память (peak_rss_mb) относилась только к нему.
+Whisper — маленькая локальная модель (--whisper-model tiny), GPT — локальная
+заглушка (bench.fake_openai). Результат — JSON для сравнения прогонов.
+
+Сравнение движков распознавания на одном и том же аудио:
+
+    python -m bench.run --stages transcribe --engines whisper,faster-whisper --threads 4
+
+Общий сервис транскрипции (пропускная способность и задержки на клипах):
+
+    python -m bench.run --stages service --clip-seconds 15 --clients 4
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+STAGES = ('recorder', 'transcribe', 'diarize', 'summary', 'service')
+
+
+def peak_rss_mb():
+    """
+    Пиковый RSS процесса в МиБ (psutil, если установлен, иначе resource).
+    """
+    try:
+        import psutil
+        mi = psutil.Process().memory_info()
+        return round(getattr(mi, 'peak_wset', mi.rss) / 2 ** 20, 1)
+    except ImportError:
+        pass
+    try:
+        import resource
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(r / 2 ** 20 if sys.platform == 'darwin' else r / 1024, 1)
+    except ImportError:
+        return None
+
+
+class _FakeInputStream:
+    """
+    Замена sd.InputStream: подаёт сигнал фикстуры в callback блоками
+    так быстро, как успевает (или в реальном времени при realtime=True).
+    """
+
+    def __init__(self, audio, blocksize, realtime, done):
+        self.audio = audio
+        self.blocksize = blocksize
+        self.realtime = realtime
+        self.done = done
+
+    def __call__(self, samplerate, channels, callback, device=None, dtype='float32'):
+        self.samplerate = samplerate
+        self.callback = callback
+        return self
+
+    def _feed(self):
+        block_time = self.blocksize / self.samplerate
+        for pos in range(0, len(self.audio), self.blocksize):
+            block = self.audio[pos:pos + self.blocksize].reshape(-1, 1)
+            self.callback(block, len(block), None, None)
+            if self.realtime:
+                time.sleep(block_time)
+        self.done.set()
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self._feed, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.thread.join()
+
+
+def stage_recorder(fixture, args, work_dir):
+    import soundfile as sf
+    from core.recorder import AudioRecorder
+
+    audio, _ = sf.read(fixture['wav'], dtype='float32')
+    rec = AudioRecorder(save_dir=os.path.join(work_dir, "rec"), capture_mode=args.capture_mode)
+    done = threading.Event()
+    rec.stream_factory = _FakeInputStream(audio, 512, args.realtime, done)
+    t0 = time.perf_counter()
+    rec.start_recording()
+    done.wait()
+    rec.stop_recording()
+    wall = time.perf_counter() - t0
+    return {'wall_seconds': wall, 'recorder_stats': rec.get_stats()}
+
+
+def stage_transcribe(fixture, args, work_dir):
+    from core.transcriber import load_engine, transcribe_reader
+    from core.audio_reader import open_wav_reader
+
+    cfg = {'transcription': {'mode': 'offline', 'model': args.whisper_model,
+                             'engine': args.engine, 'threads': args.threads,
+                             'language': 'ru', 'vad': {'enabled': args.vad}}}
+    t0 = time.perf_counter()
+    load_engine(cfg)
+    load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    segments = transcribe_reader(open_wav_reader(fixture['wav']), cfg, args.whisper_model)
+    wall = time.perf_counter() - t0
+    text = " ".join(seg['text'].strip() for seg in segments)
+    return {'wall_seconds': wall, 'model_load_seconds': load, 'segments': len(segments),
+            'engine': args.engine, 'text': text}
+
+
+def stage_diarize(fixture, args, work_dir):
+    from core.speaker_diarizer import get_encoder, identify_speakers
+
+    cfg = {'diarization': {'reference_dir': fixture['reference_dir'],
+                           'embeddings_cache': os.path.join(work_dir, "embeddings"),
+                           'method': args.diarization_method}}
+    t0 = time.perf_counter()
+    get_encoder()
+    load = time.perf_counter() - t0
+
+    runs = []
+    for _ in range(2):   # первый прогон — с расчётом эталонов, второй — из кэша
+        t0 = time.perf_counter()
+        identify_speakers(fixture['wav'], fixture['segments'], cfg)
+        runs.append(time.perf_counter() - t0)
+    return {'wall_seconds': runs[1], 'cold_seconds': runs[0], 'model_load_seconds': load,
+            'segments': len(fixture['segments'])}
+
+
+def stage_summary(fixture, args, work_dir):
+    from bench.fake_openai import FakeOpenAIServer
+    from bench.fixtures import fake_transcript
+    from core.gpt_summary import generate_summary
+
+    text = fake_transcript(fixture)
+    with FakeOpenAIServer(latency=args.gpt_latency) as server:
+        cfg = {'gpt_summary': {'enabled': True, 'api_key': 'bench', 'model': 'gpt-4',
+                               'base_url': server.base_url, 'chunk_tokens': args.chunk_tokens},
+               'summary_cache': {'enabled': False}}
+        first = []
+
+        def on_token(piece):
+            if not first:
+                first.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        generate_summary(text, cfg, on_token=on_token if args.stream else None)
+        wall = time.perf_counter() - t0
+        requests = server.requests
+    result = {'wall_seconds': wall, 'requests': requests, 'transcript_chars': len(text),
+              'segments': len(fixture['segments'])}
+    if args.stream:
+        result['first_token_seconds'] = first[0] if first else None
+    return result
+
+
+def stage_service(fixture, args, work_dir):
+    """
+    Общий сервис транскрипции на localhost: запись режется на клипы
+    по --clip-seconds, --clients клиентов отправляют их одновременно.
+    """
+    import soundfile as sf
+    from concurrent.futures import ThreadPoolExecutor
+    from core.transcription_service import make_server
+    from core.service_client import transcribe_service
+
+    audio, sr = sf.read(fixture['wav'], dtype='float32')
+    clip_len = int(args.clip_seconds * sr)
+    clip_dir = os.path.join(work_dir, "clips")
+    os.makedirs(clip_dir, exist_ok=True)
+    clips = []
+    for i, pos in enumerate(range(0, len(audio), clip_len)):
+        path = os.path.join(clip_dir, f"clip_{i:03d}.wav")
+        sf.write(path, audio[pos:pos + clip_len], sr, subtype='PCM_16')
+        clips.append(path)
+
+    cfg = {'transcription': {'mode': 'offline', 'model': args.whisper_model, 'language': 'ru',
+                             'engine': args.engines.split(",")[0].strip(),
+                             'service': {'queue_size': len(clips),
+                                         'batch_size': args.service_batch_size}},
+           'diarization': {'reference_dir': fixture['reference_dir'],
+                           'embeddings_cache': os.path.join(work_dir, "embeddings")}}
+    httpd = make_server(cfg, port=0)
+    t0 = time.perf_counter()
+    httpd.service.start()
+    load = time.perf_counter() - t0
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    host, port = httpd.server_address[:2]
+    client_cfg = {'transcription': {'mode': 'service',
+                                    'service': {'url': f"http://{host}:{port}", 'poll_seconds': 0.5}}}
+    try:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            results = list(pool.map(lambda p: transcribe_service(p, client_cfg), clips))
+        wall = time.perf_counter() - t0
+        status = httpd.service.status()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        httpd.service.stop()
+    latencies = sorted(r['latency_seconds'] for r in results)
+    return {'wall_seconds': wall, 'model_load_seconds': load, 'clips': len(clips),
+            'clips_per_second': len(clips) / wall,
+            'latency_p50': latencies[len(latencies) // 2], 'latency_max': latencies[-1],
+            'batches': status['batches'], 'batched_jobs': status['batched_jobs']}
+
+
+def _stage_worker(name, fixture, args, work_dir, out_q):
+    try:
+        result = globals()['stage_' + name](fixture, args, work_dir)
+        result['peak_rss_mb'] = peak_rss_mb()
+        out_q.put(result)
+    except Exception as e:
+        out_q.put({'error': f"{type(e).__name__}: {e}"})
+
+
+def run_stage(name, fixture, args, work_dir):
+    ctx = mp.get_context('spawn')
+    q = ctx.Queue()
+    p = ctx.Process(target=_stage_worker, args=(name, fixture, args, work_dir, q))
+    p.start()
+    result = q.get()
+    p.join()
+    if 'wall_seconds' in result:
+        result['rtf'] = result['wall_seconds'] / fixture['audio_seconds']
+        if result.get('segments'):
+            result['per_segment_ms'] = 1000 * result['wall_seconds'] / result['segments']
+    return result
+
+
+def _word_error_rate(reference, hypothesis):
+    """
+    WER hypothesis относительно reference (расстояние Левенштейна по словам).
+    """
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def compare_engines(results):
+    """
+    Сводка по движкам относительно первого: ускорение и расхождение текста
+    (WER относительно текста первого движка).
+    """
+    names = list(results)
+    base = results[names[0]]
+    summary = {'baseline': names[0]}
+    for name in names[1:]:
+        res = results[name]
+        if 'wall_seconds' not in res or 'wall_seconds' not in base:
+            continue
+        summary[name] = {
+            'speedup': round(base['wall_seconds'] / res['wall_seconds'], 2),
+            'wer_vs_baseline': round(_word_error_rate(base.get('text', ''), res.get('text', '')), 3),
+        }
+    return summary
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера Виртуального Секретаря")
+    parser.add_argument('--minutes', type=float, default=5.0)
+    parser.add_argument('--speakers', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', default=",".join(STAGES[:4]))
+    parser.add_argument('--whisper-model', default='tiny')
+    parser.add_argument('--engines', default='whisper',
+                        help="движки распознавания через запятую: whisper,faster-whisper")
+    parser.add_argument('--threads', type=int, default=0, help="потоки движка (0 — по умолчанию)")
+    parser.add_argument('--vad', action='store_true')
+    parser.add_argument('--diarization-method', default='segments', choices=['segments', 'windows'])
+    parser.add_argument('--capture-mode', default='ring', choices=['ring', 'queue'])
+    parser.add_argument('--realtime', action='store_true', help="подавать звук в реальном времени")
+    parser.add_argument('--gpt-latency', type=float, default=0.2)
+    parser.add_argument('--chunk-tokens', type=int, default=6000)
+    parser.add_argument('--stream', action='store_true', help="потоковая выжимка (время до первого токена)")
+    parser.add_argument('--clip-seconds', type=float, default=15.0, help="service: длина клипа")
+    parser.add_argument('--clients', type=int, default=4, help="service: одновременных клиентов")
+    parser.add_argument('--service-batch-size', type=int, default=8, help="service: клипов в одном прогоне")
+    parser.add_argument('--work-dir', help="папка фикстур (по умолчанию временная)")
+    parser.add_argument('--out', help="файл JSON с результатами (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    from bench.fixtures import make_meeting
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="secretary_bench_")
+    fixture = make_meeting(os.path.join(work_dir, "fixture"), args.minutes, args.speakers, seed=args.seed)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'fixture': {k: fixture[k] for k in ('audio_seconds', 'speakers', 'seed')},
+        'stages': {},
+    }
+    report['fixture']['segments'] = len(fixture['segments'])
+
+    for name in args.stages.split(","):
+        name = name.strip()
+        if name not in STAGES:
+            parser.error(f"unknown stage: {name}")
+        if name != 'transcribe':
+            print(f"[bench] {name}...", file=sys.stderr)
+            report['stages'][name] = run_stage(name, fixture, args, work_dir)
+            continue
+        engines = [e.strip() for e in args.engines.split(",")]
+        for engine in engines:
+            key = name if len(engines) == 1 else f"{name}[{engine}]"
+            print(f"[bench] {key}...", file=sys.stderr)
+            report['stages'][key] = run_stage(name, fixture, argparse.Namespace(**vars(args), engine=engine), work_dir)
+        if len(engines) > 1:
+            report['engines'] = compare_engines({e: report['stages'][f"{name}[{e}]"] for e in engines})
+        for engine in engines:   # текст нужен только для сравнения
+            report['stages'][name if len(engines) == 1 else f"{name}[{engine}]"].pop('text', None)
+
+    out = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(out)
+    else:
+        print(out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
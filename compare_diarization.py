@@ -0,0 +1,38 @@
+# Сравнение скорости диаризации: эмбеддинг каждого сегмента по отдельности
+# (исходный цикл), пакетный embed_segments и один проход скользящим окном.
+#   python compare_diarization.py recordings/meeting.wav
+import sys
+import time
+from core.config_loader import load_config
+from core.transcriber import transcribe_array
+from core.speaker_diarizer import (
+    get_encoder, open_audio, embed_segments, compute_window_embeddings, segment_fields,
+)
+
+cfg = load_config('config/settings.yaml')
+path = sys.argv[1]
+audio = open_audio(path)
+segments = [segment_fields(s) for s in transcribe_array(audio[0:len(audio)], cfg)]
+bounds = [(start, end) for start, end, _ in segments]
+encoder = get_encoder()
+
+# Исходный подход: отдельный embed_utterance на каждый сегмент
+t0 = time.perf_counter()
+for start, end in bounds:
+    seg = audio[int(start * 16000):int(end * 16000)]
+    if len(seg):
+        encoder.embed_utterance(seg)
+t_segments = time.perf_counter() - t0
+
+t0 = time.perf_counter()
+embed_segments(encoder, audio, bounds, batch_size=cfg.get('diarization', {}).get('embed_batch_size', 32))
+t_batched = time.perf_counter() - t0
+
+t0 = time.perf_counter()
+compute_window_embeddings(audio, cfg).segment_embeddings(bounds)
+t_windows = time.perf_counter() - t0
+
+print(f"Audio: {len(audio) / 16000:.0f}s, segments: {len(bounds)}")
+print(f"Per-segment embeddings (baseline): {t_segments:.2f}s")
+print(f"Batched per-segment embeddings: {t_batched:.2f}s ({t_segments / t_batched:.2f}x)")
+print(f"Sliding-window embeddings: {t_windows:.2f}s ({t_segments / t_windows:.2f}x)")
@@ -0,0 +1,134 @@
+# core/audio_reader.py
+
+import struct
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def quietest_point(window, sr, frame_seconds=0.03):
+    """
+    Середина самого тихого (по RMS) кадра окна, в сэмплах от начала окна.
+    """
+    if window.ndim > 1:
+        window = window.mean(axis=1)
+    frame = max(1, int(frame_seconds * sr))
+    n_frames = len(window) // frame
+    if n_frames == 0:
+        return len(window) // 2
+    energy = np.mean(window[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1)
+    return int(np.argmin(energy)) * frame + frame // 2
+
+
+def _parse_wav_header(path):
+    """
+    Разбирает RIFF-заголовок; возвращает (samplerate, channels, bits,
+    смещение данных, размер данных) или None, если это не PCM WAV.
+    """
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            return None
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            chunk_id, size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                data = f.read(size)
+                tag, channels, sr, _, _, bits = struct.unpack('<HHIIHH', data[:16])
+                if tag == WAVE_FORMAT_EXTENSIBLE and len(data) >= 26:
+                    tag = struct.unpack('<H', data[24:26])[0]
+                fmt = (tag, channels, sr, bits)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    return None
+                tag, channels, sr, bits = fmt
+                if tag != WAVE_FORMAT_PCM:
+                    return None
+                return sr, channels, bits, f.tell(), size
+            else:
+                f.seek(size + (size & 1), 1)
+
+
+class WavReader:
+    """
+    Чтение PCM_16 WAV без загрузки в память: данные отображаются через
+    np.memmap, наружу отдаются окна моно float32.
+
+    Поддерживает len() и срезы (reader[a:b] -> np.ndarray float32), поэтому
+    может подставляться вместо массива сигнала, например в embed_segments.
+    """
+
+    ndim = 1   # наружу всегда отдаётся моно
+
+    def __init__(self, path, samplerate, channels, data_offset, data_size):
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        # размер 0 / 0xFFFFFFFF — файл ещё пишется; берём всё до конца файла
+        frames = data_size // (2 * channels)
+        self._data = np.memmap(path, dtype='<i2', mode='r', offset=data_offset)
+        usable = len(self._data) // channels
+        if data_size in (0, 0xFFFFFFFF) or frames > usable:
+            frames = usable
+        self.frames = frames
+        self._data = self._data[:frames * channels].reshape(frames, channels)
+
+    @property
+    def duration(self):
+        return self.frames / self.samplerate
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("WavReader supports only slices")
+        block = self._data[index]
+        if self.channels > 1:
+            return (block.mean(axis=1) / 32768.0).astype(np.float32)
+        return block[:, 0].astype(np.float32) / np.float32(32768.0)
+
+    def windows(self, max_seconds=300.0, search_seconds=30.0):
+        """
+        Последовательные окна не длиннее max_seconds; граница ставится
+        в самом тихом месте последних search_seconds окна.
+        Генерирует (начало в сэмплах, сигнал окна).
+        """
+        max_len = int(max_seconds * self.samplerate)
+        search = min(int(search_seconds * self.samplerate), max_len // 2)
+        pos = 0
+        while pos < self.frames:
+            end = min(self.frames, pos + max_len)
+            if end < self.frames:
+                tail = self[end - search:end]
+                end = end - search + quietest_point(tail, self.samplerate)
+            yield pos, self[pos:end]
+            pos = end
+
+    def close(self):
+        self._data = None
+
+
+def open_wav_reader(path):
+    """
+    Открывает WavReader для PCM_16 WAV; для других форматов возвращает None
+    (тогда используется обычное чтение целиком).
+    """
+    try:
+        info = _parse_wav_header(path)
+    except (OSError, struct.error) as e:
+        logger.warning(f"Cannot parse WAV header of {path}: {e}")
+        return None
+    if info is None:
+        return None
+    sr, channels, bits, offset, size = info
+    if bits != 16:
+        return None
+    return WavReader(path, sr, channels, offset, size)
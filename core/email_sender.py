@@ -1,22 +1,366 @@
 #old
+import json
+import time
+import heapq
 import smtplib
+import itertools
+import threading
 from email.mime.text import MIMEText
 import logging
+from core import metrics
 
 logger = logging.getLogger(__name__)
 
-def send_report_email(recipients, text, config):
-    ec = config.get('email', {})
-    sender, pwd, srv = ec.get('from'), ec.get('password'), ec.get('smtp')
-    port = ec.get('port',587); subj = ec.get('subject','Meeting Protocol')
-    if not all([sender,pwd,srv]):
-        logger.error('Email config incomplete')
-        raise ValueError('Email settings missing')
-    msg = MIMEText(text,'plain','utf-8')
-    msg['Subject'], msg['From'], msg['To'] = subj, sender, ','.join(recipients)
+RECIPIENTS_PATH = 'config/recipients.json'
+
+
+def load_recipients(path=RECIPIENTS_PATH):
+    """
+    Читает config/recipients.json: список {name, email, groups}.
+    """
     try:
-        with smtplib.SMTP(srv, port) as s:
-            s.starttls(); s.login(sender,pwd); s.sendmail(sender, recipients, msg.as_string())
-        logger.info('Email sent')
-    except Exception as e:
-        logger.error(f'Failed to send email: {e}')
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f) or []
+    except FileNotFoundError:
+        logger.error(f"Recipients file not found at: {path}")
+    except json.JSONDecodeError as e:
+        logger.error(f"Recipients file is invalid: {e}")
+    return []
+
+
+def group_recipients(groups, recipients, known_groups=None):
+    """
+    Адреса по группам: {группа: [email, ...]}. Адрес, входящий в несколько
+    выбранных групп, попадает только в первую из них (одно письмо на адрес).
+    known_groups — список email_groups из настроек; неизвестные группы
+    пропускаются с предупреждением.
+    """
+    result, seen = {}, set()
+    for group in groups:
+        if known_groups is not None and group not in known_groups:
+            logger.warning(f"Unknown email group: {group}")
+            continue
+        emails = []
+        for r in recipients:
+            email = r.get('email')
+            if email and group in r.get('groups', []) and email not in seen:
+                seen.add(email)
+                emails.append(email)
+        if emails:
+            result[group] = emails
+    return result
+
+
+def _is_transient(error):
+    """
+    Временная ли ошибка: обрыв соединения, сетевые ошибки и ответы 4xx
+    повторяются, 5xx (адрес отклонён, ошибка авторизации) — нет.
+    """
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # SMTPException — подкласс OSError: прочие ошибки протокола не повторяем
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class EmailDeliveryQueue:
+    """
+    Очередь рассылки протоколов.
+
+    Один фоновый поток держит одно авторизованное SMTP-соединение
+    (STARTTLS и login выполняются один раз) и отправляет через него пачки
+    писем. Пачка — одно письмо не более чем batch_size получателям.
+    Временные ошибки повторяются с экспоненциальной задержкой,
+    после idle_timeout секунд простоя соединение закрывается.
+
+    Статус по каждому адресу — в status(): queued | retrying | sent | failed.
+    """
+
+    def __init__(self, config):
+        ec = config.get('email', {})
+        self.sender = ec.get('from')
+        self.password = ec.get('password')
+        self.server = ec.get('smtp')
+        self.port = ec.get('port', 587)
+        self.subject = ec.get('subject', 'Meeting Protocol')
+        self.use_ssl = ec.get('ssl', False)
+        self.starttls = ec.get('starttls', not self.use_ssl)
+        self.login = ec.get('login', True)
+        self.timeout = ec.get('timeout', 30)
+        self.batch_size = max(1, int(ec.get('batch_size', 50)))
+        self.max_retries = ec.get('max_retries', 3)
+        self.base_delay = ec.get('retry_base_delay', 2.0)
+        self.idle_timeout = ec.get('idle_timeout', 60)
+        self.known_groups = config.get('email_groups')
+        if not all([self.sender, self.server]) or (self.login and not self.password):
+            logger.error('Email config incomplete')
+            raise ValueError('Email settings missing')
+
+        self._smtp = None
+        self._last_used = 0.0
+        self._pending = []          # heap: (время готовности, номер, пачка)
+        self._ids = itertools.count(1)
+        self._unfinished = 0
+        self._status = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name="email", daemon=True)
+        self._thread.start()
+
+    # --- постановка в очередь ---
+
+    def enqueue(self, recipients, text, subject=None, group=None):
+        """
+        Ставит письмо в очередь, разбивая получателей на пачки.
+        Возвращает список номеров пачек.
+        """
+        subject = subject or self.subject
+        ids = []
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Email queue is closed')
+            for i in range(0, len(recipients), self.batch_size):
+                batch = {
+                    'id': next(self._ids),
+                    'recipients': list(recipients[i:i + self.batch_size]),
+                    'text': text,
+                    'subject': subject,
+                    'group': group,
+                    'attempts': 0,
+                }
+                for email in batch['recipients']:
+                    self._status[email] = {'status': 'queued', 'group': group,
+                                           'attempts': 0, 'error': None}
+                heapq.heappush(self._pending, (time.monotonic(), batch['id'], batch))
+                self._unfinished += 1
+                ids.append(batch['id'])
+            self._cond.notify_all()
+        return ids
+
+    def send_to_groups(self, groups, text, subject=None, recipients=None):
+        """
+        Рассылка по группам из recipients.json: отдельные пачки на каждую
+        группу. Возвращает {группа: [адреса]} фактически поставленных в очередь.
+        """
+        if recipients is None:
+            recipients = load_recipients()
+        by_group = group_recipients(groups, recipients, self.known_groups)
+        for group, emails in by_group.items():
+            self.enqueue(emails, text, subject=subject, group=group)
+        logger.info(f"Queued email to {sum(map(len, by_group.values()))} recipients "
+                    f"in {len(by_group)} groups")
+        return by_group
+
+    # --- состояние ---
+
+    def status(self):
+        """
+        Копия статусов: {email: {status, group, attempts, error}}.
+        """
+        with self._cond:
+            return {email: dict(st) for email, st in self._status.items()}
+
+    def wait(self, timeout=None):
+        """
+        Ждёт завершения всех поставленных пачек. True — если всё обработано.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._unfinished:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def close(self, wait=True, timeout=None):
+        if wait:
+            self.wait(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    # --- соединение ---
+
+    def _connect(self):
+        if self._smtp is not None:
+            return self._smtp
+        with metrics.span('smtp_connect', server=self.server, port=self.port):
+            cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+            smtp = cls(self.server, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    smtp.starttls()
+                if self.login:
+                    smtp.login(self.sender, self.password)
+            except Exception:
+                smtp.close()
+                raise
+        self._smtp = smtp
+        logger.info(f"SMTP connection opened: {self.server}:{self.port}")
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+        logger.info("SMTP connection closed")
+
+    def _drop_connection(self):
+        """
+        Закрывает сокет соединения в неизвестном состоянии (без QUIT);
+        следующая пачка откроет новое соединение.
+        """
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.close()
+        except OSError:
+            pass
+        self._smtp = None
+        logger.info("SMTP connection dropped")
+
+    # --- фоновый поток ---
+
+    def _next_batch(self):
+        """
+        Следующая готовая пачка или None при закрытии очереди. Пока ждёт,
+        закрывает простаивающее соединение.
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._pending and self._pending[0][0] <= now:
+                    return heapq.heappop(self._pending)[2]
+                if self._closed and not self._pending:
+                    return None
+                if self._smtp is not None and now - self._last_used >= self.idle_timeout:
+                    timeout = 0
+                elif self._pending:
+                    timeout = self._pending[0][0] - now
+                elif self._smtp is not None:
+                    timeout = self.idle_timeout - (now - self._last_used)
+                else:
+                    timeout = None
+                if timeout == 0:
+                    break
+                self._cond.wait(timeout)
+        self._disconnect()
+        return self._next_batch()
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                self._disconnect()
+                return
+            self._deliver(batch)
+
+    def _deliver(self, batch):
+        batch['attempts'] += 1
+        msg = MIMEText(batch['text'], 'plain', 'utf-8')
+        msg['Subject'], msg['From'] = batch['subject'], self.sender
+        msg['To'] = ','.join(batch['recipients'])
+        try:
+            with metrics.span('send_email', recipients=len(batch['recipients']),
+                              chars=len(batch['text']), group=batch['group'],
+                              attempt=batch['attempts']):
+                smtp = self._connect()
+                refused = smtp.sendmail(self.sender, batch['recipients'], msg.as_string())
+            self._last_used = time.monotonic()
+        except smtplib.SMTPRecipientsRefused as e:
+            # отказ по всем адресам — разбираем так же, как частичный
+            refused = e.recipients
+        except Exception as e:
+            # после ответа сервера (кроме 421) соединение пригодно: smtplib уже
+            # сбросил транзакцию (RSET); обрыв и сетевые ошибки — закрываем сокет
+            if not isinstance(e, smtplib.SMTPResponseException) or e.smtp_code == 421:
+                self._drop_connection()
+            self._retry_or_fail(batch, batch['recipients'], e)
+            return
+
+        # частичный отказ: sendmail вернул {адрес: (код, ответ)}
+        sent = [r for r in batch['recipients'] if r not in refused]
+        self._finish(sent, 'sent', batch)
+        if sent:
+            logger.info(f"Email sent to {len(sent)} recipients (group {batch['group']})")
+        transient = [r for r, (code, _) in refused.items() if 400 <= code < 500]
+        permanent = [r for r in refused if r not in transient]
+        for r in permanent:
+            logger.error(f"Recipient refused: {r} {refused[r]}")
+        self._finish(permanent, 'failed', batch, refused=refused)
+        if transient:
+            self._retry_or_fail(batch, transient, smtplib.SMTPRecipientsRefused(
+                {r: refused[r] for r in transient}))
+        else:
+            self._done()
+
+    def _retry_or_fail(self, batch, recipients, error):
+        """
+        Повторяет пачку (для recipients) с задержкой base_delay * 2^(n-1)
+        либо помечает адреса как failed и завершает её.
+        """
+        if _is_transient(error) and batch['attempts'] <= self.max_retries:
+            delay = self.base_delay * (2 ** (batch['attempts'] - 1))
+            logger.warning(f"Email to {len(recipients)} recipients failed ({error}), "
+                           f"retry {batch['attempts']}/{self.max_retries} in {delay:.1f}s")
+            retry = dict(batch, recipients=list(recipients))
+            with self._cond:
+                for r in recipients:
+                    self._status[r].update(status='retrying', attempts=batch['attempts'],
+                                           error=str(error))
+                heapq.heappush(self._pending, (time.monotonic() + delay, retry['id'], retry))
+                self._cond.notify_all()
+            return
+        logger.error(f"Failed to send email to {len(recipients)} recipients: {error}")
+        self._finish(recipients, 'failed', batch, error=error)
+        self._done()
+
+    def _finish(self, recipients, status, batch, refused=None, error=None):
+        with self._cond:
+            for r in recipients:
+                reason = refused.get(r) if refused else error
+                self._status[r].update(status=status, attempts=batch['attempts'],
+                                       error=None if reason is None else str(reason))
+
+    def _done(self):
+        with self._cond:
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_delivery_queue(config):
+    """
+    Общая очередь рассылки процесса (одно соединение на все отправки).
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None or _queue._closed:
+            _queue = EmailDeliveryQueue(config)
+        return _queue
+
+
+def send_report_email(recipients, text, config, wait=True):
+    """
+    Отправляет протокол через общую очередь. При wait=True дожидается
+    доставки и возвращает статусы по адресам {email: status}.
+    """
+    queue = get_delivery_queue(config)
+    queue.enqueue(list(recipients), text)
+    if not wait:
+        return None
+    queue.wait()
+    statuses = queue.status()
+    return {r: statuses[r]['status'] for r in recipients}
@@ -0,0 +1,175 @@
+# core/embedding_store.py
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+
+
+def file_sha1(path, block_size=1 << 20):
+    """
+    Считает SHA-1 содержимого файла блоками (без чтения целиком в память).
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(block_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ReferenceEmbeddingStore:
+    """
+    Дисковый кэш эмбеддингов эталонных голосов из reference_voices/.
+
+    Хранит:
+      - <cache>.npy  — матрицу эмбеддингов (N x D, float32), читается через mmap;
+      - <cache>.json — манифест: файл, имя, размер, mtime, sha1 и номер строки.
+
+    При обновлении пересчитываются только новые или изменённые файлы.
+    refresh() можно звать из нескольких потоков (прогрев и задания): обновления
+    идут по очереди, а имена и матрица подменяются одним присваиванием.
+    """
+
+    def __init__(self, reference_dir="reference_voices", cache_path=None):
+        self.reference_dir = reference_dir
+        if cache_path is None:
+            cache_path = os.path.join(reference_dir, ".embeddings")
+        cache_path = os.path.splitext(cache_path)[0]
+        self.matrix_path = cache_path + ".npy"
+        self.manifest_path = cache_path + ".json"
+        self._snapshot = ([], np.zeros((0, 0), dtype=np.float32))
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def names(self):
+        return self._snapshot[0]
+
+    @property
+    def matrix(self):
+        return self._snapshot[1]
+
+    def snapshot(self):
+        """
+        Согласованная пара (names, matrix) на момент вызова.
+        """
+        return self._snapshot
+
+    # --- чтение/запись кэша ---
+
+    def _load_cache(self):
+        if not (os.path.exists(self.manifest_path) and os.path.exists(self.matrix_path)):
+            return {}, None
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != STORE_VERSION:
+                logger.info("Embedding cache version mismatch, rebuilding")
+                return {}, None
+            matrix = np.load(self.matrix_path, mmap_mode='r')
+            entries = {e['file']: e for e in manifest.get('entries', [])}
+            return entries, matrix
+        except Exception as e:
+            logger.warning(f"Embedding cache is unreadable, rebuilding: {e}")
+            return {}, None
+
+    def _save_cache(self, entries, matrix):
+        manifest = {'version': STORE_VERSION, 'entries': entries}
+        tmp_matrix = self.matrix_path + ".tmp.npy"
+        tmp_manifest = self.manifest_path + ".tmp"
+        try:
+            np.save(tmp_matrix, matrix)
+            with open(tmp_manifest, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_matrix, self.matrix_path)
+            os.replace(tmp_manifest, self.manifest_path)
+        except OSError as e:
+            logger.warning(f"Failed to save embedding cache: {e}")
+
+    # --- синхронизация с папкой ---
+
+    def refresh(self, embed_fn):
+        """
+        Сверяет кэш с содержимым reference_dir и пересчитывает эмбеддинги
+        только для новых/изменённых файлов.
+
+        embed_fn(path) -> np.ndarray — функция расчёта эмбеддинга файла.
+        Возвращает количество пересчитанных файлов.
+        """
+        with self._lock:
+            return self._refresh(embed_fn)
+
+    def _refresh(self, embed_fn):
+        if not os.path.isdir(self.reference_dir):
+            logger.warning(f"Reference directory not found: {self.reference_dir}")
+            self._entries = {}
+            self._snapshot = ([], np.zeros((0, 0), dtype=np.float32))
+            return 0
+
+        cached, cached_matrix = self._load_cache()
+        entries, rows = [], []
+        recomputed = 0
+        changed = False
+
+        for filename in sorted(os.listdir(self.reference_dir)):
+            if not filename.endswith(".wav"):
+                continue
+            path = os.path.join(self.reference_dir, filename)
+            st = os.stat(path)
+            entry = {
+                'file': filename,
+                'name': filename.replace(".wav", "").replace("_", " "),
+                'size': st.st_size,
+                'mtime': st.st_mtime,
+            }
+            old = cached.get(filename)
+            embed = None
+            if old is not None and cached_matrix is not None and old['row'] < len(cached_matrix):
+                # копия строки, а не вид на mmap: файл матрицы перезаписывается ниже
+                if old['size'] == entry['size'] and old['mtime'] == entry['mtime']:
+                    entry['sha1'] = old['sha1']
+                    embed = np.array(cached_matrix[old['row']])
+                else:
+                    entry['sha1'] = file_sha1(path)
+                    if entry['sha1'] == old['sha1']:
+                        embed = np.array(cached_matrix[old['row']])
+                    changed = True
+            else:
+                entry['sha1'] = file_sha1(path)
+                changed = True
+
+            if embed is None:
+                logger.info(f"Embedding reference voice: {filename}")
+                embed = embed_fn(path)
+                recomputed += 1
+
+            entry['row'] = len(rows)
+            entries.append(entry)
+            rows.append(np.asarray(embed, dtype=np.float32))
+
+        if len(entries) != len(cached):
+            changed = True
+        # закрываем mmap до os.replace(): на Windows замена открытого файла не удаётся
+        del cached_matrix
+
+        matrix = np.stack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+        if changed:
+            self._save_cache(entries, matrix)
+
+        self._snapshot = ([e['name'] for e in entries], matrix)
+        self._entries = {e['file']: e for e in entries}
+        logger.info(f"Reference embeddings ready: {len(entries)} voices, {recomputed} recomputed")
+        return recomputed
+
+    def as_dict(self):
+        names, matrix = self._snapshot
+        return {name: matrix[i] for i, name in enumerate(names)}
@@ -1,8 +1,14 @@
 # core/gpt_summary.py
 
 import os
-from openai import OpenAI
+import re
+import time
+import random
+import zlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from core.summary_cache import get_summary_cache
+from core import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -24,13 +30,248 @@ def get_api_key_env(config_section: dict, default_env: str = "OPENAI_API_KEY") -
         return os.getenv(config_section["api_key_env"], "")
     return os.getenv(default_env, "")
 
-def generate_summary(transcript_text: str, config: dict, prompt_text: str = None) -> str:
+SYSTEM_PROMPT = 'Assistant for meeting analysis.'
+# Номер части в промпт не входит: иначе кэш частей сбрасывался бы при любом
+# изменении их количества
+MAP_PROMPT = (
+    "This is a fragment of a meeting transcript. "
+    "Summarize it concisely, keeping all decisions, tasks, owners and deadlines, "
+    "and who said what:\n\n{chunk}"
+)
+REDUCE_NOTE = "Below are summaries of consecutive parts of one meeting, in order.\n\n"
+
+# openai и tiktoken импортируются при первом вызове, чтобы не замедлять старт GUI
+_tiktoken = None
+
+def _retryable_errors():
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+    )
+
+def _get_tiktoken():
+    global _tiktoken
+    if _tiktoken is None:
+        try:
+            import tiktoken
+            _tiktoken = tiktoken
+        except ImportError:
+            _tiktoken = False
+    return _tiktoken
+
+_SPEAKER_RE = re.compile(r'^(?:\[[\d:]+\]\s*)?([^:\n]{1,60}):')
+
+def estimate_tokens(text: str, model: str = None) -> int:
+    """
+    Оценка числа токенов: через tiktoken, если установлен, иначе грубо по символам.
+    """
+    tiktoken = _get_tiktoken()
+    if tiktoken:
+        try:
+            enc = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except KeyError:
+            enc = tiktoken.get_encoding("cl100k_base")
+        return len(enc.encode(text))
+    return len(text) // 3 + 1
+
+def split_transcript(transcript_text: str, max_tokens: int, model: str = None) -> list:
+    """
+    Делит стенограмму на части не больше max_tokens, разрезая по границам
+    реплик (смена говорящего). Реплика длиннее бюджета режется по строкам.
+
+    После заполнения половины бюджета часть закрывается на «якорной» реплике
+    (определяется по хешу её текста), поэтому правка в одном месте сдвигает
+    границы только соседних частей — остальные части совпадают с прежними
+    и берутся из кэша выжимок.
+    """
+    turns = []
+    current_speaker = None
+    for line in transcript_text.splitlines():
+        m = _SPEAKER_RE.match(line)
+        speaker = m.group(1).strip() if m else current_speaker
+        if turns and speaker == current_speaker:
+            turns[-1].append(line)
+        else:
+            turns.append([line])
+        current_speaker = speaker
+
+    chunks, cur, cur_tokens = [], [], 0
+    for turn in turns:
+        pieces = ["\n".join(turn)]
+        if estimate_tokens(pieces[0], model) > max_tokens:
+            pieces = turn
+        for piece in pieces:
+            n = estimate_tokens(piece, model)
+            if cur and cur_tokens + n > max_tokens:
+                chunks.append("\n".join(cur))
+                cur, cur_tokens = [], 0
+            cur.append(piece)
+            cur_tokens += n
+            if cur_tokens >= max_tokens // 2 and zlib.crc32(piece.encode('utf-8')) % 4 == 0:
+                chunks.append("\n".join(cur))
+                cur, cur_tokens = [], 0
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
+def _retry_delay(error, attempt, base_delay):
+    """
+    Задержка перед повтором: Retry-After из ответа, если есть, иначе
+    экспоненциальный рост с джиттером.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return base_delay * (2 ** attempt) * (0.5 + random.random())
+
+def _chat(client, model, prompt, temperature, max_retries=5, base_delay=1.0, cache=None,
+          on_token=None):
+    """
+    Один запрос chat completions с повторами при rate limit и сетевых ошибках.
+    Если передан cache (SummaryCache), ответ сначала ищется в нём.
+
+    on_token(text) — потоковый режим (stream=True): фрагменты ответа
+    передаются по мере генерации; время до первого фрагмента и общее
+    время пишутся в метрики. Повтор возможен, только пока ничего не выдано.
+    """
+    if cache is not None:
+        key = cache.make_key(SYSTEM_PROMPT, prompt, model, temperature)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info("GPT summary cache hit")
+            metrics.count('summary_cache_hit')
+            if on_token is not None:
+                on_token(cached)
+            return cached
+
+    for attempt in range(max_retries + 1):
+        emitted = False
+        try:
+            with metrics.span('gpt_request', model=model, attempt=attempt,
+                              prompt_chars=len(prompt), stream=on_token is not None) as m:
+                t0 = time.perf_counter()
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {'role': 'system', 'content': SYSTEM_PROMPT},
+                        {'role': 'user', 'content': prompt}
+                    ],
+                    temperature=temperature,
+                    stream=on_token is not None
+                )
+                if on_token is None:
+                    content = response.choices[0].message.content.strip()
+                else:
+                    parts = []
+                    for chunk in response:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if not delta:
+                            continue
+                        if not parts:
+                            m['first_token_seconds'] = round(time.perf_counter() - t0, 3)
+                        parts.append(delta)
+                        emitted = True
+                        on_token(delta)
+                    m['chunks'] = len(parts)
+                    content = "".join(parts).strip()
+                    logger.info(f"GPT stream: first token after {m.get('first_token_seconds', 0):.2f}s, "
+                                f"total {time.perf_counter() - t0:.2f}s, {len(parts)} chunks")
+            if cache is not None:
+                cache.put(key, content)
+            return content
+        except _retryable_errors() as e:
+            if attempt == max_retries or emitted:
+                raise
+            delay = _retry_delay(e, attempt, base_delay)
+            logger.warning(f"GPT request failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+class _WriteOnlyCache:
+    """
+    Обёртка кэша для режима обхода: чтение всегда промах, запись — как обычно.
+    """
+
+    def __init__(self, cache):
+        self._cache = cache
+        self.make_key = cache.make_key
+        self.put = cache.put
+
+    def get(self, key):
+        return None
+
+def _resolve_prompt(transcript_text, template, prompt_text=None):
+    # 1) Выбираем, какой текст использовать в качестве промпта:
+    if prompt_text:
+        # если передан из GUI (выбран пользователем в Combobox), используем его
+        logger.info(f"Using custom prompt from GUI.")
+        return prompt_text.replace('{{ transcript }}', transcript_text)
+    elif template:
+        # если в конфиге есть prompt_template, подставляем в него {{ transcript }}
+        logger.info(f"Using prompt template from config.")
+        return template.replace('{{ transcript }}', transcript_text)
+    else:
+        # дефолтный минимальный промпт
+        logger.info(f"Using default prompt.")
+        return "Analyze meeting transcript and output summary with tasks: " + transcript_text
+
+def _summarize_chunked(client, chunks, gs, model, temp, template, prompt_text, cache=None,
+                       on_token=None):
+    """
+    Map-reduce: части стенограммы суммируются параллельно (пул потоков
+    на gpt_summary.max_concurrency запросов), затем выбранный промпт
+    применяется к объединённым частичным выжимкам. В потоковом режиме
+    (on_token) выдаётся только итоговый шаг.
+    """
+    retries = gs.get('max_retries', 5)
+    base_delay = gs.get('retry_base_delay', 1.0)
+    workers = max(1, min(gs.get('max_concurrency', 4), len(chunks)))
+    logger.info(f"Chunked summary: {len(chunks)} parts, {workers} concurrent requests")
+
+    def summarize_part(chunk):
+        return _chat(client, model, MAP_PROMPT.format(chunk=chunk), temp,
+                     retries, base_delay, cache)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        partials = list(pool.map(summarize_part, chunks))
+
+    combined = REDUCE_NOTE + "\n\n".join(
+        f"--- Part {i + 1} ---\n{p}" for i, p in enumerate(partials))
+    prompt = _resolve_prompt(combined, template, prompt_text)
+    return _chat(client, model, prompt, temp, retries, base_delay, cache, on_token)
+
+def is_summary_error(summary: str) -> bool:
+    """
+    True, если generate_summary вернула текст ошибки вместо выжимки
+    ('[Error in GPT: ...]', '[Missing API key]').
+    """
+    return summary.startswith('[Error in GPT:') or summary == '[Missing API key]'
+
+def generate_summary(transcript_text: str, config: dict, prompt_text: str = None,
+                     use_cache: bool = True, on_token=None) -> str:
     """
     Генерирует выжимку из готовой стенограммы (transcript_text) с учётом:
       - выбранного в GUI текстового промпта (prompt_text);
       - если prompt_text не передан, берёт prompt_template из конфига;
       - если и там пусто, используется дефолтный промпт.
 
+    Длинные стенограммы (больше gpt_summary.chunk_tokens) обрабатываются
+    по схеме map-reduce; режим задаётся gpt_summary.chunked: auto | true | false.
+
+    Ответы кэшируются (секция summary_cache); use_cache=False — запрос мимо кэша
+    (новый ответ всё равно сохраняется в кэш).
+
+    on_token(text) — потоковый режим: фрагменты итогового ответа передаются
+    по мере генерации (вызывается из потока запроса). Выключается
+    gpt_summary.stream: false.
+
     Возвращает строку с итоговым текстом выжимки.
     """
     global _client
@@ -48,37 +289,35 @@ def generate_summary(transcript_text: str, config: dict, prompt_text: str = None
         return '[Missing API key]'
 
     # Инициализируем или обновляем клиента
-    if _client is None:
-        _client = OpenAI(api_key=api_key)
+    from openai import OpenAI
+    base_url = gs.get('base_url')
+    if _client is None or (base_url and str(_client.base_url).rstrip('/') != base_url.rstrip('/')):
+        _client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
     else:
         _client.api_key = api_key
 
-    # 1) Выбираем, какой текст использовать в качестве промпта:
-    if prompt_text:
-        # если передан из GUI (выбран пользователем в Combobox), используем его
-        prompt = prompt_text.replace('{{ transcript }}', transcript_text)
-        logger.info(f"Using custom prompt from GUI.")
-    elif template:
-        # если в конфиге есть prompt_template, подставляем в него {{ transcript }}
-        prompt = template.replace('{{ transcript }}', transcript_text)
-        logger.info(f"Using prompt template from config.")
-    else:
-        # дефолтный минимальный промпт
-        prompt = "Analyze meeting transcript and output summary with tasks: " + transcript_text
-        logger.info(f"Using default prompt.")
+    temp = gs.get('temperature', 0.3)   # если в конфиге нет, по умолчанию 0.3
+    chunked = gs.get('chunked', 'auto')
+    chunk_tokens = gs.get('chunk_tokens', 6000)
+    if not gs.get('stream', True):
+        on_token = None
+    cache = get_summary_cache(config)
+    if not use_cache and cache is not None:
+        logger.info("Summary cache bypassed")
+        cache = _WriteOnlyCache(cache)
 
     try:
-        temp = gs.get('temperature', 0.3)   # если в конфиге нет, по умолчанию 0.3
-        response = _client.chat.completions.create(
-            model=model,
-            messages=[
-                {'role': 'system', 'content': 'Assistant for meeting analysis.'},
-                {'role': 'user', 'content': prompt}
-            ],
-            temperature=temp
-        )
-        content = response.choices[0].message.content
-        return content.strip()
+        with metrics.span('generate_summary', model=model, transcript_chars=len(transcript_text)) as m:
+            if chunked is True or (chunked == 'auto' and estimate_tokens(transcript_text, model) > chunk_tokens):
+                chunks = split_transcript(transcript_text, chunk_tokens, model)
+                m['chunks'] = len(chunks)
+                if len(chunks) > 1:
+                    return _summarize_chunked(_client, chunks, gs, model, temp, template,
+                                              prompt_text, cache, on_token)
+
+            prompt = _resolve_prompt(transcript_text, template, prompt_text)
+            return _chat(_client, model, prompt, temp,
+                         gs.get('max_retries', 5), gs.get('retry_base_delay', 1.0), cache, on_token)
     except Exception as e:
         logger.exception('GPT API error')
         return f'[Error in GPT: {e}]'
@@ -0,0 +1,156 @@
+# core/jobs.py
+
+import itertools
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем."""
+
+
+class Job:
+    """
+    Задача для JobRunner. Функция задачи получает объект Job первым
+    аргументом и сообщает о ходе работы через job.progress(...).
+    """
+
+    def __init__(self, job_id, name, fn, args, kwargs, runner):
+        self.id = job_id
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = 'queued'     # queued | running | done | error | cancelled
+        self.stage = None
+        self.fraction = None
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._runner = runner
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.name)
+
+    def progress(self, stage, fraction=None, segments=None):
+        """
+        Колбэк прогресса для этапов конвейера: этап, доля обработанного
+        аудио (0..1 или None) и, если есть, готовые сегменты.
+        Заодно точка отмены — при отменённой задаче бросает JobCancelled.
+        """
+        self.check_cancelled()
+        self.stage = stage
+        self.fraction = fraction
+        self._runner._post('progress', self)
+        if segments:
+            self._runner._post('segments', self, segments)
+
+    def tokens(self, text):
+        """
+        Фрагмент потокового результата (например, токены выжимки GPT);
+        GUI склеивает накопившиеся фрагменты и выводит их за один раз.
+        """
+        self._runner._post('tokens', self, text)
+
+
+class JobRunner:
+    """
+    Пул потоков для этапов конвейера вне UI-потока.
+
+    Задачи выполняются по очереди (workers потоков); длинные задачи можно
+    запустить вне очереди через submit_dedicated(). События
+    ('started' | 'progress' | 'segments' | 'tokens' | 'done' | 'error' | 'cancelled',
+    job, данные) складываются в очередь; GUI забирает их через poll()
+    из своего потока (например, по root.after).
+    """
+
+    def __init__(self, workers=1):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._events = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.jobs = []
+
+    def _post(self, kind, job, data=None):
+        self._events.put((kind, job, data))
+
+    def submit(self, name, fn, *args, **kwargs):
+        job = Job(next(self._ids), name, fn, args, kwargs, self)
+        with self._lock:
+            self.jobs.append(job)
+        self._pool.submit(self._run, job)
+        logger.info(f"Job {job.id} queued: {name}")
+        return job
+
+    def submit_dedicated(self, name, fn, *args, **kwargs):
+        """
+        Как submit(), но задача выполняется в собственном потоке, не занимая
+        очередь: для задач на всё время записи (распознавание сегментов
+        идущей записи), чтобы остальные задачи не ждали за ними.
+        """
+        job = Job(next(self._ids), name, fn, args, kwargs, self)
+        with self._lock:
+            self.jobs.append(job)
+        threading.Thread(target=self._run, args=(job,), name=f"job-{job.id}", daemon=True).start()
+        logger.info(f"Job {job.id} started on its own thread: {name}")
+        return job
+
+    def _run(self, job):
+        if job.cancelled:
+            job.status = 'cancelled'
+            self._post('cancelled', job)
+            return
+        job.status = 'running'
+        self._post('started', job)
+        try:
+            job.result = job.fn(job, *job.args, **job.kwargs)
+            job.status = 'done'
+            self._post('done', job, job.result)
+        except JobCancelled:
+            job.status = 'cancelled'
+            logger.info(f"Job {job.id} cancelled: {job.name}")
+            self._post('cancelled', job)
+        except Exception as e:
+            job.status = 'error'
+            job.error = e
+            logger.exception(f"Job {job.id} failed: {job.name}")
+            self._post('error', job, e)
+        finally:
+            with self._lock:
+                if job in self.jobs:
+                    self.jobs.remove(job)
+
+    def pending(self):
+        with self._lock:
+            return list(self.jobs)
+
+    def cancel_all(self):
+        for job in self.pending():
+            job.cancel()
+
+    def poll(self):
+        """
+        Забирает накопившиеся события без блокировки.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def shutdown(self):
+        self.cancel_all()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,117 @@
+# core/live_transcriber.py
+
+import threading
+import queue
+import logging
+import numpy as np
+
+from core.transcriber import transcribe_array
+from core.speaker_diarizer import (
+    SAMPLE_RATE, get_encoder, embed_segments, assign_speakers, format_speaker_lines,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LiveTranscriber:
+    """
+    Фоновая транскрипция записи по фрагментам, пока AudioRecorder ещё пишет.
+
+    Фрагменты рекордера (по умолчанию 30 с с перекрытием 2 с) добавляются
+    к буферу ещё не распознанного звука; буфер распознаётся Whisper, и для
+    готовых сегментов сразу считаются эмбеддинги голосов. Сегменты, которые
+    доходят до конца буфера (последние overlap секунд), могут быть обрезаны
+    посреди фразы — они не принимаются, а буфер начинается с их начала и
+    распознаётся заново вместе со следующим фрагментом. После остановки
+    остаётся обработать остаток и назначить имена говорящих.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or {}
+        tc = self.config.get('transcription', {})
+        self.chunk_seconds = tc.get('live_chunk_seconds', 30.0)
+        self.overlap_seconds = tc.get('live_overlap_seconds', 2.0)
+        self.q = queue.Queue()
+        self.segments = []
+        self.embeddings = []
+        self.thread = None
+        self.error = None
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pending_start = 0.0
+
+    def attach(self, recorder):
+        recorder.set_chunk_listener(self.submit, self.chunk_seconds, self.overlap_seconds)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info(f"Live transcription started: chunk {self.chunk_seconds}s, "
+                    f"overlap {self.overlap_seconds}s")
+
+    def submit(self, offset, samples, final=False):
+        self.q.put((offset, samples, final))
+
+    def _run(self):
+        while True:
+            offset, samples, final = self.q.get()
+            try:
+                self._process(offset, samples, final)
+            except Exception as e:
+                self.error = e
+                logger.exception(f"Live transcription failed for chunk at {offset:.1f}s")
+            if final:
+                break
+
+    def _append(self, offset, samples):
+        # фрагменты рекордера перекрываются: берём только звук после конца буфера
+        # (буфер всегда заканчивается там, где закончился принятый звук)
+        pending_end = self._pending_start + len(self._pending) / SAMPLE_RATE
+        skip = max(0, int(round((pending_end - offset) * SAMPLE_RATE)))
+        if skip < len(samples):
+            self._pending = np.concatenate([self._pending, samples[skip:]]).astype(np.float32, copy=False)
+
+    def _process(self, offset, samples, final):
+        self._append(offset, samples)
+        buf, buf_start = self._pending, self._pending_start
+        if len(buf) == 0:
+            return
+        duration = len(buf) / SAMPLE_RATE
+
+        segments = [(seg.get('start', 0.0), seg.get('end', 0.0), seg.get('text', '').strip())
+                    for seg in transcribe_array(buf, self.config)]
+        cut = duration
+        if not final:
+            # сегменты у конца буфера ждут следующего фрагмента; если так пришлось
+            # бы отложить почти весь буфер (одна длинная фраза), принимаем как есть
+            tail = [start for start, end, _ in segments if end >= duration - self.overlap_seconds]
+            if tail and min(tail) > self.overlap_seconds:
+                cut = min(tail)
+        kept = [seg for seg in segments if seg[0] < cut]
+        self._pending = buf[int(cut * SAMPLE_RATE):]
+        self._pending_start = buf_start + int(cut * SAMPLE_RATE) / SAMPLE_RATE
+        if not kept:
+            return
+
+        dc = self.config.get('diarization', {})
+        embeds = embed_segments(get_encoder(), buf, [(start, end) for start, end, _ in kept],
+                                batch_size=dc.get('embed_batch_size', 32))
+        self.segments.extend((start + buf_start, end + buf_start, text) for start, end, text in kept)
+        self.embeddings.append(embeds)
+        logger.info(f"Live chunk at {buf_start:.1f}s: {len(kept)} segments, "
+                    f"{len(self._pending) / SAMPLE_RATE:.1f}s carried over")
+
+    def finish(self, timeout=120.0):
+        """
+        Дожидается обработки последнего фрагмента и возвращает стенограмму.
+        Если последний фрагмент не обработан за timeout секунд (рекордер
+        не прислал его или распознавание зависло), бросает TimeoutError.
+        """
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                raise TimeoutError(f"Live transcription did not finish in {timeout:.0f}s "
+                                   f"({self.q.qsize()} chunks queued)")
+        if self.error is not None and not self.segments:
+            raise RuntimeError(f"Live transcription failed: {self.error}")
+        if not self.segments:
+            return '[Empty transcription]'
+        names = assign_speakers(np.vstack(self.embeddings), self.config)
+        return format_speaker_lines(self.segments, names, self.config)
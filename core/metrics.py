@@ -0,0 +1,119 @@
+# core/metrics.py
+
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Имя текущего (родительского) участка для вложенных span
+_current = contextvars.ContextVar('metrics_span', default=None)
+
+
+def rss_mb():
+    """
+    Текущий RSS процесса в МиБ; без psutil — пиковый RSS из resource (Unix).
+    """
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 2 ** 20, 1)
+    except ImportError:
+        pass
+    try:
+        import resource
+        import sys
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(r / 2 ** 20 if sys.platform == 'darwin' else r / 1024, 1)
+    except ImportError:
+        return None
+
+
+def enabled():
+    return logger.isEnabledFor(logging.INFO)
+
+
+def _emit(data):
+    data.setdefault('parent', _current.get())
+    data['thread'] = threading.current_thread().name
+    logger.info(data['name'], extra={'metric': data})
+
+
+@contextmanager
+def span(name, **fields):
+    """
+    Замер времени участка конвейера:
+
+        with metrics.span('diarize', segments=len(bounds)) as m:
+            ...
+            m['clusters'] = n
+
+    Событие пишется в логгер core.metrics (уровень INFO); на уровне DEBUG
+    добавляется RSS до и после. Если логгер выключен, накладные расходы —
+    одна проверка уровня.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        yield fields
+        return
+    with_memory = logger.isEnabledFor(logging.DEBUG)
+    parent = _current.get()
+    token = _current.set(name)
+    rss_start = rss_mb() if with_memory else None
+    error = None
+    t0 = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - t0
+        _current.reset(token)
+        data = {'type': 'span', 'name': name, 'duration_ms': round(duration * 1000, 3),
+                'parent': parent}
+        data.update(fields)
+        if error:
+            data['error'] = error
+        if with_memory:
+            data['rss_mb_start'] = rss_start
+            data['rss_mb_end'] = rss_mb()
+        _emit(data)
+
+
+def count(name, value=1, **fields):
+    """
+    Счётчик (например, попадания в кэш, число сегментов).
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    data = {'type': 'counter', 'name': name, 'value': value}
+    data.update(fields)
+    _emit(data)
+
+
+def memory_snapshot(name, **fields):
+    """
+    Снимок памяти процесса (пишется только на уровне DEBUG).
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    data = {'type': 'memory', 'name': name, 'rss_mb': rss_mb()}
+    data.update(fields)
+    _emit(data)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматтер структурированных событий: одна JSON-строка на запись.
+    """
+
+    def format(self, record):
+        payload = {'ts': round(record.created, 6), 'logger': record.name}
+        metric = getattr(record, 'metric', None)
+        if metric is not None:
+            payload.update(metric)
+        else:
+            payload['message'] = record.getMessage()
+        return json.dumps(payload, ensure_ascii=False, default=str)
@@ -0,0 +1,178 @@
+# core/online_whisper.py
+
+import io
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+
+from core.config_loader import get_api_key_env
+from core.audio_reader import quietest_point
+
+logger = logging.getLogger(__name__)
+
+# Форматы сжатия для загрузки: расширение имени файла, формат и подтип soundfile
+UPLOAD_FORMATS = {
+    'flac': ('flac', 'FLAC', 'PCM_16'),
+    'opus': ('ogg', 'OGG', 'OPUS'),
+}
+
+# Whisper работает с 16 кГц моно — в этом виде части и загружаются
+UPLOAD_RATE = 16000
+# предел API на размер файла — 25 МБ; с запасом на multipart
+MAX_UPLOAD_MB = 24
+
+
+def find_split_points(audio, sr, max_seconds=600.0, search_seconds=30.0, frame_seconds=0.03):
+    """
+    Выбирает точки разреза (в сэмплах) так, чтобы части были не длиннее
+    max_seconds. Разрез ставится в самом тихом кадре (по RMS) последних
+    search_seconds перед пределом, чтобы не резать слова.
+    """
+    total = len(audio)
+    max_len = int(max_seconds * sr)
+    if total <= max_len:
+        return []
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    search = min(int(search_seconds * sr), max_len // 2)
+
+    points = []
+    start = 0
+    while total - start > max_len:
+        lo, hi = start + max_len - search, start + max_len
+        cut = lo + quietest_point(audio[lo:hi], sr, frame_seconds)
+        points.append(cut)
+        start = cut
+    return points
+
+
+def encode_audio(audio, sr, fmt='flac'):
+    """
+    Сжимает фрагмент в памяти; возвращает (имя файла, байты).
+    """
+    ext, format_, subtype = UPLOAD_FORMATS[fmt]
+    buf = io.BytesIO()
+    sf.write(buf, audio, sr, format=format_, subtype=subtype)
+    return f"chunk.{ext}", buf.getvalue()
+
+
+def _segment_dict(seg, offset):
+    if isinstance(seg, dict):
+        start, end, text = seg.get('start', 0.0), seg.get('end', 0.0), seg.get('text', '')
+    else:
+        start, end, text = seg.start, seg.end, seg.text
+    return {'start': start + offset, 'end': end + offset, 'text': text.strip()}
+
+
+def read_mono_blocks(file_path, sr=UPLOAD_RATE, block_seconds=60.0):
+    """
+    Читает файл блоками по block_seconds, сводит в моно и приводит к sr.
+    Генерирует блоки float32; файл целиком в память не читается.
+    """
+    with sf.SoundFile(file_path) as f:
+        rate = f.samplerate
+        for block in f.blocks(blocksize=int(block_seconds * rate), dtype='float32', always_2d=True):
+            mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+            if rate != sr:
+                import librosa
+                mono = librosa.resample(mono, orig_sr=rate, target_sr=sr)
+            yield np.ascontiguousarray(mono, dtype=np.float32)
+
+
+def iter_parts(blocks, sr, max_seconds=600.0, search_seconds=30.0):
+    """
+    Собирает поток блоков в части не длиннее max_seconds, разрезая в самом
+    тихом кадре последних search_seconds перед пределом.
+    Генерирует (начало части в сэмплах, сигнал части).
+    """
+    max_len = int(max_seconds * sr)
+    search = min(int(search_seconds * sr), max_len // 2)
+    buf, buf_len, start = [], 0, 0
+    for block in blocks:
+        buf.append(block)
+        buf_len += len(block)
+        while buf_len > max_len:
+            audio = np.concatenate(buf)
+            lo = max_len - search
+            cut = lo + quietest_point(audio[lo:max_len], sr)
+            yield start, audio[:cut]
+            start += cut
+            buf, buf_len = [audio[cut:]], len(audio) - cut
+    if buf_len:
+        yield start, np.concatenate(buf)
+
+
+def encode_limited(audio, sr, fmt, max_bytes):
+    """
+    Сжимает часть; если результат больше max_bytes, часть делится пополам
+    (по паузе около середины). Возвращает список (сдвиг в сэмплах, имя, байты).
+    """
+    name, data = encode_audio(audio, sr, fmt)
+    if len(data) <= max_bytes or len(audio) < 2 * sr:
+        return [(0, name, data)]
+    quarter = len(audio) // 4
+    cut = quarter + quietest_point(audio[quarter:len(audio) - quarter], sr)
+    logger.info(f"[ONLINE] Part of {len(data) / 2 ** 20:.1f} MiB exceeds upload limit, splitting")
+    return (encode_limited(audio[:cut], sr, fmt, max_bytes)
+            + [(cut + off, n, d) for off, n, d in encode_limited(audio[cut:], sr, fmt, max_bytes)])
+
+
+def transcribe_online(file_path, config=None):
+    """
+    Распознаёт файл через OpenAI Whisper API.
+
+    Файл читается блоками и приводится к 16 кГц моно, запись режется по
+    паузам на части не длиннее transcription.max_chunk_seconds, каждая часть
+    сжимается в памяти (transcription.upload_format: flac | opus) и
+    отправляется параллельно (transcription.upload_concurrency запросов).
+    Часть, сжатая больше transcription.max_upload_mb, делится дальше.
+    Тайм-коды сегментов сдвигаются на начало части.
+    """
+    try:
+        from openai import OpenAI
+    except ImportError:
+        raise ImportError("Для online-режима нужен пакет openai: pip install openai")
+
+    section_cfg = config.get("transcription", {}) if config else {}
+    api_key = get_api_key_env(section_cfg)
+    lang = section_cfg.get("language")
+
+    if not api_key:
+        raise ValueError("API-ключ для online-режима не задан (ни api_key, ни api_key_env, ни OPENAI_API_KEY)")
+
+    client = OpenAI(api_key=api_key, base_url=section_cfg.get("base_url"))
+    fmt = section_cfg.get("upload_format", "flac")
+    if fmt not in UPLOAD_FORMATS:
+        raise ValueError(f"Неизвестный формат загрузки: {fmt}")
+    max_bytes = int(section_cfg.get("max_upload_mb", MAX_UPLOAD_MB) * 2 ** 20)
+    sr = UPLOAD_RATE
+
+    def upload(start, name, data):
+        logger.info(f"[ONLINE] Uploading part at {start / sr:.1f}s ({len(data) / 1024:.0f} KiB)")
+        transcript = client.audio.transcriptions.create(
+            model="whisper-1",
+            file=(name, data),
+            language=lang,
+            response_format="verbose_json"
+        )
+        offset = start / sr
+        return [_segment_dict(seg, offset) for seg in (getattr(transcript, "segments", None) or [])]
+
+    # части кодируются по мере чтения; в памяти не больше workers загрузок
+    # сверх выполняющихся, поэтому память не растёт с длиной записи
+    workers = max(1, section_cfg.get("upload_concurrency", 4))
+    futures, in_flight = [], deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        blocks = read_mono_blocks(file_path, sr)
+        for start, audio in iter_parts(blocks, sr, section_cfg.get("max_chunk_seconds", 600)):
+            for off, name, data in encode_limited(audio, sr, fmt, max_bytes):
+                if len(in_flight) >= 2 * workers:
+                    in_flight.popleft().result()
+                fut = pool.submit(upload, start + off, name, data)
+                futures.append(fut)
+                in_flight.append(fut)
+        logger.info(f"[ONLINE] {file_path}: {len(futures)} part(s), format {fmt}")
+        parts = [fut.result() for fut in futures]
+    return [seg for part in parts for seg in part]
@@ -0,0 +1,82 @@
+# core/pipeline.py
+
+import os
+import time
+import logging
+import soundfile as sf
+
+from core.transcriber import transcribe_audio
+from core.segments import is_manifest, SegmentedAudio
+from core.search_index import index_transcript
+from core.gpt_summary import generate_summary, is_summary_error
+
+logger = logging.getLogger(__name__)
+
+
+def output_paths(audio_path):
+    """
+    Пути результатов для аудиофайла: стенограмма (как в GUI) и выжимка.
+    """
+    base = os.path.splitext(audio_path)[0]
+    return base + ".txt", base + "_summary.txt"
+
+
+def summary_enabled(config):
+    return bool(config.get('gpt_summary', {}).get('enabled', False))
+
+
+def is_processed(audio_path, config, summarize=True):
+    txt_path, summary_path = output_paths(audio_path)
+    if not os.path.exists(txt_path):
+        return False
+    if summarize and summary_enabled(config) and not os.path.exists(summary_path):
+        return False
+    return True
+
+
+def process_file(audio_path, config, summarize=True, prompt_text=None):
+    """
+    Полный цикл для одного файла: транскрипция + диаризация → выжимка GPT →
+    сохранение .txt рядом с WAV. Если стенограмма уже есть, она переиспользуется.
+
+    Возвращает отчёт: файл, длительность аудио, время по этапам. Если GPT
+    вернул ошибку, выжимка не сохраняется, а статус отчёта — 'error'.
+    """
+    txt_path, summary_path = output_paths(audio_path)
+    timings = {}
+    report = {'file': audio_path, 'status': 'done', 'timings': timings}
+    try:
+        if is_manifest(audio_path):
+            report['audio_seconds'] = SegmentedAudio(audio_path).duration
+        else:
+            report['audio_seconds'] = sf.info(audio_path).duration
+    except Exception:
+        report['audio_seconds'] = None
+
+    if os.path.exists(txt_path):
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            transcript = f.read()
+    else:
+        t0 = time.perf_counter()
+        transcript = transcribe_audio(audio_path, config)
+        timings['transcribe'] = time.perf_counter() - t0
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            f.write(transcript)
+        index_transcript(txt_path, transcript, config)
+
+    if summarize and summary_enabled(config) and not os.path.exists(summary_path):
+        t0 = time.perf_counter()
+        summary = generate_summary(transcript, config, prompt_text)
+        timings['summary'] = time.perf_counter() - t0
+        if is_summary_error(summary):
+            # без файла выжимки запись останется необработанной и повторится при следующем прогоне
+            logger.error(f"Summary failed for {audio_path}: {summary}")
+            report['status'] = 'error'
+            report['error'] = summary
+        else:
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                f.write(summary)
+
+    timings['total'] = sum(timings.values())
+    logger.info(f"Processed {audio_path} in {timings['total']:.1f}s")
+    return report
@@ -1,53 +1,260 @@
 # core/recorder.py
 
+import numpy as np
 import sounddevice as sd
 import soundfile as sf
 import threading
 import queue
 import datetime
 import os
+import time
 import logging
+from core.segments import SegmentedWriter
 
 logger = logging.getLogger(__name__)
 
 class AudioRecorder:
+    """
+    Запись с микрофона в WAV (PCM_16).
+
+    capture_mode:
+      - 'ring'  — заранее выделенный кольцевой буфер на ring_seconds секунд;
+                  запись в файл крупными блоками по write_block_seconds.
+                  Память ограничена: если диск не успевает, лишние кадры
+                  отбрасываются и учитываются в stats['dropped_frames'];
+      - 'queue' — прежний режим: каждый блок PortAudio копируется в очередь.
+
+    segment_seconds > 0 — запись сегментами этой длины (см. core.segments):
+    готовые сегменты сжимаются в FLAC в фоне (compress_segments), а
+    filepath указывает на манифест .json, который transcribe_audio
+    обрабатывает как одну запись, в том числе пока она ещё идёт.
+
+    Счётчики (get_stats): переполнения PortAudio, потерянные кадры,
+    максимум заполнения буфера/очереди, задержка записи на диск.
+    """
+
     def __init__(self, save_dir="recordings", samplerate=16000,
-                 channels=1, device=None):
+                 channels=1, device=None, capture_mode="ring",
+                 ring_seconds=60.0, write_block_seconds=1.0,
+                 segment_seconds=0, compress_segments=True):
         self.save_dir = save_dir
         os.makedirs(save_dir, exist_ok=True)
         self.samplerate = samplerate
         self.channels = channels
         self.device = device
+        self.capture_mode = capture_mode
+        self.ring_seconds = ring_seconds
+        self.write_block_seconds = write_block_seconds
+        self.segment_seconds = segment_seconds
+        self.compress_segments = compress_segments
+        # источник звука; подменяется в бенчмарках (см. bench/)
+        self.stream_factory = sd.InputStream
         self.q = queue.Queue()
+        self._ring = None
+        self._ring_written = 0
+        self._ring_read = 0
+        self._data_ready = threading.Event()
+        self._block_frames = 1
+        self.stats = {}
+        self._reset_stats()
         self.recording = False
         self.filepath = None
         self.thread = None
+        # Публикация фрагментов для живой транскрипции (см. set_chunk_listener)
+        self.chunk_callback = None
+        self.chunk_seconds = 30.0
+        self.overlap_seconds = 2.0
+        self._reset_chunks()
 
-    def _callback(self, indata, frames, time, status):
+    def set_chunk_listener(self, callback, chunk_seconds=30.0, overlap_seconds=2.0):
+        """
+        Включает публикацию фрагментов записи по мере поступления.
+        callback(offset_seconds, samples, final) вызывается из потока записи
+        для каждого фрагмента длиной chunk_seconds (моно float32) с перекрытием
+        overlap_seconds; при остановке отправляется остаток с final=True.
+        callback=None отключает публикацию.
+        """
+        self.chunk_callback = callback
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+
+    def _reset_chunks(self):
+        self._chunk_parts = []
+        self._chunk_len = 0
+        self._chunk_offset = 0
+
+    def _publish(self, data, final=False):
+        if self.chunk_callback is None:
+            return
+        if data is not None:
+            mono = data[:, 0] if data.shape[1] == 1 else data.mean(axis=1)
+            # копия: в режиме 'ring' data — окно кольцевого буфера
+            self._chunk_parts.append(np.array(mono, dtype=np.float32))
+            self._chunk_len += len(mono)
+
+        size = int(self.chunk_seconds * self.samplerate)
+        overlap = min(int(self.overlap_seconds * self.samplerate), size - 1)
+        while self._chunk_len >= size:
+            buf = np.concatenate(self._chunk_parts)
+            self.chunk_callback(self._chunk_offset / self.samplerate, buf[:size], False)
+            rest = buf[size - overlap:]
+            self._chunk_offset += size - overlap
+            self._chunk_parts = [rest]
+            self._chunk_len = len(rest)
+
+        if final:
+            buf = (np.concatenate(self._chunk_parts) if self._chunk_parts
+                   else np.zeros(0, dtype=np.float32))
+            self.chunk_callback(self._chunk_offset / self.samplerate, buf, True)
+            self._reset_chunks()
+
+    def _reset_stats(self):
+        self.stats = {
+            'frames_captured': 0,      # кадров пришло от PortAudio
+            'frames_written': 0,       # кадров записано в файл
+            'dropped_frames': 0,       # кадров отброшено (буфер переполнен)
+            'overflows': 0,            # input overflow от PortAudio
+            'high_water_frames': 0,    # максимум кадров, ждавших записи
+            'writes': 0,
+            'write_seconds_total': 0.0,
+            'write_seconds_max': 0.0,
+        }
+
+    def get_stats(self):
+        """
+        Возвращает копию счётчиков записи; lost_audio=False означает,
+        что все полученные кадры записаны и переполнений не было.
+        """
+        st = dict(self.stats)
+        st['write_seconds_avg'] = st['write_seconds_total'] / st['writes'] if st['writes'] else 0.0
+        st['lost_audio'] = bool(st['dropped_frames'] or st['overflows']
+                                or st['frames_written'] != st['frames_captured'])
+        return st
+
+    def _check_status(self, status):
         if status:
+            if status.input_overflow:
+                self.stats['overflows'] += 1
             logger.warning(f"Record status: {status}")
+
+    def _callback(self, indata, frames, time, status):
+        self._check_status(status)
+        self.stats['frames_captured'] += frames
         self.q.put(indata.copy())
+        pending = self.q.qsize() * frames
+        if pending > self.stats['high_water_frames']:
+            self.stats['high_water_frames'] = pending
+
+    def _ring_callback(self, indata, frames, time, status):
+        self._check_status(status)
+        self.stats['frames_captured'] += frames
+        capacity = len(self._ring)
+        pending = self._ring_written - self._ring_read
+        n = min(frames, capacity - pending)
+        if n < frames:
+            self.stats['dropped_frames'] += frames - n
+        if n > 0:
+            pos = self._ring_written % capacity
+            first = min(n, capacity - pos)
+            self._ring[pos:pos + first] = indata[:first]
+            if n > first:
+                self._ring[:n - first] = indata[first:n]
+            self._ring_written += n
+            pending += n
+        if pending > self.stats['high_water_frames']:
+            self.stats['high_water_frames'] = pending
+        if pending >= self._block_frames:
+            self._data_ready.set()
+
+    def _write(self, file, data):
+        t0 = time.perf_counter()
+        file.write(data)
+        dt = time.perf_counter() - t0
+        self.stats['writes'] += 1
+        self.stats['frames_written'] += len(data)
+        self.stats['write_seconds_total'] += dt
+        if dt > self.stats['write_seconds_max']:
+            self.stats['write_seconds_max'] = dt
+        self._publish(data)
+
+    def _drain_ring(self, file, min_frames):
+        capacity = len(self._ring)
+        while True:
+            pending = self._ring_written - self._ring_read
+            if pending == 0 or pending < min_frames:
+                return
+            pos = self._ring_read % capacity
+            n = min(pending, capacity - pos, self._block_frames)
+            self._write(file, self._ring[pos:pos + n])
+            self._ring_read += n
 
     def start_recording(self):
         ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.filepath = os.path.join(self.save_dir, f"meeting_{ts}.wav")
+        ext = ".json" if self.segment_seconds else ".wav"
+        self.filepath = os.path.join(self.save_dir, f"meeting_{ts}{ext}")
         self.recording = True
+        self._reset_chunks()
+        self._reset_stats()
         self.thread = threading.Thread(target=self._record)
         self.thread.start()
-        logger.info(f"Recording started: {self.filepath}")
+        logger.info(f"Recording started: {self.filepath} ({self.capture_mode} mode)")
+
+    def _open_output(self):
+        if self.segment_seconds:
+            return SegmentedWriter(self.filepath, self.samplerate, self.channels,
+                                   self.segment_seconds, self.compress_segments)
+        return sf.SoundFile(self.filepath, mode='x', samplerate=self.samplerate,
+                            channels=self.channels, subtype='PCM_16')
 
     def _record(self):
-        with sf.SoundFile(self.filepath, mode='x', samplerate=self.samplerate,
-                          channels=self.channels, subtype='PCM_16') as file:
-            with sd.InputStream(samplerate=self.samplerate,
-                                channels=self.channels,
-                                callback=self._callback,
-                                device=self.device):
-                while self.recording:
-                    file.write(self.q.get())
+        with self._open_output() as file:
+            if self.capture_mode == 'ring':
+                self._record_ring(file)
+            else:
+                self._record_queue(file)
+        self._publish(None, final=True)
+
+    def _record_queue(self, file):
+        with self.stream_factory(samplerate=self.samplerate,
+                                 channels=self.channels,
+                                 callback=self._callback,
+                                 device=self.device):
+            while self.recording:
+                try:
+                    self._write(file, self.q.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+        while not self.q.empty():
+            self._write(file, self.q.get())
+
+    def _record_ring(self, file):
+        self._block_frames = max(1, int(self.write_block_seconds * self.samplerate))
+        capacity = max(int(self.ring_seconds * self.samplerate), 2 * self._block_frames)
+        self._ring = np.zeros((capacity, self.channels), dtype=np.float32)
+        self._ring_written = 0
+        self._ring_read = 0
+        self._data_ready.clear()
+        with self.stream_factory(samplerate=self.samplerate,
+                                 channels=self.channels,
+                                 dtype='float32',
+                                 callback=self._ring_callback,
+                                 device=self.device):
+            while self.recording:
+                self._data_ready.wait(0.5)
+                self._data_ready.clear()
+                self._drain_ring(file, self._block_frames)
+        self._drain_ring(file, 0)
+        self._ring = None
 
     def stop_recording(self):
         self.recording = False
         self.thread.join()
+        st = self.get_stats()
         logger.info(f"Recording saved to {self.filepath}")
+        logger.info(f"Recording stats: captured={st['frames_captured']} written={st['frames_written']} "
+                    f"dropped={st['dropped_frames']} overflows={st['overflows']} "
+                    f"high_water={st['high_water_frames']} "
+                    f"write_max={st['write_seconds_max'] * 1000:.1f}ms")
+        if st['lost_audio']:
+            logger.warning("Some audio was lost during recording")
         return self.filepath
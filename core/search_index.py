@@ -0,0 +1,348 @@
+# core/search_index.py
+
+import os
+import re
+import glob
+import sqlite3
+import datetime
+import threading
+import logging
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# "[m:ss] Имя: текст" (см. speaker_diarizer.format_speaker_lines); тайм-код необязателен
+_LINE_RE = re.compile(r"^(?:\[(\d+(?::\d{2}){1,2})\]\s*)?(?:([^:\[\]]{1,60}):\s)?(.*)$")
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+_DATE_RE = re.compile(r"(\d{8})_(\d{6})")
+_QUARTER_RE = re.compile(r"^(?:(\d{4})[-_ ]?)?q([1-4])$", re.IGNORECASE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meetings (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY,
+    meeting_id INTEGER NOT NULL,
+    line_no INTEGER NOT NULL,
+    start REAL,
+    speaker TEXT,
+    speaker_norm TEXT,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    line_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS postings_term ON postings(term, line_id);
+CREATE INDEX IF NOT EXISTS postings_line ON postings(line_id);
+CREATE INDEX IF NOT EXISTS lines_meeting ON lines(meeting_id);
+CREATE INDEX IF NOT EXISTS lines_speaker ON lines(speaker_norm);
+CREATE INDEX IF NOT EXISTS meetings_date ON meetings(date);
+"""
+
+
+def tokenize(text):
+    """
+    Термы строки: слова в нижнем регистре, ё приводится к е.
+    """
+    return [t.replace('ё', 'е') for t in _TERM_RE.findall(text.lower())]
+
+
+def parse_timestamp(ts):
+    seconds = 0
+    for part in ts.split(':'):
+        seconds = seconds * 60 + int(part)
+    return float(seconds)
+
+
+def parse_line(line):
+    """
+    Разбирает строку стенограммы: (начало в секундах или None, говорящий или None, текст).
+    """
+    m = _LINE_RE.match(line.strip())
+    ts, speaker, text = m.groups()
+    return (parse_timestamp(ts) if ts else None,
+            speaker.strip() if speaker else None,
+            text.strip())
+
+
+def meeting_date(path):
+    """
+    Дата совещания: из имени файла (meeting_YYYYMMDD_HHMMSS), иначе mtime.
+    """
+    m = _DATE_RE.search(os.path.basename(path))
+    if m:
+        try:
+            dt = datetime.datetime.strptime(m.group(1) + m.group(2), "%Y%m%d%H%M%S")
+            return dt.isoformat(sep=' ')
+        except ValueError:
+            pass
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path)).isoformat(sep=' ', timespec='seconds')
+
+
+def _quarter_bounds(year, quarter):
+    start = datetime.date(year, 3 * quarter - 2, 1)
+    end = datetime.date(year + (quarter == 4), (3 * quarter) % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def parse_query(query):
+    """
+    Разбирает строку запроса:
+        бюджет* speaker:Алиса quarter:2024Q3 from:2024-01-01 to:2024-12-31
+    Слова — термы (все должны встретиться в строке, '*' в конце — префикс),
+    speaker: — говорящий (начало имени), quarter:/from:/to: — период;
+    отдельное слово вида 2024Q3 или Q3 (текущий год) — тоже квартал.
+    Возвращает dict(terms, speaker, date_from, date_to); date_to не включается.
+    """
+    result = {'terms': [], 'speaker': None, 'date_from': None, 'date_to': None}
+    for word in query.split():
+        key, sep, value = word.partition(':')
+        key = key.lower()
+        if sep and value and key in ('speaker', 'говорящий', 'кто'):
+            result['speaker'] = value.replace('_', ' ')
+        elif sep and value and key in ('quarter', 'квартал'):
+            m = _QUARTER_RE.match(value)
+            if m is None:
+                raise ValueError(f"Неверный квартал: {value}")
+            year = int(m.group(1) or datetime.date.today().year)
+            result['date_from'], result['date_to'] = _quarter_bounds(year, int(m.group(2)))
+        elif sep and value and key in ('from', 'с'):
+            result['date_from'] = value
+        elif sep and value and key in ('to', 'по'):
+            result['date_to'] = value
+        else:
+            m = _QUARTER_RE.match(word)
+            if m is not None:
+                year = int(m.group(1) or datetime.date.today().year)
+                result['date_from'], result['date_to'] = _quarter_bounds(year, int(m.group(2)))
+                continue
+            prefix = word.endswith('*')
+            terms = tokenize(word)
+            if prefix and terms:
+                terms[-1] += '*'
+            result['terms'].extend(terms)
+    return result
+
+
+class TranscriptIndex:
+    """
+    Инвертированный индекс стенограмм recordings/*.txt в SQLite.
+
+    Для каждой строки стенограммы хранятся тайм-код, говорящий и текст,
+    для каждого терма — список строк (postings). Индекс обновляется
+    инкрементально: add_transcript() перестраивает записи одного файла,
+    refresh() — только новых, изменённых и удалённых файлов папки.
+    """
+
+    def __init__(self, index_path="cache/search.sqlite"):
+        self.index_path = index_path
+        os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+        with self._connect() as db:
+            if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+                logger.info("Search index version mismatch, rebuilding")
+                for table in ('postings', 'lines', 'meetings'):
+                    db.execute(f"DROP TABLE IF EXISTS {table}")
+                db.executescript(_SCHEMA)
+                db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def _connect(self):
+        # отдельное соединение на операцию: индекс обновляют фоновые задачи
+        # и процессы пакетной обработки, а ищет GUI-поток
+        db = sqlite3.connect(self.index_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return _Connection(db)
+
+    # --- обновление ---
+
+    @staticmethod
+    def _remove(db, meeting_id):
+        db.execute("DELETE FROM postings WHERE line_id IN "
+                   "(SELECT id FROM lines WHERE meeting_id = ?)", (meeting_id,))
+        db.execute("DELETE FROM lines WHERE meeting_id = ?", (meeting_id,))
+        db.execute("DELETE FROM meetings WHERE id = ?", (meeting_id,))
+
+    def add_transcript(self, txt_path, text=None):
+        """
+        Индексирует (или переиндексирует) стенограмму. Возвращает число строк.
+        """
+        txt_path = os.path.abspath(txt_path)
+        if text is None:
+            with open(txt_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        st = os.stat(txt_path)
+        with metrics.span('search_index_add', file=os.path.basename(txt_path)) as m, \
+                self._connect() as db:
+            row = db.execute("SELECT id FROM meetings WHERE path = ?", (txt_path,)).fetchone()
+            if row:
+                self._remove(db, row[0])
+            meeting_id = db.execute(
+                "INSERT INTO meetings (path, size, mtime, date) VALUES (?, ?, ?, ?)",
+                (txt_path, st.st_size, st.st_mtime, meeting_date(txt_path))).lastrowid
+            count = 0
+            for line_no, line in enumerate(text.splitlines(), 1):
+                if not line.strip():
+                    continue
+                start, speaker, body = parse_line(line)
+                line_id = db.execute(
+                    "INSERT INTO lines (meeting_id, line_no, start, speaker, speaker_norm, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (meeting_id, line_no, start, speaker,
+                     speaker.lower() if speaker else None, body)).lastrowid
+                db.executemany("INSERT INTO postings (term, line_id) VALUES (?, ?)",
+                               [(term, line_id) for term in set(tokenize(body))])
+                count += 1
+            m['lines'] = count
+        logger.info(f"Indexed transcript {txt_path}: {count} lines")
+        return count
+
+    def remove_transcript(self, txt_path):
+        with self._connect() as db:
+            row = db.execute("SELECT id FROM meetings WHERE path = ?",
+                             (os.path.abspath(txt_path),)).fetchone()
+            if row:
+                self._remove(db, row[0])
+
+    def refresh(self, transcripts_dir="recordings"):
+        """
+        Сверяет индекс с папкой: переиндексирует новые и изменённые
+        стенограммы (по размеру и mtime), удаляет пропавшие.
+        Возвращает число переиндексированных файлов.
+        """
+        paths = {os.path.abspath(p) for p in glob.glob(os.path.join(transcripts_dir, "**", "*.txt"),
+                                                        recursive=True)
+                 if not p.endswith("_summary.txt")}
+        prefix = os.path.join(os.path.abspath(transcripts_dir), '')
+        with self._connect() as db:
+            known = {path: (size, mtime, mid) for mid, path, size, mtime in
+                     db.execute("SELECT id, path, size, mtime FROM meetings")}
+            for path, (_, _, mid) in known.items():
+                if path.startswith(prefix) and path not in paths:
+                    self._remove(db, mid)
+        updated = 0
+        for path in sorted(paths):
+            st = os.stat(path)
+            old = known.get(path)
+            if old is None or old[0] != st.st_size or old[1] != st.st_mtime:
+                self.add_transcript(path)
+                updated += 1
+        return updated
+
+    # --- поиск ---
+
+    def search(self, terms=(), speaker=None, date_from=None, date_to=None, limit=100):
+        """
+        Строки, содержащие все термы (терм с '*' в конце — префикс),
+        с фильтром по говорящему (начало имени, без учёта регистра)
+        и периоду [date_from, date_to). Свежие совещания — первыми.
+
+        Возвращает список dict(path, date, line_no, start, speaker, text).
+        """
+        where, params = [], []
+        for term in terms:
+            if term.endswith('*'):
+                base = term[:-1]
+                upper = base[:-1] + chr(ord(base[-1]) + 1) if base else '￿'
+                where.append("l.id IN (SELECT line_id FROM postings WHERE term >= ? AND term < ?)")
+                params += [base, upper]
+            else:
+                where.append("l.id IN (SELECT line_id FROM postings WHERE term = ?)")
+                params.append(term)
+        if speaker:
+            where.append("l.speaker_norm LIKE ?")
+            params.append(speaker.lower().replace('%', '') + '%')
+        if date_from:
+            where.append("m.date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("m.date < ?")
+            params.append(date_to)
+        sql = ("SELECT m.path, m.date, l.line_no, l.start, l.speaker, l.text "
+               "FROM lines l JOIN meetings m ON m.id = l.meeting_id")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY m.date DESC, l.line_no LIMIT ?"
+        params.append(limit)
+        with metrics.span('search_query', terms=len(terms)) as m, self._connect() as db:
+            rows = db.execute(sql, params).fetchall()
+            m['results'] = len(rows)
+        keys = ('path', 'date', 'line_no', 'start', 'speaker', 'text')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def query(self, query, limit=100):
+        """
+        Поиск по строке запроса (синтаксис — см. parse_query).
+        """
+        return self.search(limit=limit, **parse_query(query))
+
+
+class _Connection:
+    """
+    Соединение SQLite как контекстный менеджер: commit/rollback и закрытие.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                self.db.commit()
+            else:
+                self.db.rollback()
+        finally:
+            self.db.close()
+
+
+def format_result(row):
+    """
+    Строка результата для списка: дата, файл, тайм-код, говорящий, текст.
+    """
+    ts = ""
+    if row['start'] is not None:
+        secs = int(row['start'])
+        ts = f"[{secs // 60}:{secs % 60:02d}] "
+    speaker = f"{row['speaker']}: " if row['speaker'] else ""
+    return f"{row['date'][:10]}  {os.path.basename(row['path'])}  {ts}{speaker}{row['text']}"
+
+
+def get_search_index(config=None):
+    """
+    Возвращает общий TranscriptIndex по настройкам search или None, если выключен.
+    """
+    sc = (config or {}).get('search', {})
+    if not sc.get('enabled', True):
+        return None
+    path = sc.get('index_path', 'cache/search.sqlite')
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = TranscriptIndex(path)
+            _indexes[path] = index
+        return index
+
+
+def index_transcript(txt_path, text=None, config=None):
+    """
+    Добавляет сохранённую стенограмму в индекс; ошибки индекса не мешают
+    сохранению, поэтому только логируются.
+    """
+    try:
+        index = get_search_index(config)
+        if index is not None:
+            index.add_transcript(txt_path, text)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Failed to index transcript {txt_path}: {e}")
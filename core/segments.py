@@ -0,0 +1,319 @@
+# core/segments.py
+
+import os
+import json
+import time
+import queue
+import hashlib
+import datetime
+import threading
+import logging
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def is_manifest(path):
+    """
+    Манифест сегментированной записи (см. SegmentedWriter) — .json рядом
+    с папкой сегментов.
+    """
+    return path.lower().endswith(".json")
+
+
+def read_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION or 'segments' not in manifest:
+        raise ValueError(f"Not a segmented recording manifest: {path}")
+    return manifest
+
+
+def segment_path(manifest_path, entry):
+    return os.path.join(os.path.dirname(manifest_path), entry['file'])
+
+
+def manifest_fingerprint(manifest):
+    """
+    Хеш шкалы записи (id, частота, длины сегментов). Не меняется при сжатии
+    сегментов в FLAC, поэтому годится как ключ кэша стенограмм.
+    """
+    raw = json.dumps([manifest.get('id'), manifest['samplerate'],
+                      [e['frames'] for e in manifest['segments']]])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class SegmentedWriter:
+    """
+    Запись в сегменты фиксированной длины вместо одного WAV.
+
+    Сегменты пишутся как PCM_16 WAV в папку <имя записи>/, готовые сегменты
+    сжимаются в FLAC фоновым потоком. Манифест <имя записи>.json описывает
+    шкалу записи: для каждого завершённого сегмента — файл, формат, начало
+    и длину в кадрах; complete=true — запись остановлена.
+
+    Интерфейс как у soundfile.SoundFile (write, контекстный менеджер),
+    поэтому подставляется в AudioRecorder вместо файла.
+    """
+
+    def __init__(self, manifest_path, samplerate, channels, segment_seconds=300.0, compress=True):
+        self.manifest_path = manifest_path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.segment_frames = max(1, int(segment_seconds * samplerate))
+        self.compress = compress
+        self.base = os.path.splitext(os.path.basename(manifest_path))[0]
+        self.dir = os.path.join(os.path.dirname(manifest_path), self.base)
+        os.makedirs(self.dir, exist_ok=True)
+        self.manifest = {
+            'version': MANIFEST_VERSION,
+            'id': self.base,
+            'started': datetime.datetime.now().isoformat(timespec='seconds'),
+            'samplerate': samplerate,
+            'channels': channels,
+            'segment_seconds': segment_seconds,
+            'complete': False,
+            'segments': [],
+        }
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_name = None
+        self._file_frames = 0
+        self._start_frame = 0
+        self._compress_q = queue.Queue()
+        self._compressor = None
+        if compress:
+            # не daemon: начатое сжатие доводится до конца при выходе
+            self._compressor = threading.Thread(target=self._compress_loop, name="flac")
+            self._compressor.start()
+        self._save_manifest()
+
+    # --- манифест ---
+
+    def _save_manifest(self):
+        # пишут и поток записи, и поток сжатия — весь tmp + replace под замком
+        tmp = self.manifest_path + ".tmp"
+        with self._lock:
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+                os.replace(tmp, self.manifest_path)
+            except OSError as e:
+                logger.warning(f"Failed to write segment manifest: {e}")
+
+    # --- запись ---
+
+    def _open_segment(self):
+        index = len(self.manifest['segments']) + 1
+        self._file_name = f"part_{index:04d}.wav"
+        self._file = sf.SoundFile(os.path.join(self.dir, self._file_name), mode='x',
+                                  samplerate=self.samplerate, channels=self.channels,
+                                  subtype='PCM_16')
+        self._file_frames = 0
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        entry = {
+            'file': f"{self.base}/{self._file_name}",
+            'format': 'wav',
+            'start_frame': self._start_frame,
+            'frames': self._file_frames,
+            'start': self._start_frame / self.samplerate,
+            'duration': self._file_frames / self.samplerate,
+        }
+        self._start_frame += self._file_frames
+        self._file = None
+        if entry['frames'] == 0:
+            os.remove(os.path.join(self.dir, self._file_name))
+            return
+        with self._lock:
+            self.manifest['segments'].append(entry)
+        self._save_manifest()
+        logger.info(f"Recording segment closed: {entry['file']} ({entry['duration']:.0f}s)")
+        if self.compress:
+            self._compress_q.put(entry)
+
+    def write(self, data):
+        pos = 0
+        while pos < len(data):
+            if self._file is None:
+                self._open_segment()
+            n = min(len(data) - pos, self.segment_frames - self._file_frames)
+            self._file.write(data[pos:pos + n])
+            self._file_frames += n
+            pos += n
+            if self._file_frames >= self.segment_frames:
+                self._close_segment()
+
+    def close(self):
+        self._close_segment()
+        with self._lock:
+            self.manifest['complete'] = True
+        self._save_manifest()
+        if self._compressor is not None:
+            self._compress_q.put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- сжатие ---
+
+    def _compress_loop(self):
+        while True:
+            entry = self._compress_q.get()
+            if entry is None:
+                return
+            try:
+                self._compress(entry)
+            except Exception:
+                logger.exception(f"FLAC compression failed: {entry['file']}")
+
+    def _compress(self, entry):
+        wav = os.path.join(os.path.dirname(self.manifest_path), entry['file'])
+        flac = os.path.splitext(wav)[0] + ".flac"
+        t0 = time.perf_counter()
+        with sf.SoundFile(wav) as src, \
+                sf.SoundFile(flac + ".tmp", mode='w', samplerate=src.samplerate,
+                             channels=src.channels, subtype='PCM_16', format='FLAC') as dst:
+            for block in src.blocks(blocksize=1 << 16, dtype='int16'):
+                dst.write(block)
+        os.replace(flac + ".tmp", flac)
+        with self._lock:
+            entry['file'] = os.path.splitext(entry['file'])[0] + ".flac"
+            entry['format'] = 'flac'
+        self._save_manifest()
+        ratio = os.path.getsize(flac) / max(1, os.path.getsize(wav))
+        # WAV может быть ещё открыт читателем (на Windows удалить нельзя)
+        for attempt in range(5):
+            try:
+                os.remove(wav)
+                break
+            except OSError:
+                time.sleep(1.0)
+        else:
+            logger.warning(f"Cannot remove compressed segment {wav}")
+        logger.info(f"Segment compressed to FLAC: {entry['file']} "
+                    f"({ratio:.0%} of WAV, {time.perf_counter() - t0:.1f}s)")
+
+
+def follow_segments(manifest_path, poll_seconds=1.0, timeout=None):
+    """
+    Генерирует записи сегментов по мере их завершения, пока запись идёт;
+    заканчивается, когда манифест помечен complete и все сегменты выданы.
+    timeout — сколько ждать нового сегмента, прежде чем сдаться (None — без ограничения).
+    """
+    index = 0
+    waited = 0.0
+    while True:
+        try:
+            manifest = read_manifest(manifest_path)
+        except FileNotFoundError:
+            # запись только запускается — манифест ещё не создан
+            manifest = {'segments': [], 'complete': False}
+        segments = manifest['segments']
+        while index < len(segments):
+            yield dict(segments[index], index=index)
+            index += 1
+            waited = 0.0
+        if manifest.get('complete'):
+            return
+        if timeout is not None and waited >= timeout:
+            raise TimeoutError(f"No new segments in {manifest_path} for {timeout:.0f}s")
+        time.sleep(poll_seconds)
+        waited += poll_seconds
+
+
+def read_segment(manifest_path, entry):
+    """
+    Сигнал сегмента (моно float32). Если сегмент успели сжать в FLAC,
+    путь берётся из обновлённого манифеста.
+    """
+    try:
+        data, _ = sf.read(segment_path(manifest_path, entry), dtype='float32', always_2d=True)
+    except (OSError, RuntimeError):
+        entry = read_manifest(manifest_path)['segments'][entry['index']]
+        data, _ = sf.read(segment_path(manifest_path, entry), dtype='float32', always_2d=True)
+    return data[:, 0] if data.shape[1] == 1 else data.mean(axis=1)
+
+
+class SegmentedAudio:
+    """
+    Набор сегментов как одна запись: len() и срезы (audio[a:b] ->
+    моно float32) в общей шкале, как у WavReader. Читает только нужные
+    сегменты; годится для диаризации.
+
+    samplerate — частота, в которой отдаются срезы (например, 16000 для
+    диаризации); по умолчанию — частота записи из манифеста.
+    """
+
+    ndim = 1   # наружу всегда отдаётся моно
+
+    def __init__(self, manifest_path, samplerate=None):
+        self.path = manifest_path
+        self._target_rate = samplerate
+        self._load()
+
+    def _load(self):
+        manifest = read_manifest(self.path)
+        self.source_rate = manifest['samplerate']
+        self.samplerate = self._target_rate or self.source_rate
+        self.entries = manifest['segments']
+        self.starts = np.array([e['start_frame'] for e in self.entries], dtype=np.int64)
+        self.frames = sum(e['frames'] for e in self.entries)
+
+    @property
+    def duration(self):
+        return self.frames / self.source_rate
+
+    def __len__(self):
+        return self.frames * self.samplerate // self.source_rate
+
+    def _read(self, i, start, stop):
+        for attempt in range(2):
+            try:
+                with sf.SoundFile(segment_path(self.path, self.entries[i])) as f:
+                    f.seek(start)
+                    data = f.read(stop - start, dtype='float32', always_2d=True)
+                return data[:, 0] if data.shape[1] == 1 else data.mean(axis=1)
+            except (OSError, RuntimeError):
+                if attempt:
+                    raise
+                self._load()   # сегмент сжат в FLAC — перечитываем манифест
+
+    def _read_source(self, start, stop):
+        parts = []
+        i = max(0, int(np.searchsorted(self.starts, start, side='right')) - 1)
+        while start < stop and i < len(self.entries):
+            seg_start = int(self.starts[i])
+            seg_end = seg_start + self.entries[i]['frames']
+            end = min(stop, seg_end)
+            parts.append(self._read(i, start - seg_start, end - seg_start))
+            start = end
+            i += 1
+        return np.concatenate(parts).astype(np.float32, copy=False)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("SegmentedAudio supports only slices")
+        start, stop, _ = index.indices(len(self))
+        if stop <= start:
+            return np.zeros(0, dtype=np.float32)
+        if self.samplerate == self.source_rate:
+            return self._read_source(start, stop)
+        import librosa
+        data = self._read_source(start * self.source_rate // self.samplerate,
+                                 -(-stop * self.source_rate // self.samplerate))
+        data = librosa.resample(data, orig_sr=self.source_rate, target_sr=self.samplerate)
+        return np.ascontiguousarray(librosa.util.fix_length(data, size=stop - start),
+                                    dtype=np.float32)
+
+    def close(self):
+        pass
@@ -0,0 +1,130 @@
+# core/service_client.py
+
+import os
+import json
+import time
+import logging
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceError(Exception):
+    """Ошибка сервиса транскрипции."""
+
+
+def service_url(config=None):
+    sc = (config or {}).get('transcription', {}).get('service', {})
+    url = sc.get('url')
+    if not url:
+        url = f"http://{sc.get('host', '127.0.0.1')}:{sc.get('port', 8765)}"
+    return url.rstrip('/')
+
+
+def _request(method, url, data=None, timeout=60):
+    req = urllib.request.Request(url, data=data, method=method)
+    if data is not None:
+        req.add_header('Content-Type', 'application/octet-stream')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read() or b'{}'), resp.headers
+    except urllib.error.HTTPError as e:
+        try:
+            payload = json.loads(e.read() or b'{}')
+        except ValueError:
+            payload = {}
+        return e.code, payload, e.headers
+
+
+def get_status(config=None, timeout=5):
+    """
+    Состояние сервиса (/status): глубина очереди, задержки, счётчики.
+    """
+    status, payload, _ = _request('GET', service_url(config) + "/status", timeout=timeout)
+    if status != 200:
+        raise ServiceError(payload.get('error', f"HTTP {status}"))
+    return payload
+
+
+def _read_upload(file_path, config):
+    """
+    Байты для отправки: файл как есть, а для сегментированной записи —
+    вся запись (после её завершения), сжатая в FLAC.
+    """
+    from core.segments import is_manifest
+    if not is_manifest(file_path):
+        with open(file_path, 'rb') as f:
+            return os.path.basename(file_path), f.read()
+    from core.segments import follow_segments, SegmentedAudio
+    from core.online_whisper import encode_audio
+    timeout = config.get('transcription', {}).get('segment_wait_seconds') if config else None
+    for _ in follow_segments(file_path, timeout=timeout):
+        pass
+    audio = SegmentedAudio(file_path)
+    _, data = encode_audio(audio[0:len(audio)], audio.samplerate, 'flac')
+    return os.path.splitext(os.path.basename(file_path))[0] + ".flac", data
+
+
+def transcribe_service(file_path, config=None, progress=None):
+    """
+    Отправляет файл в общий сервис транскрипции (core.transcription_service)
+    и ждёт результата. Возвращает dict(text, segments, latency_seconds, ...).
+
+    Пока очередь сервиса заполнена, отправка повторяется через Retry-After
+    (не дольше transcription.service.submit_timeout секунд). progress —
+    этапы 'queue' (ожидание в очереди) и 'transcribe'. При отмене задачи
+    (исключение из progress) задача снимается с очереди сервиса.
+    """
+    sc = (config or {}).get('transcription', {}).get('service', {})
+    url = service_url(config)
+    poll = sc.get('poll_seconds', 2.0)
+    submit_timeout = sc.get('submit_timeout', 600)
+    job_timeout = sc.get('timeout', 6 * 3600)
+
+    name, data = _read_upload(file_path, config)
+    t0 = time.perf_counter()
+    with metrics.span('service_request', file=name, bytes=len(data)) as m:
+        while True:
+            status, payload, headers = _request(
+                'POST', f"{url}/jobs?name={urllib.parse.quote(name)}", data, timeout=120)
+            if status == 202:
+                break
+            if status != 503:
+                raise ServiceError(payload.get('error', f"HTTP {status}"))
+            if time.perf_counter() - t0 > submit_timeout:
+                raise ServiceError(f"Service queue is full: {payload.get('error')}")
+            delay = float(headers.get('Retry-After') or poll)
+            logger.info(f"Transcription service queue is full, retry in {delay:.0f}s")
+            if progress is not None:
+                progress('queue', None)
+            time.sleep(delay)
+
+        job_id = payload['id']
+        logger.info(f"Service job {job_id} submitted: {name}, position {payload.get('queue_position')}")
+        try:
+            while payload.get('status') in ('queued', 'running'):
+                if progress is not None:
+                    progress('queue' if payload['status'] == 'queued' else 'transcribe', None)
+                if time.perf_counter() - t0 > job_timeout:
+                    raise ServiceError(f"Service job {job_id} timed out")
+                status, payload, _ = _request('GET', f"{url}/jobs/{job_id}?wait={poll}",
+                                              timeout=poll + 30)
+                if status != 200:
+                    raise ServiceError(payload.get('error', f"HTTP {status}"))
+        except BaseException:
+            if payload.get('status') == 'queued':
+                _request('DELETE', f"{url}/jobs/{job_id}", timeout=10)
+            raise
+
+        m['wait_seconds'] = payload.get('wait_seconds')
+        m['latency_seconds'] = payload.get('latency_seconds')
+        m['batch_size'] = payload.get('batch_size')
+    if payload.get('status') != 'done':
+        raise ServiceError(payload.get('error') or f"Service job {job_id} {payload.get('status')}")
+    logger.info(f"Service job {job_id} done: latency {payload.get('latency_seconds')}s "
+                f"(wait {payload.get('wait_seconds')}s, batch {payload.get('batch_size')})")
+    return payload
@@ -1,68 +1,382 @@
 # virtual_secretary/speaker_diarizer.py
 
 import os
-import librosa
-from resemblyzer import VoiceEncoder, preprocess_wav
-from sklearn.metrics.pairwise import cosine_similarity
+import json
+import hashlib
+import time
+import threading
+import numpy as np
 import logging
+from core.embedding_store import ReferenceEmbeddingStore
+from core import metrics
+from core.audio_reader import open_wav_reader
+from core.segments import is_manifest, SegmentedAudio
 
 logger = logging.getLogger(__name__)
 
+SAMPLE_RATE = 16000
+
+# Общий энкодер и хранилища эталонных эмбеддингов (по папке) между вызовами.
+# librosa и resemblyzer (torch) импортируются при первом использовании.
+_encoder = None
+_encoder_lock = threading.Lock()
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_encoder():
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            from resemblyzer import VoiceEncoder
+            logger.info("Loading VoiceEncoder")
+            _encoder = VoiceEncoder()
+    return _encoder
+
 def format_timestamp(seconds: float) -> str:
     mins = int(seconds) // 60
     secs = int(seconds) % 60
     return f"{mins}:{secs:02d}"
 
-def load_reference_embeddings(reference_dir="reference_voices"):
+def get_reference_store(reference_dir="reference_voices", cache_path=None):
+    """
+    Возвращает синхронизированное с папкой хранилище эталонных эмбеддингов.
+    Пересчитываются только новые или изменённые файлы.
+    """
+    key = (os.path.abspath(reference_dir), cache_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ReferenceEmbeddingStore(reference_dir, cache_path)
+            _stores[key] = store
+    from resemblyzer import preprocess_wav
+    encoder = get_encoder()
+    with metrics.span('reference_embeddings', reference_dir=reference_dir) as m:
+        m['recomputed'] = store.refresh(lambda path: encoder.embed_utterance(preprocess_wav(path)))
+        m['voices'] = len(store.names)
+    return store
+
+def load_reference_embeddings(reference_dir="reference_voices", cache_path=None):
     logger.info(f"Loading reference embeddings from {reference_dir}")
-    encoder = VoiceEncoder()
-    references = {}
-    for filename in os.listdir(reference_dir):
-        if filename.endswith(".wav"):
-            path = os.path.join(reference_dir, filename)
-            name = filename.replace(".wav", "").replace("_", " ")
-            wav = preprocess_wav(path)
-            embed = encoder.embed_utterance(wav)
-            references[name] = embed
-    return references
-
-def identify_speakers(audio_path, transcript_segments, config=None, reference_dir="reference_voices"):
-    encoder = VoiceEncoder()
-    references = load_reference_embeddings(reference_dir)
-    speaker_lines = []
+    return get_reference_store(reference_dir, cache_path).as_dict()
+
+def diarization_fingerprint(config=None, reference_dir="reference_voices"):
+    """
+    Короткий хеш настроек диаризации и набора эталонных голосов (имя, размер,
+    mtime): меняется, если результат диаризации может измениться.
+    """
+    dc = config.get('diarization', {}) if config is not None else {}
+    reference_dir = dc.get('reference_dir', reference_dir)
+    refs = []
+    if os.path.isdir(reference_dir):
+        for filename in sorted(os.listdir(reference_dir)):
+            if filename.endswith(".wav"):
+                st = os.stat(os.path.join(reference_dir, filename))
+                refs.append([filename, st.st_size, st.st_mtime])
+    payload = json.dumps({'diarization': dc, 'references': refs}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def segment_fields(segment):
+    if isinstance(segment, dict):
+        start = segment.get("start", 0.0)
+        end = segment.get("end", 0.0)
+        text = segment.get("text", "")
+    else:
+        start = getattr(segment, "start", 0.0)
+        end = getattr(segment, "end", 0.0)
+        text = getattr(segment, "text", "")
+        text = text.strip()
+    return start, end, text
+
+def load_audio(audio_path, sr=SAMPLE_RATE):
+    """
+    Декодирует и ресэмплирует файл один раз в единый буфер float32.
+    """
+    import librosa
+    wav, _ = librosa.load(audio_path, sr=sr)
+    return np.ascontiguousarray(wav, dtype=np.float32)
+
+def embed_segments(encoder, wav, bounds, sr=SAMPLE_RATE, batch_size=32):
+    """
+    Считает эмбеддинги сегментов пакетно.
+
+    wav    — весь сигнал (float32, sr Гц) или WavReader (core.audio_reader);
+    bounds — список (start, end) в секундах.
+    Сегменты берутся срезами wav без копирования; частичные мел-окна
+    сегментов прогоняются через энкодер батчами по batch_size по мере
+    накопления, так что память не растёт с длиной записи.
+    Возвращает матрицу (len(bounds) x D); для пустых сегментов — нули.
+    """
+    import torch
+    from resemblyzer import audio as rz_audio
+
+    dim = 256
+    out = np.zeros((len(bounds), dim), dtype=np.float32)
+    mels, owners = [], []
+
+    def flush():
+        with torch.no_grad():
+            batch = torch.from_numpy(np.array(mels)).to(encoder.device)
+            partials = encoder(batch).cpu().numpy()
+        np.add.at(out, np.asarray(owners), partials)
+        mels.clear()
+        owners.clear()
+
+    for i, (start, end) in enumerate(bounds):
+        seg = wav[int(start * sr):int(end * sr)]
+        if len(seg) == 0:
+            continue
+        wav_slices, mel_slices = encoder.compute_partial_slices(len(seg), rate=1.3, min_coverage=0.75)
+        max_wave_length = wav_slices[-1].stop
+        if max_wave_length >= len(seg):
+            seg = np.pad(seg, (0, max_wave_length - len(seg)), "constant")
+        mel = rz_audio.wav_to_mel_spectrogram(seg)
+        for s in mel_slices:
+            mels.append(mel[s])
+            owners.append(i)
+            if len(mels) >= batch_size:
+                flush()
+    if mels:
+        flush()
+
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+class WindowEmbeddings:
+    """
+    Эмбеддинги скользящих окон по всей записи, индексированные по времени:
+    starts — начала окон (с), embeds — матрица N x D (float16, компактно).
+    Эмбеддинг сегмента — среднее окон, центры которых попадают в сегмент.
+    """
+
+    def __init__(self, starts, embeds, window_seconds):
+        self.starts = np.asarray(starts, dtype=np.float32)
+        self.embeds = np.asarray(embeds, dtype=np.float16)
+        self.window_seconds = window_seconds
+        self._centers = self.starts + np.float32(window_seconds / 2)
+        dim = self.embeds.shape[1] if self.embeds.ndim == 2 else 256
+        self._cumsum = np.vstack([np.zeros((1, dim), dtype=np.float32),
+                                  np.cumsum(self.embeds, axis=0, dtype=np.float32)])
+
+    def segment_embeddings(self, bounds):
+        n = len(self.starts)
+        out = np.zeros((len(bounds), self._cumsum.shape[1]), dtype=np.float32)
+        if n == 0 or len(bounds) == 0:
+            return out
+        b = np.asarray(bounds, dtype=np.float32).reshape(-1, 2)
+        lo = np.searchsorted(self._centers, b[:, 0], 'left')
+        hi = np.searchsorted(self._centers, b[:, 1], 'right')
+
+        # короткий сегмент без окон внутри — берём окно, ближайшее к его середине
+        empty = hi <= lo
+        if empty.any():
+            mid = (b[empty, 0] + b[empty, 1]) / 2
+            idx = np.searchsorted(self._centers, mid)
+            left = np.clip(idx - 1, 0, n - 1)
+            right = np.clip(idx, 0, n - 1)
+            pick_left = np.abs(self._centers[left] - mid) <= np.abs(self._centers[right] - mid)
+            nearest = np.where(pick_left, left, right)
+            lo[empty] = nearest
+            hi[empty] = nearest + 1
+
+        out[:] = self._cumsum[hi] - self._cumsum[lo]
+        return _normalize_rows(out)
+
+def embed_windows(encoder, wav, sr=SAMPLE_RATE, window_seconds=1.6, step_seconds=0.8,
+                  batch_size=32):
+    """
+    Один проход VoiceEncoder по всей записи скользящим окном window_seconds
+    с шагом step_seconds. Сигнал (массив или WavReader) читается кусками
+    на batch_size окон, поэтому память ограничена. Возвращает WindowEmbeddings.
+    """
+    import torch
+    from resemblyzer import audio as rz_audio
+
+    hop = sr // 100                       # шаг мел-спектрограммы resemblyzer — 10 мс
+    win_frames = int(round(window_seconds * 100))
+    win = win_frames * hop
+    step = max(1, int(round(step_seconds * 100))) * hop
+    n = len(wav)
+    starts = list(range(0, max(n - win, 0) + 1, step))
+
+    embeds = []
+    with torch.no_grad():
+        for b in range(0, len(starts), batch_size):
+            group = starts[b:b + batch_size]
+            region = wav[group[0]:group[-1] + win]
+            if len(region) < group[-1] - group[0] + win:
+                region = np.pad(region, (0, group[-1] - group[0] + win - len(region)), "constant")
+            mel = rz_audio.wav_to_mel_spectrogram(region)
+            mels = np.array([mel[(s - group[0]) // hop:(s - group[0]) // hop + win_frames] for s in group])
+            batch = torch.from_numpy(mels).to(encoder.device)
+            embeds.append(encoder(batch).cpu().numpy().astype(np.float16))
 
+    matrix = np.concatenate(embeds) if embeds else np.zeros((0, 256), dtype=np.float16)
+    return WindowEmbeddings(np.asarray(starts) / sr, matrix, window_seconds)
+
+def _normalize_rows(m):
+    m = np.asarray(m, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return np.divide(m, norms, out=np.zeros_like(m), where=norms > 0)
+
+def match_speakers(embeddings, ref_names, ref_matrix, threshold=0.75):
+    """
+    Сопоставляет эмбеддинги сегментов с эталонами одним матричным произведением.
+    Возвращает (names, scores): имя эталона или None, если сходство <= threshold.
+    """
+    embeddings = _normalize_rows(embeddings)
+    n = len(embeddings)
+    if n == 0 or len(ref_names) == 0:
+        return [None] * n, np.full(n, -1.0, dtype=np.float32)
+    scores = embeddings @ _normalize_rows(ref_matrix).T
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(n), best]
+    names = [ref_names[j] if sc > threshold else None for j, sc in zip(best, best_scores)]
+    return names, best_scores
+
+def cluster_unknown(embeddings, distance_threshold=0.35):
+    """
+    Кластеризует эмбеддинги неопознанных сегментов (агломеративно, косинусное
+    расстояние, average linkage). Номера кластеров выдаются по порядку
+    первого появления, поэтому метки "Speaker 1/2/3" стабильны.
+    Для нулевых эмбеддингов (пустые сегменты) возвращается -1.
+    """
+    embeddings = _normalize_rows(embeddings)
+    labels = np.full(len(embeddings), -1, dtype=int)
+    valid = np.flatnonzero(np.linalg.norm(embeddings, axis=1) > 0)
+    if len(valid) == 0:
+        return labels
+    if len(valid) == 1:
+        labels[valid] = 0
+        return labels
+
+    from sklearn.cluster import AgglomerativeClustering
+    raw = AgglomerativeClustering(
+        n_clusters=None,
+        metric="cosine",
+        linkage="average",
+        distance_threshold=distance_threshold,
+    ).fit_predict(embeddings[valid])
+
+    order = {}
+    for i, lbl in zip(valid, raw):
+        labels[i] = order.setdefault(lbl, len(order))
+    return labels
+
+def assign_speakers(embeddings, config=None, reference_dir="reference_voices"):
+    """
+    Назначает имена говорящих по эмбеддингам сегментов: сопоставление
+    с эталонами, затем кластеризация неопознанных в "Speaker 1/2/3".
+    """
+    dc = config.get('diarization', {}) if config is not None else {}
+    reference_dir = dc.get('reference_dir', reference_dir)
+    store = get_reference_store(reference_dir, dc.get('embeddings_cache'))
+
+    threshold = dc.get('threshold', 0.75)
+    ref_names, ref_matrix = store.snapshot()
+    names, _ = match_speakers(embeddings, ref_names, ref_matrix, threshold)
+
+    # Неопознанные голоса группируем в "Speaker 1/2/3"
+    unknown = [i for i, name in enumerate(names) if name is None]
+    if unknown and dc.get('cluster_unknown', True):
+        labels = cluster_unknown(np.asarray(embeddings)[unknown],
+                                 dc.get('cluster_threshold', 0.35))
+        for i, lbl in zip(unknown, labels):
+            if lbl >= 0:
+                names[i] = f"Speaker {lbl + 1}"
+        logger.info(f"Unknown segments: {len(unknown)}, clusters: {labels.max() + 1}")
+
+    return [name or "Speaker" for name in names]
+
+def format_speaker_lines(segments, names, config=None):
+    """
+    Собирает итоговый текст "[m:ss] Имя: текст" из сегментов (start, end, text).
+    """
     # Опция из конфига (если config не передан — всегда показываем тайм-коды)
     show_timestamps = True
     if config is not None:
         show_timestamps = config.get('diarization', {}).get('show_timestamps', True)
 
-    for segment in transcript_segments:
-        if isinstance(segment, dict):
-            start = segment.get("start", 0.0)
-            end = segment.get("end", 0.0)
-            text = segment.get("text", "")
-        else:
-            start = getattr(segment, "start", 0.0)
-            end = getattr(segment, "end", 0.0)
-            text = getattr(segment, "text", "")
-            text = text.strip()
-
-        wav, sr = librosa.load(audio_path, sr=16000, offset=start, duration=end - start)
-        segment_embed = encoder.embed_utterance(wav)
-
-        best_match = None
-        best_score = -1.0
-        for name, ref_embed in references.items():
-            score = cosine_similarity([segment_embed], [ref_embed])[0][0]
-            if score > best_score:
-                best_score = score
-                best_match = name
-
-        speaker_name = best_match if best_score > 0.75 else "Speaker"
+    speaker_lines = []
+    for (start, end, text), speaker_name in zip(segments, names):
         if show_timestamps:
             ts = format_timestamp(start)
             speaker_lines.append(f"[{ts}] {speaker_name}: {text}")
         else:
             speaker_lines.append(f"{speaker_name}: {text}")
-
     return "\n".join(speaker_lines)
+
+def open_audio(audio_path):
+    """
+    Сигнал для диаризации: WavReader для 16-кГц PCM_16 WAV, SegmentedAudio
+    (срезы в 16 кГц) для манифеста сегментированной записи, иначе однократно
+    декодированный массив.
+    """
+    if is_manifest(audio_path):
+        return SegmentedAudio(audio_path, SAMPLE_RATE)
+    reader = open_wav_reader(audio_path)
+    if reader is not None and reader.samplerate == SAMPLE_RATE:
+        return reader
+    return load_audio(audio_path)
+
+def compute_window_embeddings(audio, config=None):
+    """
+    Эмбеддинги скользящих окон с параметрами из секции diarization
+    (window_seconds, step_seconds, embed_batch_size). Не зависит от сегментов
+    Whisper, поэтому может считаться параллельно с распознаванием.
+    """
+    dc = config.get('diarization', {}) if config is not None else {}
+    t0 = time.perf_counter()
+    with metrics.span('window_embeddings', audio_seconds=round(len(audio) / SAMPLE_RATE, 2)) as m:
+        we = embed_windows(get_encoder(), audio, SAMPLE_RATE,
+                           dc.get('window_seconds', 1.6), dc.get('step_seconds', 0.8),
+                           dc.get('embed_batch_size', 32))
+        m['windows'] = len(we.starts)
+    logger.info(f"Window embeddings: {len(we.starts)} windows in {time.perf_counter() - t0:.1f}s")
+    return we
+
+def identify_speakers(audio_path, transcript_segments, config=None,
+                      reference_dir="reference_voices", audio=None, window_embeddings=None):
+    """
+    Подписывает сегменты стенограммы именами говорящих.
+
+    audio — уже декодированный сигнал (моно, 16 кГц, float32) или WavReader,
+    если есть; иначе 16-кГц PCM_16 WAV читается окнами через memmap,
+    прочие файлы декодируются один раз (diarization.decode_once, по умолчанию)
+    или, в старом режиме, librosa.load на каждый сегмент.
+
+    При diarization.method: windows эмбеддинги сегментов берутся из одного
+    прохода скользящим окном (window_embeddings, если уже посчитаны).
+    """
+    with metrics.span('identify_speakers', segments=len(transcript_segments)):
+        encoder = get_encoder()
+        dc = config.get('diarization', {}) if config is not None else {}
+
+        segments = [segment_fields(seg) for seg in transcript_segments]
+        bounds = [(start, end) for start, end, _ in segments]
+
+        use_windows = window_embeddings is not None or dc.get('method', 'segments') == 'windows'
+        t0 = time.perf_counter()
+        with metrics.span('segment_embeddings', segments=len(bounds),
+                          method='windows' if use_windows else 'segments'):
+            if use_windows:
+                if window_embeddings is None:
+                    window_embeddings = compute_window_embeddings(
+                        audio if audio is not None else open_audio(audio_path), config)
+                embeddings = window_embeddings.segment_embeddings(bounds)
+            elif audio is not None or dc.get('decode_once', True):
+                if audio is None:
+                    audio = open_audio(audio_path)
+                embeddings = embed_segments(encoder, audio, bounds,
+                                            batch_size=dc.get('embed_batch_size', 32))
+            else:
+                import librosa
+                embeddings = []
+                for start, end in bounds:
+                    wav, sr = librosa.load(audio_path, sr=SAMPLE_RATE, offset=start, duration=end - start)
+                    embeddings.append(encoder.embed_utterance(wav))
+        logger.info(f"Segment embeddings: {len(bounds)} segments in {time.perf_counter() - t0:.1f}s")
+
+        with metrics.span('speaker_assignment', segments=len(bounds)):
+            names = assign_speakers(embeddings, config, reference_dir)
+        return format_speaker_lines(segments, names, config)
@@ -0,0 +1,90 @@
+# core/summary_cache.py
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+from core.transcript_cache import evict_lru
+
+logger = logging.getLogger(__name__)
+
+_caches = {}
+
+
+class SummaryCache:
+    """
+    Дисковый кэш ответов GPT. Ключ — хеш (system-промпт, итоговый промпт
+    со стенограммой, модель, temperature). Записи старше ttl_seconds
+    считаются устаревшими; размер папки ограничен max_bytes (LRU).
+    """
+
+    def __init__(self, cache_dir="cache/summaries", max_bytes=50 * 1024 * 1024,
+                 ttl_seconds=30 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(system, prompt, model, temperature):
+        h = hashlib.sha256()
+        for part in (system, prompt, model, repr(float(temperature))):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Broken summary cache entry {key}: {e}")
+            return None
+        if self.ttl_seconds and time.time() - entry.get('created', 0) > self.ttl_seconds:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)  # отметка использования для LRU
+        except OSError:
+            pass
+        return entry.get('content')
+
+    def put(self, key, content):
+        path = self._path(key)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'created': time.time(), 'content': content}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Failed to write summary cache: {e}")
+            return
+        evict_lru(self.cache_dir, self.max_bytes)
+
+
+def get_summary_cache(config=None):
+    """
+    Возвращает общий SummaryCache по настройкам summary_cache или None, если выключен.
+    """
+    cc = (config or {}).get('summary_cache', {})
+    if not cc.get('enabled', True):
+        return None
+    cache_dir = cc.get('dir', 'cache/summaries')
+    cache = _caches.get(cache_dir)
+    if cache is None:
+        cache = SummaryCache(cache_dir,
+                             int(cc.get('max_mb', 50) * 1024 * 1024),
+                             cc.get('ttl_hours', 24 * 30) * 3600)
+        _caches[cache_dir] = cache
+    return cache
@@ -1,97 +1,470 @@
 # core/transcriber.py
 
+import time
+import json
+import os
+import threading
+import numpy as np
 import soundfile as sf
-import whisper
-from core.speaker_diarizer import identify_speakers
+from core import metrics
+from concurrent.futures import ThreadPoolExecutor
+from core.speaker_diarizer import (
+    identify_speakers, segment_fields, diarization_fingerprint, compute_window_embeddings,
+)
+from core.transcript_cache import get_transcript_cache
+from core.online_whisper import transcribe_online, find_split_points
+from core.service_client import transcribe_service, service_url
+from core.vad import speech_regions, SpeechMap, vad_config
+from core.audio_reader import open_wav_reader, quietest_point
+from core.segments import (
+    is_manifest, read_manifest, manifest_fingerprint, follow_segments, read_segment,
+    segment_path, SegmentedAudio,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
-try:
-    import openai
-except ImportError:
-    openai = None
+class WhisperEngine:
+    """
+    Движок openai-whisper (PyTorch, fp32 на CPU) — поведение по умолчанию.
+    threads — число потоков torch (0 — по умолчанию torch).
+    """
+    name = 'whisper'
+
+    def __init__(self, model_name, threads=0, beam_size=None, **_):
+        import whisper
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model_name = model_name
+        self.beam_size = beam_size
+        self.model = whisper.load_model(model_name)
+
+    def transcribe(self, audio, language=None):
+        kwargs = {'language': language} if language else {}
+        if self.beam_size:
+            kwargs['beam_size'] = self.beam_size
+        return self.model.transcribe(audio, **kwargs).get('segments', [])
+
+class FasterWhisperEngine:
+    """
+    Движок faster-whisper (CTranslate2): на CPU по умолчанию int8-квантование
+    весов (transcription.compute_type), threads — cpu_threads CTranslate2.
+    """
+    name = 'faster-whisper'
+
+    def __init__(self, model_name, threads=0, beam_size=None, compute_type='int8', device='cpu'):
+        from faster_whisper import WhisperModel
+        self.model_name = model_name
+        self.beam_size = beam_size
+        self.model = WhisperModel(model_name, device=device, compute_type=compute_type,
+                                  cpu_threads=threads or 0)
+
+    def transcribe(self, audio, language=None):
+        kwargs = {'language': language} if language else {}
+        if self.beam_size:
+            kwargs['beam_size'] = self.beam_size
+        pieces, _ = self.model.transcribe(audio, **kwargs)
+        # сегменты — генератор: распознавание идёт по мере чтения
+        return [{'id': seg.id, 'start': seg.start, 'end': seg.end, 'text': seg.text,
+                 'avg_logprob': seg.avg_logprob, 'no_speech_prob': seg.no_speech_prob}
+                for seg in pieces]
 
-# Кэш самой модели и её имени (для offline)
+_ENGINE_CLASSES = {'whisper': WhisperEngine, 'faster-whisper': FasterWhisperEngine}
+ENGINES = tuple(_ENGINE_CLASSES)
+
+# Кэш загруженного движка и его параметров (для offline); whisper (torch)
+# и faster_whisper импортируются только при загрузке модели
 _model = None
-_current_model_name = None
+_model_params = None
+_model_lock = threading.Lock()
+
+def _resolve_model_name(config=None, model_name=None):
+    if model_name is None and config:
+        model_name = config.get('transcription', {}).get('model', 'medium')
+    return model_name or 'medium'
 
-def transcribe_audio(file_path, config=None, model_name=None):
+def engine_params(config=None):
     """
-    Транскрибирует WAV-файл через Whisper (локально или через API) и идентифицирует говорящих.
+    Настройки движка из transcription: engine, threads, compute_type, beam_size.
     """
-    # 1. Определяем режим
-    mode = 'offline'
+    tc = config.get('transcription', {}) if config else {}
+    engine = tc.get('engine', 'whisper')
+    if engine not in _ENGINE_CLASSES:
+        raise ValueError(f"Неизвестный движок транскрипции: {engine}")
+    params = {'engine': engine, 'threads': tc.get('threads', 0), 'beam_size': tc.get('beam_size')}
+    if engine == 'faster-whisper':
+        params['compute_type'] = tc.get('compute_type', 'int8')
+    return params
+
+def engine_id(config=None, model_name=None):
+    """
+    Идентификатор модели для кэша стенограмм: у разных движков и
+    квантований результаты различаются.
+    """
+    model_name = _resolve_model_name(config, model_name)
+    params = engine_params(config)
+    if params['engine'] == 'whisper':
+        return model_name
+    return f"{params['engine']}:{params['compute_type']}:{model_name}"
+
+def load_engine(config=None, model_name=None):
+    """
+    Загружает (или берёт из кэша) движок распознавания, выбранный
+    в transcription.engine: 'whisper' (openai-whisper) или 'faster-whisper'.
+    """
+    global _model, _model_params
+
+    model_name = _resolve_model_name(config, model_name)
+    params = dict(engine_params(config), model=model_name)
+    with _model_lock:
+        if _model is None or _model_params != params:
+            engine = params['engine']
+            logger.info(f"[OFFLINE] Loading {engine} model '{model_name}' (this may take a while)...")
+            kwargs = {k: v for k, v in params.items() if k not in ('engine', 'model')}
+            with metrics.span('model_load', model=model_name, engine=engine):
+                _model = _ENGINE_CLASSES[engine](model_name, **kwargs)
+            _model_params = params
+            logger.info(f"[OFFLINE] {engine} model loaded: '{model_name}'")
+        return _model
+
+def load_whisper_model(model_name='medium', config=None):
+    """
+    Загружает (или берёт из кэша) локальную модель Whisper выбранного движка.
+    """
+    return load_engine(config, model_name)
+
+def _whisper_transcribe(model, audio, lang=None, sr=16000, progress=None,
+                        to_original=None, piece_seconds=300.0):
+    """
+    Прогон Whisper. Если передан progress, сигнал режется по паузам на части
+    не длиннее piece_seconds: после каждой части сообщается доля обработанного
+    аудио и готовые сегменты (с тайм-кодами через to_original), а между
+    частями возможна отмена.
+    """
+    if lang:
+        logger.info(f"[OFFLINE] Transcribing with forced language: '{lang}'")
+    if progress is None:
+        with metrics.span('whisper', audio_seconds=round(len(audio) / sr, 2)) as m:
+            segments = model.transcribe(audio, lang)
+            m['segments'] = len(segments)
+        return segments
+
+    cuts = find_split_points(audio, sr, piece_seconds)
+    segments = []
+    for start, end in zip([0] + cuts, cuts + [len(audio)]):
+        progress('transcribe', start / len(audio))
+        offset = start / sr
+        with metrics.span('whisper', audio_seconds=round((end - start) / sr, 2)) as m:
+            piece = model.transcribe(audio[start:end], lang)
+            m['segments'] = len(piece)
+        for seg in piece:
+            seg['start'] = seg.get('start', 0.0) + offset
+            seg['end'] = seg.get('end', 0.0) + offset
+        segments.extend(piece)
+        if to_original is not None:
+            piece = [dict(seg, start=to_original(seg['start']), end=to_original(seg['end']))
+                     for seg in piece]
+        progress('transcribe', end / len(audio), piece)
+    return segments
+
+def transcribe_array(audio, config=None, model_name=None, sr=16000, progress=None):
+    """
+    Распознаёт сигнал (моно, 16 кГц, float32) локальным Whisper
+    (движок — transcription.engine, см. load_engine). Возвращает список сегментов Whisper (dict со start/end/text).
+
+    Если включён VAD (transcription.vad.enabled), в Whisper уходят только
+    речевые участки, склеенные в один сигнал; тайм-коды сегментов
+    пересчитываются обратно в шкалу исходной записи.
+
+    progress(stage, fraction, segments=None) — необязательный колбэк
+    прогресса (см. core.jobs.Job.progress).
+    """
+    model = load_engine(config, model_name)
+
+    lang = None
+    piece_seconds = 300.0
     if config:
-        mode = config.get('transcription', {}).get('mode', 'offline')
+        lang = config.get("transcription", {}).get("language")
+        piece_seconds = config.get("transcription", {}).get("progress_chunk_seconds", 300.0)
 
-    # --- OFFLINE Whisper (локальный) ---
-    if mode == 'offline':
-        global _model, _current_model_name
+    vc = vad_config(config)
+    if vc is None:
+        return _whisper_transcribe(model, audio, lang, sr, progress, None, piece_seconds)
 
-        if model_name is None and config:
-            model_name = config.get('transcription', {}).get('model', 'medium')
-        model_name = model_name or 'medium'
+    regions = speech_regions(
+        audio, sr,
+        margin_db=vc.get('margin_db', 12.0),
+        floor_db=vc.get('floor_db', -55.0),
+        min_silence=vc.get('min_silence', 0.6),
+        padding=vc.get('padding', 0.3),
+    )
+    speech_map = SpeechMap(regions, sr)
+    speech = speech_map.extract(audio)
+    total = len(audio) / sr
+    speech_sec = len(speech) / sr
+    if speech_sec == 0:
+        logger.info(f"[VAD] No speech found in {total:.1f}s of audio")
+        return []
 
-        logger.info(f"[OFFLINE] Requested Whisper model: '{model_name}'")
+    t0 = time.perf_counter()
+    segments = _whisper_transcribe(model, speech, lang, sr, progress,
+                                   speech_map.to_original, piece_seconds)
+    elapsed = time.perf_counter() - t0
+    saved = elapsed * (total - speech_sec) / speech_sec
+    logger.info(f"[VAD] Speech ratio {speech_sec / total:.0%} ({speech_sec:.0f}s of {total:.0f}s, "
+                f"{len(regions)} regions); Whisper {elapsed:.1f}s, ~{saved:.1f}s saved")
 
-        if _model is None or _current_model_name != model_name:
-            logger.info(f"[OFFLINE] Loading Whisper model '{model_name}' (this may take a while)...")
-            _model = whisper.load_model(model_name)
-            _current_model_name = model_name
-            logger.info(f"[OFFLINE] Whisper model loaded: '{model_name}'")
+    for seg in segments:
+        seg['start'] = speech_map.to_original(seg.get('start', 0.0))
+        seg['end'] = speech_map.to_original(seg.get('end', 0.0))
+    return segments
 
-        audio, sr = sf.read(file_path)
-        if audio.dtype != 'float32':
-            audio = audio.astype('float32')
+def transcribe_reader(reader, config=None, model_name=None, progress=None):
+    """
+    Распознаёт запись окнами (transcription.progress_chunk_seconds, граница —
+    по паузе), читая WAV через memmap: пиковая память не зависит от длины
+    записи. Возвращает сегменты с тайм-кодами от начала файла.
+    """
+    piece_seconds = 300.0
+    if config:
+        piece_seconds = config.get("transcription", {}).get("progress_chunk_seconds", 300.0)
 
-        lang = None
-        if config:
-            lang = config.get("transcription", {}).get("language")
+    sr = reader.samplerate
+    segments = []
+    for start, block in reader.windows(piece_seconds):
+        if progress is not None:
+            progress('transcribe', start / reader.frames)
+        offset = start / sr
+        piece = transcribe_array(block, config, model_name, sr)
+        for seg in piece:
+            seg['start'] = seg.get('start', 0.0) + offset
+            seg['end'] = seg.get('end', 0.0) + offset
+        segments.extend(piece)
+        if progress is not None:
+            progress('transcribe', (start + len(block)) / reader.frames, piece)
+    return segments
 
-        if lang:
-            logger.info(f"[OFFLINE] Transcribing with forced language: '{lang}'")
-            result = _model.transcribe(audio, language=lang)
-        else:
-            result = _model.transcribe(audio)
+def transcribe_segments(manifest_path, config=None, model_name=None, progress=None):
+    """
+    Распознаёт сегментированную запись (см. core.segments) по мере появления
+    сегментов, в том числе пока запись ещё идёт. Граница между сегментами
+    переносится на паузу в последних transcription.segment_search_seconds
+    сегмента; хвост распознаётся вместе со следующим сегментом.
+    Возвращает сегменты с тайм-кодами от начала записи.
+    """
+    tc = config.get('transcription', {}) if config else {}
+    search_seconds = tc.get('segment_search_seconds', 5.0)
+    timeout = tc.get('segment_wait_seconds')
 
-        segments = result.get('segments', [])
-        if not segments:
-            return '[Empty transcription]'
+    sr = 16000
+    segments = []
+    carry = np.zeros(0, dtype=np.float32)
+    carry_start = 0
+    rate = None
+    for entry in follow_segments(manifest_path, timeout=timeout):
+        samples = read_segment(manifest_path, entry)
+        if rate is None:
+            rate = read_manifest(manifest_path)['samplerate']
+        if rate != sr:
+            import librosa
+            samples = librosa.resample(samples, orig_sr=rate, target_sr=sr)
+        block = np.concatenate([carry, samples])
+        search = min(int(search_seconds * sr), len(block) // 2)
+        cut = len(block) - search + quietest_point(block[-search:], sr) if search else len(block)
+        piece = _transcribe_block(block[:cut], carry_start / sr, config, model_name, sr)
+        segments.extend(piece)
+        carry, carry_start = block[cut:], carry_start + cut
+        logger.info(f"[OFFLINE] Segment {entry['index'] + 1} transcribed "
+                    f"({entry['start']:.0f}s-{entry['start'] + entry['duration']:.0f}s)")
+        if progress is not None:
+            progress('transcribe', None, piece)
+    if len(carry):
+        piece = _transcribe_block(carry, carry_start / sr, config, model_name, sr)
+        segments.extend(piece)
+        if progress is not None:
+            progress('transcribe', None, piece)
+    return segments
 
-        return identify_speakers(file_path, segments, config)
+def _transcribe_block(block, offset, config, model_name, sr):
+    piece = transcribe_array(block, config, model_name, sr) if len(block) else []
+    for seg in piece:
+        seg['start'] = seg.get('start', 0.0) + offset
+        seg['end'] = seg.get('end', 0.0) + offset
+    return piece
 
-         # --- ONLINE Whisper API ---
-    elif mode == 'online':
+def _transcribe_segments_online(manifest_path, config=None, progress=None):
+    """
+    Online-режим для сегментированной записи: каждый сегмент отправляется
+    в API, как только готов; тайм-коды сдвигаются на начало сегмента.
+    """
+    timeout = config.get('transcription', {}).get('segment_wait_seconds') if config else None
+    segments = []
+    for entry in follow_segments(manifest_path, timeout=timeout):
+        if progress is not None:
+            progress('upload', None)
         try:
-            from openai import OpenAI
-        except ImportError:
-            raise ImportError("Для online-режима нужен пакет openai: pip install openai")
+            piece = transcribe_online(segment_path(manifest_path, entry), config)
+        except (OSError, RuntimeError):
+            # сегмент успели сжать в FLAC — берём новый путь из манифеста
+            entry = read_manifest(manifest_path)['segments'][entry['index']]
+            piece = transcribe_online(segment_path(manifest_path, entry), config)
+        piece = [dict(zip(('start', 'end', 'text'), segment_fields(seg))) for seg in piece]
+        for seg in piece:
+            seg['start'] += entry['start']
+            seg['end'] += entry['start']
+        segments.extend(piece)
+    return segments
 
-        from core.config_loader import get_api_key_env
-        section_cfg = config.get("transcription", {}) if config else {}
-        api_key = get_api_key_env(section_cfg)
-        lang = section_cfg.get("language")
-
-        if not api_key:
-            raise ValueError("API-ключ для online-режима не задан (ни api_key, ни api_key_env, ни OPENAI_API_KEY)")
+def _cache_key(cache, file_path, mode, model_key, lang, variant):
+    """
+    Ключ кэша стенограмм; для сегментированной записи — по шкале сегментов
+    и только для завершённой записи (иначе None).
+    """
+    if not is_manifest(file_path):
+        return cache.make_key(file_path, mode, model_key, lang, variant)
+    try:
+        manifest = read_manifest(file_path)
+    except FileNotFoundError:
+        return None
+    if not manifest.get('complete'):
+        return None
+    return cache.make_key(file_path, mode, model_key, lang, variant,
+                          content_hash=manifest_fingerprint(manifest))
 
-        client = OpenAI(api_key=api_key)
+def transcribe_audio(file_path, config=None, model_name=None, progress=None):
+    """
+    Транскрибирует WAV-файл через Whisper (локально, через API или общий
+    сервис транскрипции) и идентифицирует говорящих.
+    Вместо WAV можно передать манифест сегментированной записи (.json, см.
+    core.segments): сегменты распознаются по мере готовности как одна запись.
 
-        logger.info("[ONLINE] Загружаем аудиофайл для отправки в OpenAI Whisper API")
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language=lang,
-                response_format="verbose_json"
-            )
+    progress(stage, fraction, segments=None) — необязательный колбэк прогресса;
+    этапы: 'transcribe', 'upload', 'diarize', 'queue' (очередь сервиса).
 
-        segments = getattr(transcript, "segments", [])
-        if not segments:
-            return '[Empty transcription]'
+    Результаты кэшируются (см. core.transcript_cache): по хешу аудио, режиму,
+    модели и языку хранятся сегменты Whisper, а для каждого набора настроек
+    диаризации — готовая стенограмма.
+    """
+    with metrics.span('transcribe_audio', file=os.path.basename(file_path)):
+        return _transcribe_audio(file_path, config, model_name, progress)
 
-        return identify_speakers(file_path, segments, config)
+def _transcribe_audio(file_path, config=None, model_name=None, progress=None):
+    # 1. Определяем режим
+    mode = 'offline'
+    if config:
+        mode = config.get('transcription', {}).get('mode', 'offline')
+    if mode not in ('offline', 'online', 'service'):
+        raise ValueError(f"Неизвестный режим транскрипции: {mode}")
 
+    lang = config.get("transcription", {}).get("language") if config else None
+    if mode == 'offline':
+        model_name = _resolve_model_name(config, model_name)
+        model_key = engine_id(config, model_name)
+    elif mode == 'service':
+        # модели выбирает сервис; результат кэшируется по его адресу
+        model_name = model_key = f"service:{service_url(config)}"
     else:
-        raise ValueError(f"Неизвестный режим транскрипции: {mode}")
+        model_name = model_key = 'whisper-1'
+
+    # 2. Кэш: готовая стенограмма или хотя бы сегменты Whisper
+    cache = get_transcript_cache(config)
+    segmented = is_manifest(file_path)
+    segments = None
+    key = None
+    if cache is not None:
+        vc = vad_config(config) if mode == 'offline' else None
+        variant = json.dumps(vc, sort_keys=True) if vc else ''
+        key = _cache_key(cache, file_path, mode, model_key, lang, variant)
+        diar_key = diarization_fingerprint(config)
+    if key is not None:
+        text = cache.get_diarized(key, diar_key)
+        if text is not None:
+            logger.info(f"Transcript cache hit: {file_path}")
+            metrics.count('transcript_cache_hit', kind='diarized')
+            return text
+        segments = cache.get_segments(key)
+        if segments is not None:
+            logger.info(f"Transcript cache hit (segments only): {file_path}")
+            metrics.count('transcript_cache_hit', kind='segments')
+
+    # --- Общий сервис транскрипции: распознавание и диаризация на сервере ---
+    if mode == 'service':
+        result = transcribe_service(file_path, config, progress)
+        if cache is not None and key is None:
+            key = _cache_key(cache, file_path, mode, model_key, lang, variant)
+        if key is not None:
+            cache.put_segments(key, result.get('segments') or [])
+            cache.put_diarized(key, diar_key, result['text'])
+        return result['text']
+
+    audio = None
+    window_future = None
+    if segments is None:
+        # --- Сегментированная запись: сегменты по мере готовности ---
+        if segmented:
+            if mode == 'offline':
+                segments = transcribe_segments(file_path, config, model_name, progress)
+            else:
+                segments = _transcribe_segments_online(file_path, config, progress)
+            audio = SegmentedAudio(file_path, 16000)
+
+        # --- OFFLINE Whisper (локальный) ---
+        elif mode == 'offline':
+            logger.info(f"[OFFLINE] Requested Whisper model: '{model_key}'")
+
+            # 16-кГц PCM_16 WAV (как пишет AudioRecorder) читаем окнами через memmap
+            reader = None
+            if config is None or config.get('transcription', {}).get('stream_audio', True):
+                reader = open_wav_reader(file_path)
+                if reader is not None and reader.samplerate != 16000:
+                    reader = None
+
+            if reader is not None:
+                audio, sr = reader, reader.samplerate
+            else:
+                with metrics.span('audio_decode'):
+                    audio, sr = sf.read(file_path, dtype='float32')
+
+            # Эмбеддинги скользящих окон не зависят от сегментов — считаем
+            # их параллельно с Whisper
+            dc = config.get('diarization', {}) if config else {}
+            if dc.get('method', 'segments') == 'windows' and sr == 16000 and audio.ndim == 1:
+                pool = ThreadPoolExecutor(max_workers=1)
+                window_future = pool.submit(compute_window_embeddings, audio, config)
+                pool.shutdown(wait=False)
+
+            if reader is not None:
+                logger.info(f"[OFFLINE] Streaming {reader.duration:.0f}s of audio from {file_path}")
+                segments = transcribe_reader(reader, config, model_name, progress)
+            else:
+                segments = transcribe_array(audio, config, model_name, sr, progress)
+                # Уже декодированный сигнал отдаём диаризатору, чтобы не читать файл повторно
+                if sr != 16000 or audio.ndim != 1:
+                    audio = None
+
+        # --- ONLINE Whisper API ---
+        else:
+            if progress is not None:
+                progress('upload', None)
+            with metrics.span('whisper_online'):
+                segments = transcribe_online(file_path, config)
+
+        segments = [dict(zip(('start', 'end', 'text'), segment_fields(seg))) for seg in segments]
+        if cache is not None and key is None:
+            # запись завершилась во время распознавания
+            key = _cache_key(cache, file_path, mode, model_key, lang, variant)
+        if key is not None:
+            cache.put_segments(key, segments)
+
+    if not segments:
+        return '[Empty transcription]'
+
+    if progress is not None:
+        progress('diarize', None)
+    window_embeddings = window_future.result() if window_future is not None else None
+    text = identify_speakers(file_path, segments, config, audio=audio,
+                             window_embeddings=window_embeddings)
+    if key is not None:
+        cache.put_diarized(key, diar_key, text)
+    return text
@@ -0,0 +1,163 @@
+# core/transcript_cache.py
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+from core.embedding_store import file_sha1
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# Экземпляры кэша по папке и память хешей файлов (путь -> (size, mtime, sha1))
+_caches = {}
+_file_hashes = {}
+
+
+def audio_hash(path):
+    """
+    SHA-1 содержимого аудиофайла; повторно не считается, пока не изменились
+    размер или mtime.
+    """
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    cached = _file_hashes.get(key)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime:
+        return cached[2]
+    digest = file_sha1(path)
+    _file_hashes[key] = (st.st_size, st.st_mtime, digest)
+    return digest
+
+
+def evict_lru(cache_dir, max_bytes):
+    """
+    Удаляет самые старые по использованию (mtime) .json-записи папки,
+    пока её размер больше max_bytes.
+    """
+    files = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    if total <= max_bytes:
+        return
+    files.sort()
+    for mtime, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            logger.info(f"Cache evicted {os.path.basename(path)} "
+                        f"(unused {time.time() - mtime:.0f}s)")
+        except OSError:
+            pass
+
+
+class TranscriptCache:
+    """
+    Дисковый кэш результатов транскрипции, адресуемый по содержимому.
+
+    Ключ — хеш аудио + режим + модель Whisper + язык. В записи хранятся
+    сырые сегменты Whisper (start/end/text) и готовые стенограммы
+    для разных настроек диаризации, поэтому смена только диаризации
+    переиспользует сегменты. Размер папки ограничен max_bytes; при
+    превышении удаляются давно не использованные записи (LRU по mtime).
+    """
+
+    def __init__(self, cache_dir="cache/transcripts", max_bytes=500 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, file_path, mode, model_name, language=None, variant='', content_hash=None):
+        """
+        variant — прочие параметры, влияющие на сегменты (например, настройки VAD).
+        content_hash — готовый хеш содержимого вместо хеша файла
+        (для сегментированных записей, см. core.segments.manifest_fingerprint).
+        """
+        raw = f"{CACHE_VERSION}|{content_hash or audio_hash(file_path)}|{mode}|{model_name}|{language or ''}|{variant}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Broken transcript cache entry {key}: {e}")
+            return None
+        try:
+            os.utime(path)  # отметка использования для LRU
+        except OSError:
+            pass
+        return entry
+
+    def _write(self, key, entry):
+        path = self._path(key)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Failed to write transcript cache: {e}")
+            return
+        self.evict()
+
+    def get_segments(self, key):
+        entry = self._read(key)
+        return entry.get('segments') if entry else None
+
+    def put_segments(self, key, segments):
+        entry = self._read(key) or {}
+        entry['segments'] = segments
+        entry.setdefault('diarized', {})
+        self._write(key, entry)
+
+    def get_diarized(self, key, diarization_key):
+        entry = self._read(key)
+        if not entry:
+            return None
+        return entry.get('diarized', {}).get(diarization_key)
+
+    def put_diarized(self, key, diarization_key, text):
+        entry = self._read(key)
+        if entry is None:
+            return
+        entry.setdefault('diarized', {})[diarization_key] = text
+        self._write(key, entry)
+
+    def evict(self):
+        evict_lru(self.cache_dir, self.max_bytes)
+
+
+def get_transcript_cache(config=None):
+    """
+    Возвращает общий TranscriptCache по настройкам transcript_cache
+    или None, если кэш выключен.
+    """
+    cc = (config or {}).get('transcript_cache', {})
+    if not cc.get('enabled', True):
+        return None
+    cache_dir = cc.get('dir', 'cache/transcripts')
+    cache = _caches.get(cache_dir)
+    if cache is None:
+        cache = TranscriptCache(cache_dir, int(cc.get('max_mb', 500) * 1024 * 1024))
+        _caches[cache_dir] = cache
+    return cache
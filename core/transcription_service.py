@@ -0,0 +1,496 @@
+# core/transcription_service.py
+"""
+Общий сервис транскрипции для нескольких рабочих мест:
+
+    python -m core.transcription_service --config config/settings.yaml --port 8765
+
+Держит в памяти один прогретый набор моделей (Whisper выбранного движка и
+VoiceEncoder) и принимает задачи по HTTP от клиентов с
+transcription.mode: service (см. core.service_client).
+
+    POST   /jobs?name=<файл>   тело — аудиофайл (WAV/FLAC); 202 {id, queue_depth},
+                               503 при заполненной очереди (Retry-After) или
+                               413, если запись длиннее всего лимита очереди
+    GET    /jobs/<id>?wait=N   состояние задачи; ждёт завершения до N секунд
+    DELETE /jobs/<id>          отмена задачи, ещё стоящей в очереди
+    GET    /status             глубина очереди, задержки, счётчики
+"""
+
+import io
+import json
+import time
+import uuid
+import argparse
+import threading
+import collections
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import soundfile as sf
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+class QueueFull(Exception):
+    """Очередь сервиса заполнена."""
+
+
+class TooLong(Exception):
+    """Запись не помещается в очередь даже пустую."""
+
+
+class ServiceJob:
+    def __init__(self, name, audio):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.audio = audio
+        self.duration = len(audio) / SAMPLE_RATE
+        self.status = 'queued'      # queued | running | done | error | cancelled
+        self.text = None
+        self.segments = None
+        self.error = None
+        self.batch_size = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def info(self, queue_position=None):
+        d = {'id': self.id, 'name': self.name, 'status': self.status,
+             'audio_seconds': round(self.duration, 2)}
+        if queue_position is not None:
+            d['queue_position'] = queue_position
+        if self.started is not None:
+            d['wait_seconds'] = round(self.started - self.created, 3)
+        if self.finished is not None:
+            d['processing_seconds'] = round(self.finished - (self.started or self.finished), 3)
+            d['latency_seconds'] = round(self.finished - self.created, 3)
+            d['batch_size'] = self.batch_size
+        if self.status == 'done':
+            d['text'] = self.text
+            d['segments'] = self.segments
+        elif self.status == 'error':
+            d['error'] = self.error
+        return d
+
+
+def probe_duration(data):
+    """
+    Длительность присланного файла по заголовку, без декодирования.
+    """
+    return sf.info(io.BytesIO(data)).duration
+
+
+def decode_audio(data):
+    """
+    Декодирует присланный файл в моно float32 16 кГц.
+    """
+    audio, sr = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+    audio = audio[:, 0] if audio.shape[1] == 1 else audio.mean(axis=1)
+    if sr != SAMPLE_RATE:
+        import librosa
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=SAMPLE_RATE)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+class TranscriptionService:
+    """
+    Очередь задач транскрипции с одним прогретым набором моделей.
+
+    Очередь ограничена queue_size задачами и max_queued_seconds секундами
+    аудио в памяти (ожидающие и выполняющиеся задачи держат декодированный
+    сигнал, 64 КБ на секунду); дальше — QueueFull. Короткие
+    записи (не длиннее batch_max_seconds) склеиваются через паузу
+    gap_seconds в один прогон Whisper до batch_size штук, сегменты затем
+    раздаются обратно по записям; диаризация — для каждой записи отдельно.
+    """
+
+    def __init__(self, config, queue_size=16, batch_max_seconds=30.0, batch_size=8,
+                 batch_wait_seconds=0.2, gap_seconds=1.0, keep_results=200,
+                 max_queued_seconds=4 * 3600):
+        self.config = config
+        self.queue_size = queue_size
+        self.max_queued_seconds = max_queued_seconds
+        self.batch_max_seconds = batch_max_seconds
+        self.batch_size = max(1, batch_size)
+        self.batch_wait_seconds = batch_wait_seconds
+        self.gap_seconds = gap_seconds
+        self.keep_results = keep_results
+        self._queue = collections.deque()
+        self._jobs = collections.OrderedDict()
+        self._cond = threading.Condition()
+        self._running = []
+        self._stopped = False
+        self._thread = None
+        self._latencies = collections.deque(maxlen=200)
+        self.started = time.time()
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0,
+                         'cancelled': 0, 'batches': 0, 'batched_jobs': 0}
+
+    # --- жизненный цикл ---
+
+    def start(self):
+        """
+        Загружает модели (один раз на процесс) и запускает обработчик очереди.
+        """
+        from core.transcriber import load_engine
+        from core.speaker_diarizer import get_reference_store
+        t0 = time.perf_counter()
+        load_engine(self.config)
+        dc = self.config.get('diarization', {})
+        get_reference_store(dc.get('reference_dir', 'reference_voices'), dc.get('embeddings_cache'))
+        logger.info(f"Service models loaded in {time.perf_counter() - t0:.1f}s")
+        self._thread = threading.Thread(target=self._worker, name="service", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    # --- очередь ---
+
+    def _held_seconds(self):
+        # аудио в памяти: ожидающие задачи и ещё не завершённые из текущей пачки
+        return (sum(j.duration for j in self._queue)
+                + sum(j.duration for j in self._running if j.audio is not None))
+
+    def _check_room(self, duration):
+        # вызывается под self._cond
+        if len(self._queue) >= self.queue_size:
+            self.counters['rejected'] += 1
+            raise QueueFull(f"queue is full ({self.queue_size} jobs)")
+        if self._held_seconds() + duration > self.max_queued_seconds:
+            self.counters['rejected'] += 1
+            raise QueueFull(f"queue is full ({self.max_queued_seconds:.0f}s of audio)")
+
+    def check_capacity(self, duration):
+        """
+        Проверка до декодирования: бросает TooLong, если запись длиннее
+        max_queued_seconds, и QueueFull, если сейчас она не помещается.
+        """
+        if duration > self.max_queued_seconds:
+            raise TooLong(f"audio is {duration:.0f}s, limit {self.max_queued_seconds:.0f}s")
+        with self._cond:
+            self._check_room(duration)
+
+    def submit(self, name, audio):
+        job = ServiceJob(name, audio)
+        if job.duration > self.max_queued_seconds:
+            raise TooLong(f"audio is {job.duration:.0f}s, limit {self.max_queued_seconds:.0f}s")
+        with self._cond:
+            self._check_room(job.duration)
+            self._queue.append(job)
+            self._jobs[job.id] = job
+            self.counters['submitted'] += 1
+            self._cond.notify_all()
+        logger.info(f"Service job {job.id} queued: {name} ({job.duration:.1f}s), "
+                    f"queue depth {len(self._queue)}")
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def info(self, job):
+        with self._cond:
+            position = self._queue.index(job) + 1 if job.status == 'queued' and job in self._queue else None
+            return job.info(position)
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return False
+            self._queue.remove(job)
+            job.status = 'cancelled'
+            job.audio = None
+            self.counters['cancelled'] += 1
+        job.done.set()
+        return True
+
+    def status(self):
+        with self._cond:
+            latencies = sorted(self._latencies)
+            st = dict(self.counters)
+            st.update({
+                'queue_depth': len(self._queue),
+                'queue_capacity': self.queue_size,
+                'queued_audio_seconds': round(sum(j.duration for j in self._queue), 1),
+                'held_audio_seconds': round(self._held_seconds(), 1),
+                'max_queued_seconds': self.max_queued_seconds,
+                'running': len(self._running),
+                'uptime_seconds': round(time.time() - self.started, 1),
+            })
+        if latencies:
+            st['latency_seconds'] = {
+                'avg': round(sum(latencies) / len(latencies), 3),
+                'p50': round(latencies[len(latencies) // 2], 3),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                'max': round(latencies[-1], 3),
+            }
+        return st
+
+    def _is_short(self, job):
+        return job.duration <= self.batch_max_seconds
+
+    def _take_batch(self):
+        """
+        Следующая задача, а если она короткая — вместе с другими короткими
+        из очереди (с ожиданием до batch_wait_seconds). None — сервис остановлен.
+        """
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if self._stopped:
+                return None
+            batch = [self._queue.popleft()]
+            if self._is_short(batch[0]) and self.batch_size > 1:
+                deadline = time.monotonic() + self.batch_wait_seconds
+                while len(batch) < self.batch_size:
+                    short = [j for j in self._queue if self._is_short(j)]
+                    for job in short[:self.batch_size - len(batch)]:
+                        self._queue.remove(job)
+                        batch.append(job)
+                    left = deadline - time.monotonic()
+                    if len(batch) >= self.batch_size or left <= 0:
+                        break
+                    self._cond.wait(left)
+            now = time.time()
+            for job in batch:
+                job.status = 'running'
+                job.started = now
+            self._running = batch
+            return batch
+
+    def _worker(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                with metrics.span('service_batch', jobs=len(batch),
+                                  audio_seconds=round(sum(j.duration for j in batch), 2)):
+                    if len(batch) == 1:
+                        self._run_single(batch[0])
+                    else:
+                        self._run_batch(batch)
+            except Exception as e:
+                logger.exception(f"Service batch of {len(batch)} job(s) failed")
+                for job in batch:
+                    if job.status == 'running':
+                        self._finish(job, len(batch), error=f"{type(e).__name__}: {e}")
+            with self._cond:
+                self._running = []
+
+    # --- обработка ---
+
+    def _diarize(self, job, segments):
+        from core.speaker_diarizer import identify_speakers, segment_fields
+        segments = [dict(zip(('start', 'end', 'text'), segment_fields(seg))) for seg in segments]
+        if not segments:
+            return '[Empty transcription]', []
+        text = identify_speakers(job.name, segments, self.config, audio=job.audio)
+        return text, segments
+
+    def _run_single(self, job):
+        from core.transcriber import transcribe_array
+        segments = transcribe_array(job.audio, self.config)
+        text, segments = self._diarize(job, segments)
+        self._finish(job, 1, text=text, segments=segments)
+
+    def _run_batch(self, batch):
+        """
+        Короткие записи склеиваются через паузу в один сигнал; каждый
+        сегмент Whisper относится к записи, в которую попадает его середина.
+        """
+        from core.transcriber import transcribe_array
+        gap = np.zeros(int(self.gap_seconds * SAMPLE_RATE), dtype=np.float32)
+        parts, bounds, pos = [], [], 0
+        for job in batch:
+            parts += [job.audio, gap]
+            bounds.append((pos / SAMPLE_RATE, (pos + len(job.audio)) / SAMPLE_RATE))
+            pos += len(job.audio) + len(gap)
+        segments = transcribe_array(np.concatenate(parts), self.config)
+        with self._cond:
+            self.counters['batches'] += 1
+            self.counters['batched_jobs'] += len(batch)
+        logger.info(f"Service batch: {len(batch)} clips, {pos / SAMPLE_RATE:.1f}s in one pass")
+
+        per_job = [[] for _ in batch]
+        for seg in segments:
+            mid = (seg.get('start', 0.0) + seg.get('end', 0.0)) / 2
+            for i, (start, end) in enumerate(bounds):
+                if mid < end + self.gap_seconds / 2:
+                    per_job[i].append(dict(seg, start=max(0.0, seg['start'] - start),
+                                           end=min(end - start, seg['end'] - start)))
+                    break
+        for job, job_segments in zip(batch, per_job):
+            try:
+                text, job_segments = self._diarize(job, job_segments)
+                self._finish(job, len(batch), text=text, segments=job_segments)
+            except Exception as e:
+                logger.exception(f"Service job {job.id} failed")
+                self._finish(job, len(batch), error=f"{type(e).__name__}: {e}")
+
+    def _finish(self, job, batch_size, text=None, segments=None, error=None):
+        with self._cond:
+            job.finished = time.time()
+            job.batch_size = batch_size
+            job.audio = None
+            if error is None:
+                job.status, job.text, job.segments = 'done', text, segments
+                self.counters['completed'] += 1
+            else:
+                job.status, job.error = 'error', error
+                self.counters['failed'] += 1
+            latency = job.finished - job.created
+            self._latencies.append(latency)
+            # храним только последние keep_results завершённых задач
+            finished = [j for j in self._jobs.values() if j.finished is not None]
+            for old in finished[:max(0, len(finished) - self.keep_results)]:
+                del self._jobs[old.id]
+        job.done.set()
+        metrics.count('service_job', status=job.status, latency_seconds=round(latency, 3),
+                      wait_seconds=round(job.started - job.created, 3), batch_size=batch_size)
+        logger.info(f"Service job {job.id} {job.status}: latency {latency:.1f}s "
+                    f"(wait {job.started - job.created:.1f}s, batch {batch_size})")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "SecretaryTranscription/1.0"
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt % args)
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_id(self, path):
+        parts = path.strip('/').split('/')
+        return parts[1] if len(parts) == 2 and parts[0] == 'jobs' else None
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        service = self.server.service
+        if url.path.rstrip('/') != '/jobs':
+            self._send_json({'error': f'unknown path {url.path}'}, status=404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(length)
+        name = parse_qs(url.query).get('name', ['audio'])[0]
+        try:
+            # отказ по заголовку — до выделения памяти под сигнал
+            service.check_capacity(probe_duration(data))
+            audio = decode_audio(data)
+            job = service.submit(name, audio)
+        except QueueFull as e:
+            self._send_json({'error': str(e), 'queue_depth': service.queue_size}, status=503,
+                            headers={'Retry-After': str(self.server.retry_after)})
+            return
+        except TooLong as e:
+            self._send_json({'error': str(e)}, status=413)
+            return
+        except Exception as e:
+            self._send_json({'error': f'cannot decode audio: {e}'}, status=400)
+            return
+        self._send_json(service.info(job), status=202)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        service = self.server.service
+        if url.path.rstrip('/') == '/status':
+            self._send_json(service.status())
+            return
+        job_id = self._job_id(url.path)
+        job = service.get(job_id) if job_id else None
+        if job is None:
+            self._send_json({'error': 'job not found'}, status=404)
+            return
+        wait = float(parse_qs(url.query).get('wait', ['0'])[0])
+        if wait > 0:
+            job.done.wait(min(wait, 60.0))
+        self._send_json(service.info(job))
+
+    def do_DELETE(self):
+        job_id = self._job_id(urlparse(self.path).path)
+        if job_id and self.server.service.cancel(job_id):
+            self._send_json({'id': job_id, 'status': 'cancelled'})
+        else:
+            self._send_json({'error': 'job not found or already running'}, status=409)
+
+
+def service_config(config):
+    return config.get('transcription', {}).get('service', {})
+
+
+def make_server(config, host=None, port=None):
+    """
+    Создаёт сервис и HTTP-сервер по настройкам transcription.service
+    (port=0 — любой свободный порт). Модели не загружаются: вызовите
+    server.service.start().
+    """
+    sc = service_config(config)
+    service = TranscriptionService(
+        config,
+        queue_size=sc.get('queue_size', 16),
+        batch_max_seconds=sc.get('batch_max_seconds', 30.0),
+        batch_size=sc.get('batch_size', 8),
+        batch_wait_seconds=sc.get('batch_wait_seconds', 0.2),
+        gap_seconds=sc.get('gap_seconds', 1.0),
+        max_queued_seconds=sc.get('max_queued_seconds', 4 * 3600),
+    )
+    httpd = ThreadingHTTPServer((host or sc.get('host', '127.0.0.1'),
+                                 sc.get('port', 8765) if port is None else port), _Handler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    httpd.retry_after = sc.get('retry_after_seconds', 5)
+    return httpd
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Общий сервис транскрипции")
+    parser.add_argument('--config', default='config/settings.yaml')
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    args = parser.parse_args(argv)
+
+    from core.logger_setup import setup_logging
+    from core.config_loader import load_config
+    setup_logging()
+    config = load_config(args.config)
+    # сервис сам распознаёт локально
+    config.setdefault('transcription', {})['mode'] = 'offline'
+
+    httpd = make_server(config, args.host, args.port)
+    httpd.service.start()
+    host, port = httpd.server_address[:2]
+    logger.info(f"Transcription service listening on http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        httpd.service.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
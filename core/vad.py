@@ -0,0 +1,102 @@
+# core/vad.py
+
+import bisect
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def speech_regions(audio, sr, frame_seconds=0.03, margin_db=12.0, floor_db=-55.0,
+                   min_silence=0.6, min_speech=0.2, padding=0.3):
+    """
+    Простой энергетический VAD: карта речевых участков сигнала.
+
+    Кадр считается речью, если его уровень выше уровня шума (10-й перцентиль
+    уровней кадров) на margin_db и выше абсолютного порога floor_db (dBFS).
+    Паузы короче min_silence склеиваются, участки короче min_speech
+    отбрасываются, каждый участок расширяется на padding секунд.
+    Если в сигнале нет тишины (разброс уровней меньше margin_db) или не
+    найдено ни одного участка, весь сигнал считается речью — VAD не должен
+    отбрасывать запись целиком.
+    Возвращает список (start, end) в сэмплах.
+    """
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    frame = max(1, int(frame_seconds * sr))
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    level = 10 * np.log10(np.mean(frames.astype(np.float32) ** 2, axis=1) + 1e-12)
+    noise = np.percentile(level, 10)
+    if level.max() - noise < margin_db:
+        return [(0, len(audio))]
+    threshold = max(noise + margin_db, floor_db)
+    voiced = level > threshold
+
+    # границы участков подряд идущих речевых кадров
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = list(zip(edges[::2], edges[1::2]))
+
+    merged = []
+    gap = int(min_silence / frame_seconds)
+    for s, e in runs:
+        if merged and s - merged[-1][1] <= gap:
+            merged[-1][1] = e
+        else:
+            merged.append([s, e])
+
+    pad = int(padding * sr)
+    regions = []
+    for s, e in merged:
+        if (e - s) * frame_seconds < min_speech:
+            continue
+        start = max(0, s * frame - pad)
+        end = min(len(audio), e * frame + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions or [(0, len(audio))]
+
+
+class SpeechMap:
+    """
+    Склейка речевых участков в один сигнал и пересчёт тайм-кодов склейки
+    обратно в исходную шкалу времени.
+    """
+
+    def __init__(self, regions, sr):
+        self.regions = regions
+        self.sr = sr
+        self._starts = []
+        pos = 0
+        for s, e in regions:
+            self._starts.append(pos / sr)
+            pos += e - s
+        self.speech_samples = pos
+
+    def extract(self, audio):
+        if not self.regions:
+            return audio[:0]
+        return np.concatenate([audio[s:e] for s, e in self.regions])
+
+    def to_original(self, t):
+        if not self.regions:
+            return t
+        # время ровно на стыке относится к концу предыдущего участка
+        i = max(0, bisect.bisect_left(self._starts, t) - 1)
+        s, e = self.regions[i]
+        return min(s / self.sr + (t - self._starts[i]), e / self.sr)
+
+
+def vad_config(config=None):
+    """
+    Настройки VAD из transcription.vad или None, если VAD выключен.
+    """
+    vc = (config or {}).get('transcription', {}).get('vad', {}) or {}
+    if not vc.get('enabled', False):
+        return None
+    return vc
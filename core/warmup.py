@@ -0,0 +1,44 @@
+# core/warmup.py
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_up(config):
+    tc = config.get('transcription', {})
+    t0 = time.perf_counter()
+    try:
+        if tc.get('mode', 'offline') == 'service':
+            # модели держит сервис — только проверяем, что он доступен
+            from core.service_client import get_status
+            try:
+                st = get_status(config)
+                logger.info(f"Transcription service is up, queue depth {st.get('queue_depth')}")
+            except OSError as e:
+                logger.warning(f"Transcription service is unavailable: {e}")
+            return
+        if tc.get('mode', 'offline') == 'offline':
+            from core.transcriber import load_engine
+            load_engine(config)
+        from core.speaker_diarizer import get_reference_store
+        dc = config.get('diarization', {})
+        get_reference_store(dc.get('reference_dir', 'reference_voices'), dc.get('embeddings_cache'))
+        logger.info(f"Models warmed up in {time.perf_counter() - t0:.1f}s")
+    except Exception:
+        logger.exception("Model warm-up failed")
+
+
+def start_warmup(config):
+    """
+    Загружает в фоне модель Whisper, VoiceEncoder и эталонные эмбеддинги,
+    чтобы первая транскрипция не ждала загрузки (transcription.warmup).
+    Возвращает поток или None, если прогрев выключен.
+    """
+    if not config.get('transcription', {}).get('warmup', True):
+        return None
+    thread = threading.Thread(target=_warm_up, args=(config,), daemon=True, name="warmup")
+    thread.start()
+    return thread
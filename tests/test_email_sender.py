@@ -0,0 +1,39 @@
+# tests/test_email_sender.py
+
+import smtplib
+
+from bench.fake_smtp import FakeSMTPServer
+from core.email_sender import EmailDeliveryQueue, _is_transient
+
+
+def test_transient_errors():
+    assert _is_transient(smtplib.SMTPServerDisconnected("gone"))
+    assert _is_transient(ConnectionResetError())
+    assert _is_transient(smtplib.SMTPResponseException(421, b"closing"))
+    assert _is_transient(smtplib.SMTPRecipientsRefused({'a@x': (451, b"later")}))
+    # SMTPException — подкласс OSError, но 5xx и ошибки протокола не повторяются
+    assert not _is_transient(smtplib.SMTPAuthenticationError(535, b"bad auth"))
+    assert not _is_transient(smtplib.SMTPSenderRefused(550, b"no", 'me@x'))
+    assert not _is_transient(smtplib.SMTPDataError(554, b"rejected"))
+    assert not _is_transient(smtplib.SMTPNotSupportedError("no STARTTLS"))
+    assert not _is_transient(smtplib.SMTPRecipientsRefused({'a@x': (550, b"no")}))
+
+
+def test_queue_reuses_connection_and_retries(tmp_path):
+    with FakeSMTPServer(reject={'bad@example.com'}, defer={'slow@example.com': 1}) as server:
+        config = {'email': server.email_config(batch_size=2, retry_base_delay=0.01)}
+        queue = EmailDeliveryQueue(config)
+        try:
+            queue.enqueue(['a@example.com', 'b@example.com', 'bad@example.com'], "протокол")
+            queue.enqueue(['slow@example.com'], "протокол")
+            assert queue.wait(10)
+            status = {email: st['status'] for email, st in queue.status().items()}
+        finally:
+            queue.close()
+
+    assert status == {'a@example.com': 'sent', 'b@example.com': 'sent',
+                      'bad@example.com': 'failed', 'slow@example.com': 'sent'}
+    assert server.connections == 1
+    assert server.logins == 1
+    delivered = sorted(r for m in server.messages for r in m['to'])
+    assert delivered == ['a@example.com', 'b@example.com', 'slow@example.com']
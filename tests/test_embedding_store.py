@@ -0,0 +1,74 @@
+# tests/test_embedding_store.py
+
+import os
+import time
+import threading
+
+import numpy as np
+
+from core.embedding_store import ReferenceEmbeddingStore
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_refresh_recomputes_only_changed(tmp_path):
+    ref = tmp_path / "reference_voices"
+    ref.mkdir()
+    _write(ref / "Алиса.wav", b"alice")
+    _write(ref / "Борис.wav", b"boris")
+    calls = []
+
+    def embed(path):
+        calls.append(os.path.basename(path))
+        with open(path, 'rb') as f:
+            return np.full(4, len(f.read()), dtype=np.float32)
+
+    store = ReferenceEmbeddingStore(str(ref))
+    assert store.refresh(embed) == 2
+
+    _write(ref / "Борис.wav", b"boris, new take")
+    os.utime(ref / "Борис.wav", (1, 1))
+    assert ReferenceEmbeddingStore(str(ref)).refresh(embed) == 1
+
+    # кэш сохранён после частичного пересчёта; матрица — не вид на mmap
+    store = ReferenceEmbeddingStore(str(ref))
+    assert store.refresh(embed) == 0
+    assert calls == ["Алиса.wav", "Борис.wav", "Борис.wav"]
+    assert not isinstance(store.matrix, np.memmap)
+    assert store.as_dict()["Борис"][0] == len(b"boris, new take")
+
+
+def test_concurrent_refresh_runs_once(tmp_path):
+    ref = tmp_path / "reference_voices"
+    ref.mkdir()
+    _write(ref / "Алиса.wav", b"alice")
+    _write(ref / "Борис.wav", b"boris")
+    calls, active, overlaps = [], [0], []
+
+    def embed(path):
+        active[0] += 1
+        overlaps.append(active[0])
+        time.sleep(0.05)
+        calls.append(os.path.basename(path))
+        active[0] -= 1
+        return np.ones(4, dtype=np.float32)
+
+    # прогрев и задание обновляют одно хранилище одновременно
+    store = ReferenceEmbeddingStore(str(ref))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.refresh(embed)))
+               for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(results) == [0, 2]
+    assert sorted(calls) == ["Алиса.wav", "Борис.wav"]
+    assert max(overlaps) == 1
+    names, matrix = store.snapshot()
+    assert names == ["Алиса", "Борис"] and matrix.shape == (2, 4)
+    assert not [p for p in os.listdir(ref) if ".tmp" in p]
@@ -0,0 +1,109 @@
+# tests/test_gpt_summary.py
+
+from bench.fake_openai import FakeOpenAIServer
+from core.gpt_summary import (
+    generate_summary, split_transcript, estimate_tokens, MAP_PROMPT, REDUCE_NOTE,
+)
+
+
+def _transcript(turns=40):
+    names = ["Алиса", "Борис", "Вера"]
+    return "\n".join(f"[{i // 60}:{i % 60:02d}] {names[i % 3]}: реплика номер {i} про бюджет и сроки"
+                     for i in range(turns))
+
+
+def _config(server, tmp_path, **gs):
+    return {
+        'gpt_summary': dict({'enabled': True, 'api_key': 'test', 'model': 'gpt-4',
+                             'base_url': server.base_url, 'chunked': True,
+                             'chunk_tokens': 120, 'max_retries': 0}, **gs),
+        'summary_cache': {'dir': str(tmp_path / "summaries")},
+    }
+
+
+def test_chunked_summary_map_and_reduce(tmp_path):
+    text = _transcript()
+    with FakeOpenAIServer(latency=0.0) as server:
+        config = _config(server, tmp_path, stream=False)
+        chunks = split_transcript(text, 120, 'gpt-4')
+        assert len(chunks) > 1
+
+        result = generate_summary(text, config)
+
+        prompts = server.prompts
+        map_prompts = [p for p in prompts if REDUCE_NOTE not in p]
+        reduce_prompts = [p for p in prompts if REDUCE_NOTE in p]
+        assert sorted(map_prompts) == sorted(MAP_PROMPT.format(chunk=c) for c in chunks)
+        assert len(reduce_prompts) == 1
+        for i in range(len(chunks)):
+            assert f"--- Part {i + 1} ---" in reduce_prompts[0]
+        assert result == f"Summary of {len(reduce_prompts[0])} chars."
+
+        # повторный запуск целиком из кэша выжимок
+        assert generate_summary(text, config) == result
+        assert server.requests == len(chunks) + 1
+
+
+def test_streamed_summary_tokens_in_order(tmp_path):
+    text = _transcript(5)
+    with FakeOpenAIServer(latency=0.0, stream_tokens=20, token_latency=0.005) as server:
+        config = _config(server, tmp_path, chunked=False)
+        config['summary_cache'] = {'enabled': False}
+        tokens = []
+
+        result = generate_summary(text, config, on_token=tokens.append)
+
+        head = f"Summary of {len(server.prompts[0])} chars."
+        assert tokens == [head] + [f" word{i}" for i in range(20)]
+        assert result == "".join(tokens)
+
+
+def test_streamed_chunked_summary_streams_only_reduce(tmp_path):
+    text = _transcript()
+    with FakeOpenAIServer(latency=0.0, stream_tokens=3, token_latency=0.0) as server:
+        config = _config(server, tmp_path)
+        config['summary_cache'] = {'enabled': False}
+        tokens = []
+
+        result = generate_summary(text, config, on_token=tokens.append)
+
+        reduce_prompt = [p for p in server.prompts if REDUCE_NOTE in p][0]
+        assert tokens[0] == f"Summary of {len(reduce_prompt)} chars."
+        assert len(tokens) == 4
+        assert result == "".join(tokens)
+
+
+def test_split_on_speaker_turns_within_budget():
+    text = _transcript(60)
+    chunks = split_transcript(text, 120, 'gpt-4')
+    assert len(chunks) > 2
+    assert "\n".join(chunks) == text
+    for chunk in chunks:
+        assert estimate_tokens(chunk, 'gpt-4') <= 120
+        # каждая часть начинается с реплики, а не с середины
+        assert chunk.startswith("[")
+
+
+def test_map_requests_are_concurrent_and_bounded(tmp_path):
+    text = _transcript(60)
+    with FakeOpenAIServer(latency=0.2) as server:
+        config = _config(server, tmp_path, stream=False, max_concurrency=3)
+        config['summary_cache'] = {'enabled': False}
+
+        result = generate_summary(text, config)
+
+        assert not result.startswith('[Error')
+        assert server.max_in_flight == 3
+
+
+def test_rate_limited_requests_are_retried(tmp_path):
+    text = _transcript()
+    with FakeOpenAIServer(latency=0.0, rate_limit=2) as server:
+        config = _config(server, tmp_path, stream=False, max_retries=3, retry_base_delay=0.01)
+        config['summary_cache'] = {'enabled': False}
+
+        result = generate_summary(text, config)
+
+        reduce_prompt = [p for p in server.prompts if REDUCE_NOTE in p][0]
+        assert result == f"Summary of {len(reduce_prompt)} chars."
+        assert server.requests == len(split_transcript(text, 120, 'gpt-4')) + 1 + 2
@@ -0,0 +1,22 @@
+# tests/test_jobs.py
+
+import threading
+
+from core.jobs import JobRunner
+
+
+def test_dedicated_job_does_not_block_queue():
+    runner = JobRunner(workers=1)
+    release = threading.Event()
+    try:
+        long_job = runner.submit_dedicated("запись", lambda job: release.wait(10))
+        quick = runner.submit("выжимка", lambda job: "ok")
+        for _ in range(100):
+            if quick.status == 'done':
+                break
+            threading.Event().wait(0.05)
+        assert quick.status == 'done'
+        assert long_job.status == 'running'
+    finally:
+        release.set()
+        runner.shutdown()
@@ -0,0 +1,77 @@
+# tests/test_live_transcriber.py
+
+import numpy as np
+import pytest
+
+from core import transcriber, live_transcriber
+from core.live_transcriber import LiveTranscriber, SAMPLE_RATE
+
+
+class RunsEngine:
+    """
+    Вместо Whisper: сегмент на каждый участок постоянного уровня; уровень
+    кодирует номер фразы. Участок, дошедший до конца сигнала, выдаётся
+    обрезанным — как фраза, оборванная концом фрагмента.
+    """
+
+    def __init__(self, model_name, **_):
+        pass
+
+    def transcribe(self, audio, language=None):
+        edges = np.concatenate([[0], np.flatnonzero(np.diff(audio)) + 1, [len(audio)]])
+        return [{'start': a / SAMPLE_RATE, 'end': b / SAMPLE_RATE,
+                 'text': f"u{int(round(audio[a] * 100)) - 1}"}
+                for a, b in zip(edges[:-1], edges[1:])]
+
+
+class FakeRecorder:
+    def set_chunk_listener(self, callback, chunk_seconds, overlap_seconds):
+        self.callback = callback
+
+
+@pytest.fixture
+def live(monkeypatch):
+    monkeypatch.setitem(transcriber._ENGINE_CLASSES, 'fake', RunsEngine)
+    monkeypatch.setattr(transcriber, '_model', None)
+    monkeypatch.setattr(transcriber, '_model_params', None)
+    monkeypatch.setattr(live_transcriber, 'get_encoder', lambda: None)
+    monkeypatch.setattr(live_transcriber, 'embed_segments',
+                        lambda encoder, wav, bounds, batch_size=32: np.ones((len(bounds), 2)))
+    monkeypatch.setattr(live_transcriber, 'assign_speakers',
+                        lambda embeddings, config: ["Спикер"] * len(embeddings))
+    config = {'transcription': {'engine': 'fake', 'vad': {'enabled': False},
+                                'live_chunk_seconds': 30, 'live_overlap_seconds': 2},
+              'diarization': {'show_timestamps': False}}
+    lt = LiveTranscriber(config)
+    recorder = FakeRecorder()
+    lt.attach(recorder)
+    return lt, recorder
+
+
+def _publish(callback, audio, chunk=30, overlap=2):
+    # как AudioRecorder._publish: фрагменты chunk с шагом chunk - overlap, остаток — final
+    size, step = chunk * SAMPLE_RATE, (chunk - overlap) * SAMPLE_RATE
+    offset = 0
+    while len(audio) - offset >= size:
+        callback(offset / SAMPLE_RATE, audio[offset:offset + size], False)
+        offset += step
+    callback(offset / SAMPLE_RATE, audio[offset:], True)
+
+
+def test_phrases_across_chunk_boundaries_are_kept_whole(live):
+    lt, recorder = live
+    # 70 с непрерывной речи: 10 фраз по 7 с без пауз
+    audio = np.repeat(np.arange(1, 11) / 100, 7 * SAMPLE_RATE).astype(np.float32)
+    _publish(recorder.callback, audio)
+    text = lt.finish(timeout=30)
+
+    assert [(round(start), round(end), t) for start, end, t in lt.segments] == \
+        [(7 * i, 7 * i + 7, f"u{i}") for i in range(10)]
+    assert text.splitlines() == [f"Спикер: u{i}" for i in range(10)]
+
+
+def test_finish_times_out_without_final_chunk(live):
+    lt, recorder = live
+    recorder.callback(0.0, np.full(30 * SAMPLE_RATE, 0.01, dtype=np.float32), False)
+    with pytest.raises(TimeoutError):
+        lt.finish(timeout=0.5)
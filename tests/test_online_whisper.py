@@ -0,0 +1,73 @@
+# tests/test_online_whisper.py
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from bench.fake_openai import FakeOpenAIServer
+from core.online_whisper import iter_parts, transcribe_online
+
+
+def _speech_like(seconds, sr, channels=1, seed=0):
+    # шум с паузами каждые 10 с — есть где резать
+    rng = np.random.default_rng(seed)
+    audio = rng.uniform(-0.3, 0.3, (int(seconds * sr), channels)).astype(np.float32)
+    for t in range(10, int(seconds), 10):
+        audio[int((t - 0.2) * sr):int(t * sr)] = 0
+    return audio
+
+
+def test_parts_are_bounded_and_contiguous():
+    sr = 16000
+    audio = _speech_like(25, sr)[:, 0]
+    blocks = (audio[i:i + sr * 4] for i in range(0, len(audio), sr * 4))
+    parts = list(iter_parts(blocks, sr, max_seconds=10, search_seconds=2))
+    assert len(parts) == 3
+    assert all(len(p) <= 10 * sr for _, p in parts)
+    assert [start for start, _ in parts] == [0, len(parts[0][1]), len(parts[0][1]) + len(parts[1][1])]
+    np.testing.assert_array_equal(np.concatenate([p for _, p in parts]), audio)
+
+
+def _transcribe(server, path, **tc):
+    config = {'transcription': dict({'api_key': 'test', 'base_url': server.base_url,
+                                     'max_chunk_seconds': 10}, **tc)}
+    return transcribe_online(str(path), config)
+
+
+def test_upload_parts_and_offsets(tmp_path):
+    path = tmp_path / "meeting.wav"
+    sf.write(str(path), _speech_like(29, 16000, channels=2), 16000, subtype='PCM_16')
+    with FakeOpenAIServer(latency=0.0) as server:
+        segments = _transcribe(server, path)
+        uploads = server.uploads
+    starts = [s['start'] for s in segments]
+    assert len(uploads) == len(starts) >= 3
+    assert starts[0] == 0 and all(0 < b - a <= 10 for a, b in zip(starts, starts[1:]))
+    # 10 с 16 кГц моно FLAC меньше 10 с 16-битного стерео
+    assert max(uploads) < 10 * 16000 * 2 * 2
+
+
+def test_upload_size_limit_splits_parts(tmp_path):
+    path = tmp_path / "meeting.wav"
+    sf.write(str(path), _speech_like(30, 16000), 16000, subtype='PCM_16')
+    limit_mb = 0.1
+    with FakeOpenAIServer(latency=0.0) as server:
+        segments = _transcribe(server, path, max_upload_mb=limit_mb)
+        uploads = server.uploads
+    assert len(uploads) > 3
+    assert max(uploads) < limit_mb * 2 ** 20 + 4096   # + multipart
+    starts = [s['start'] for s in segments]
+    assert starts == sorted(starts) and starts[0] == 0
+
+
+def test_high_rate_stereo_is_downsampled(tmp_path):
+    pytest.importorskip("librosa")
+    path = tmp_path / "meeting.wav"
+    sf.write(str(path), _speech_like(29, 48000, channels=2), 48000, subtype='PCM_16')
+    with FakeOpenAIServer(latency=0.0) as server:
+        segments = _transcribe(server, path)
+        uploads = server.uploads
+    starts = [s['start'] for s in segments]
+    assert len(uploads) == len(starts) >= 3
+    assert starts[0] == 0 and all(0 < b - a <= 10 for a, b in zip(starts, starts[1:]))
+    assert max(uploads) < 10 * 16000 * 2
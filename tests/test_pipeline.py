@@ -0,0 +1,21 @@
+# tests/test_pipeline.py
+
+import os
+
+from core.pipeline import process_file, is_processed, output_paths
+
+
+def test_summary_error_is_not_saved(tmp_path, monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    audio = str(tmp_path / "meeting.wav")
+    txt_path, summary_path = output_paths(audio)
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write("[0:00] Алиса: начнём\n")
+    config = {'gpt_summary': {'enabled': True}, 'search': {'enabled': False}}
+
+    report = process_file(audio, config)
+
+    assert report['status'] == 'error'
+    assert report['error'] == '[Missing API key]'
+    assert not os.path.exists(summary_path)
+    assert not is_processed(audio, config)
@@ -0,0 +1,102 @@
+# tests/test_search_index.py
+
+import os
+import datetime
+
+import pytest
+
+from core.search_index import TranscriptIndex, parse_query, parse_line, format_result
+
+SPRING = ("[0:05] Алиса: Бюджет на второй квартал утверждён\n"
+          "[1:10] Борис: Нужно обсудить бюджетирование проекта\n"
+          "\n"
+          "[1:02:03] Алиса: Ёлка в офисе к декабрю\n")
+AUTUMN = ("[0:00] Борис: Бюджет на осень\n"
+          "Без тайм-кода и говорящего про бюджет\n")
+
+
+def _write(path, text, mtime=None):
+    path.write_text(text, encoding='utf-8')
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    rec = tmp_path / "recordings"
+    rec.mkdir()
+    idx = TranscriptIndex(str(tmp_path / "cache" / "search.sqlite"))
+    spring = _write(rec / "meeting_20240415_100000.txt", SPRING)
+    autumn = _write(rec / "meeting_20241002_090000.txt", AUTUMN)
+    assert idx.add_transcript(spring) == 3
+    assert idx.add_transcript(autumn) == 2
+    return idx, rec
+
+
+def _hits(rows):
+    return [(os.path.basename(r['path'])[8:16], r['line_no']) for r in rows]
+
+
+def test_parse_line():
+    assert parse_line("[1:02:03] Алиса: текст: с двоеточием") == (3723.0, "Алиса", "текст: с двоеточием")
+    assert parse_line("[0:07] просто текст") == (7.0, None, "просто текст")
+    assert parse_line("Без разметки") == (None, None, "Без разметки")
+
+
+def test_parse_query():
+    q = parse_query("Бюджет* speaker:Анна_Мария from:2024-01-01 to:2024-06-30")
+    assert q == {'terms': ['бюджет*'], 'speaker': "Анна Мария",
+                 'date_from': '2024-01-01', 'date_to': '2024-06-30'}
+
+    q = parse_query("quarter:2024Q4 ёлка")
+    assert (q['date_from'], q['date_to']) == ('2024-10-01', '2025-01-01')
+    assert q['terms'] == ['елка']
+
+    q = parse_query("2024-q1")
+    assert (q['date_from'], q['date_to']) == ('2024-01-01', '2024-04-01')
+    year = datetime.date.today().year
+    assert parse_query("Q3")['date_from'] == f"{year}-07-01"
+
+    with pytest.raises(ValueError):
+        parse_query("quarter:2024Q5")
+
+
+def test_query_terms_prefix_and_speaker(index):
+    idx, _ = index
+    # свежие совещания первыми, внутри — по номеру строки
+    assert _hits(idx.query("бюджет")) == [("20241002", 1), ("20241002", 2), ("20240415", 1)]
+    assert _hits(idx.query("бюджет*")) == [("20241002", 1), ("20241002", 2),
+                                           ("20240415", 1), ("20240415", 2)]
+    assert _hits(idx.query("бюджет квартал")) == [("20240415", 1)]
+    assert _hits(idx.query("елка")) == [("20240415", 4)]
+    assert _hits(idx.query("бюджет* speaker:бор")) == [("20241002", 1), ("20240415", 2)]
+
+    row = idx.query("ёлка")[0]
+    assert row['start'] == 3723.0 and row['speaker'] == "Алиса"
+    assert format_result(row) == ("2024-04-15  meeting_20240415_100000.txt  "
+                                  "[62:03] Алиса: Ёлка в офисе к декабрю")
+
+
+def test_query_date_bounds(index):
+    idx, _ = index
+    assert _hits(idx.query("бюджет* quarter:2024Q2")) == [("20240415", 1), ("20240415", 2)]
+    assert _hits(idx.query("бюджет 2024Q4")) == [("20241002", 1), ("20241002", 2)]
+    assert idx.query("бюджет quarter:2024Q3") == []
+    # date_to не включается
+    assert _hits(idx.query("бюджет from:2024-04-15 to:2024-10-02")) == [("20240415", 1)]
+
+
+def test_refresh_changed_and_deleted(index):
+    idx, rec = index
+    assert idx.refresh(str(rec)) == 0
+
+    _write(rec / "meeting_20240415_100000.txt", "[0:01] Алиса: Бюджет перенесён\n", mtime=1)
+    os.remove(rec / "meeting_20241002_090000.txt")
+    _write(rec / "meeting_20241002_090000_summary.txt", "Бюджет: сводка не индексируется\n")
+    _write(rec / "meeting_20250110_120000.txt", "[0:02] Борис: Новый бюджет\n")
+
+    assert idx.refresh(str(rec)) == 2
+    assert _hits(idx.query("бюджет")) == [("20250110", 1), ("20240415", 1)]
+    assert idx.query("квартал") == []
+    assert idx.refresh(str(rec)) == 0
@@ -0,0 +1,49 @@
+# tests/test_segments.py
+
+import numpy as np
+import pytest
+
+from core.segments import SegmentedWriter, SegmentedAudio, read_manifest
+
+
+def _record(path, signal, samplerate, segment_seconds, compress=False):
+    with SegmentedWriter(str(path), samplerate, signal.shape[1], segment_seconds, compress) as w:
+        for i in range(0, len(signal), 1000):
+            w.write(signal[i:i + 1000])
+    if w._compressor is not None:
+        w._compressor.join(10)
+
+
+def test_slices_across_segments(tmp_path):
+    rate = 8000
+    t = np.arange(rate * 3) / rate
+    mono = (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    path = tmp_path / "meeting.json"
+    _record(path, mono[:, None], rate, segment_seconds=1.0, compress=True)
+
+    manifest = read_manifest(str(path))
+    assert [e['format'] for e in manifest['segments']] == ['flac'] * 3
+    audio = SegmentedAudio(str(path))
+    assert len(audio) == len(mono)
+    assert audio.duration == pytest.approx(3.0)
+    # срез через границу сегментов, PCM_16 — точность 1/32768
+    np.testing.assert_allclose(audio[rate - 100:2 * rate + 100],
+                               mono[rate - 100:2 * rate + 100], atol=1e-4)
+
+
+def test_resampled_view_for_diarization(tmp_path):
+    pytest.importorskip("librosa")
+    rate = 48000
+    t = np.arange(rate * 2) / rate
+    mono = (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    path = tmp_path / "meeting.json"
+    _record(path, np.stack([mono, mono], axis=1), rate, segment_seconds=0.5)
+
+    audio = SegmentedAudio(str(path), 16000)
+    assert audio.samplerate == 16000
+    assert len(audio) == 32000
+    assert audio.duration == pytest.approx(2.0)
+    part = audio[8000:24000]
+    assert len(part) == 16000
+    expected = 0.5 * np.sin(2 * np.pi * 220 * np.arange(8000, 24000) / 16000)
+    np.testing.assert_allclose(part[100:-100], expected[100:-100], atol=0.02)
@@ -0,0 +1,67 @@
+# tests/test_startup.py
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from core import transcriber, speaker_diarizer
+from core.warmup import start_warmup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('whisper', 'faster_whisper', 'torch', 'librosa', 'resemblyzer', 'sklearn',
+         'openai', 'tiktoken')
+
+
+def _run(code):
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True,
+                         text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_core_imports_are_light():
+    # в чистом процессе: модули конвейера не тянут тяжёлые библиотеки при импорте
+    loaded = _run(
+        "import sys, json, time\n"
+        "t0 = time.perf_counter()\n"
+        "import core.transcriber, core.speaker_diarizer, core.gpt_summary, core.pipeline\n"
+        "print(json.dumps({'seconds': time.perf_counter() - t0,\n"
+        f"                  'heavy': [m for m in {HEAVY!r} if m in sys.modules]}}))\n")
+    assert loaded['heavy'] == []
+    assert loaded['seconds'] < 1.0
+
+
+def test_measure_startup():
+    pytest.importorskip("sounddevice")
+    if sys.platform != 'win32' and not os.environ.get('DISPLAY'):
+        pytest.skip("no display")
+    result = _run("import json\n"
+                  "from ui.main import measure_startup\n"
+                  "print(json.dumps(measure_startup('config/settings.example.yaml')))\n")
+    assert result['window_seconds'] < 1.0
+
+
+class _Engine:
+    def __init__(self, model_name, **_):
+        self.model_name = model_name
+
+
+def test_warmup_loads_engine_in_background(monkeypatch):
+    monkeypatch.setitem(transcriber._ENGINE_CLASSES, 'fake', _Engine)
+    monkeypatch.setattr(transcriber, '_model', None)
+    monkeypatch.setattr(transcriber, '_model_params', None)
+    stores = []
+    monkeypatch.setattr(speaker_diarizer, 'get_reference_store',
+                        lambda *args: stores.append(args))
+    config = {'transcription': {'engine': 'fake', 'model': 'tiny'}}
+
+    thread = start_warmup(config)
+    thread.join(10)
+
+    assert transcriber._model is not None and transcriber._model.model_name == 'tiny'
+    assert transcriber.load_engine(config) is transcriber._model
+    assert stores == [('reference_voices', None)]
+    assert start_warmup({'transcription': {'warmup': False}}) is None
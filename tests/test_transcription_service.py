@@ -0,0 +1,114 @@
+# tests/test_transcription_service.py
+
+import threading
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from core import transcriber, speaker_diarizer
+from core.service_client import transcribe_service, get_status, ServiceError
+from core.transcription_service import make_server, SAMPLE_RATE
+
+
+class FakeEngine:
+    """
+    Вместо Whisper: по сегменту на каждый непрерывный участок постоянного
+    уровня; текст — уровень, так что видно, чья запись распознана.
+    """
+
+    def __init__(self, model_name, **_):
+        self.calls = 0
+
+    def transcribe(self, audio, language=None):
+        self.calls += 1
+        segments, start = [], None
+        for i, x in enumerate(np.append(audio, 0.0)):
+            if x != 0 and start is None:
+                start = i
+            elif x == 0 and start is not None:
+                segments.append({'start': start / SAMPLE_RATE, 'end': i / SAMPLE_RATE,
+                                 'text': f"level {audio[start]:.1f}"})
+                start = None
+        return segments
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setitem(transcriber._ENGINE_CLASSES, 'fake', FakeEngine)
+    monkeypatch.setattr(transcriber, '_model', None)
+    monkeypatch.setattr(transcriber, '_model_params', None)
+    monkeypatch.setattr(speaker_diarizer, 'get_reference_store', lambda *a, **k: None)
+    monkeypatch.setattr(speaker_diarizer, 'identify_speakers',
+                        lambda name, segments, config, audio=None:
+                        "\n".join(f"Спикер: {s['text']}" for s in segments))
+    servers = []
+
+    def start(**sc):
+        config = {'transcription': {'engine': 'fake', 'vad': {'enabled': False},
+                                    'service': dict({'batch_wait_seconds': 0.5}, **sc)}}
+        httpd = make_server(config, '127.0.0.1', 0)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        host, port = httpd.server_address[:2]
+        config['transcription']['service']['url'] = f"http://{host}:{port}"
+        config['transcription']['service']['poll_seconds'] = 0.1
+        return httpd, config
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+        httpd.service.stop()
+
+
+def _clip(path, level, seconds=2.0):
+    sf.write(str(path), np.full(int(seconds * SAMPLE_RATE), level, dtype=np.float32),
+             SAMPLE_RATE, subtype='FLOAT')
+    return str(path)
+
+
+def test_concurrent_clips_are_batched(service, tmp_path):
+    httpd, config = service()
+    httpd.service.start()
+    files = [_clip(tmp_path / "a.wav", 0.3), _clip(tmp_path / "b.wav", 0.6)]
+    results = {}
+
+    def run(path):
+        results[path] = transcribe_service(path, config)
+
+    threads = [threading.Thread(target=run, args=(f,)) for f in files]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+
+    assert results[files[0]]['text'] == "Спикер: level 0.3"
+    assert results[files[1]]['text'] == "Спикер: level 0.6"
+    for r in results.values():
+        assert r['status'] == 'done'
+        assert r['segments'][0]['start'] == 0.0
+        assert r['segments'][0]['end'] == pytest.approx(2.0)
+    status = get_status(config)
+    assert status['completed'] == 2
+    assert status['batches'] == 1 and status['batched_jobs'] == 2
+    assert transcriber._model.calls == 1
+
+
+def test_queue_limited_by_audio_seconds(service, tmp_path):
+    # обработчик не запущен — задачи остаются в очереди
+    httpd, config = service(max_queued_seconds=5)
+    config['transcription']['service']['submit_timeout'] = 0
+    httpd.service.submit("a.wav", np.full(3 * SAMPLE_RATE, 0.3, dtype=np.float32))
+    second = _clip(tmp_path / "b.wav", 0.6, seconds=3)
+    too_long = _clip(tmp_path / "c.wav", 0.9, seconds=6)
+
+    with pytest.raises(ServiceError, match="queue is full"):
+        transcribe_service(second, config)
+    with pytest.raises(ServiceError, match="limit"):
+        transcribe_service(too_long, config)
+
+    status = get_status(config)
+    assert status['queue_depth'] == 1
+    assert status['held_audio_seconds'] == 3.0
+    assert status['rejected'] == 1
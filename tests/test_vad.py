@@ -0,0 +1,66 @@
+# tests/test_vad.py
+
+import numpy as np
+import pytest
+
+from core.vad import speech_regions, SpeechMap
+
+SR = 16000
+
+
+def _tone(seconds, amplitude):
+    t = np.arange(int(seconds * SR)) / SR
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_regions_skip_long_silence():
+    audio = np.concatenate([_tone(2, 0.3), np.zeros(3 * SR, np.float32), _tone(1, 0.3)])
+    regions = speech_regions(audio, SR, padding=0.0)
+
+    assert len(regions) == 2
+    (s1, e1), (s2, e2) = regions
+    assert s1 == 0 and abs(e1 - 2 * SR) < 0.05 * SR
+    assert abs(s2 - 5 * SR) < 0.05 * SR and e2 == len(audio)
+
+
+def test_regions_merge_short_pauses():
+    audio = np.concatenate([_tone(1, 0.3), np.zeros(int(0.3 * SR), np.float32), _tone(1, 0.3),
+                            np.zeros(2 * SR, np.float32)])
+    assert len(speech_regions(audio, SR, padding=0.0)) == 1
+
+
+@pytest.mark.parametrize('audio', [
+    np.full(5 * SR, 0.1, dtype=np.float32),   # без пауз
+    _tone(5, 0.3),
+    np.zeros(5 * SR, dtype=np.float32),       # участков не найдено
+])
+def test_regions_fall_back_to_whole_signal(audio):
+    assert speech_regions(audio, SR) == [(0, len(audio))]
+
+
+def test_speech_map_round_trip():
+    audio = np.arange(10 * SR, dtype=np.float32)
+    speech_map = SpeechMap([(1 * SR, 3 * SR), (6 * SR, 7 * SR)], SR)
+
+    speech = speech_map.extract(audio)
+    assert len(speech) == speech_map.speech_samples == 3 * SR
+    assert speech[0] == 1 * SR and speech[2 * SR] == 6 * SR
+
+    assert speech_map.to_original(0.0) == 1.0
+    assert speech_map.to_original(0.5) == 1.5
+    assert speech_map.to_original(2.5) == 6.5
+    # за концом склейки — конец последнего участка
+    assert speech_map.to_original(5.0) == 7.0
+
+
+def test_speech_map_boundary_maps_to_previous_region_end():
+    speech_map = SpeechMap([(1 * SR, 3 * SR), (6 * SR, 7 * SR)], SR)
+    # конец сегмента ровно на стыке не должен перескакивать на начало следующего участка
+    assert speech_map.to_original(2.0) == 3.0
+    assert speech_map.to_original(2.0 + 1 / SR) == pytest.approx(6.0 + 1 / SR)
+
+
+def test_speech_map_empty_is_identity():
+    speech_map = SpeechMap([], SR)
+    assert speech_map.to_original(1.25) == 1.25
+    assert len(speech_map.extract(np.ones(10))) == 0
@@ -0,0 +1,139 @@
+# ui/batch.py
+"""
+Пакетная обработка записей без GUI:
+
+    python -m ui.batch recordings/ archive/2023/*.wav --workers 4 --report report.json
+
+Для каждого WAV (или манифеста сегментированной записи): транскрипция → диаризация → выжимка → сохранение .txt.
+Уже обработанные файлы пропускаются, поэтому прерванный прогон можно
+просто запустить заново.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.config_loader import load_config
+from core.logger_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+_config = None
+
+
+def collect_files(inputs):
+    """
+    WAV-файлы и манифесты сегментированных записей (.json); сегменты
+    таких записей по отдельности не обрабатываются.
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(glob.glob(os.path.join(item, "**", "*.wav"), recursive=True))
+            files.extend(glob.glob(os.path.join(item, "**", "*.json"), recursive=True))
+        else:
+            files.extend(glob.glob(item, recursive=True))
+    files = set(os.path.abspath(f) for f in files)
+    # манифест — .json рядом с одноимённой папкой сегментов
+    segment_dirs = {os.path.splitext(f)[0] for f in files
+                    if f.endswith(".json") and os.path.isdir(os.path.splitext(f)[0])}
+    return sorted(f for f in files
+                  if os.path.dirname(f) not in segment_dirs
+                  and (not f.endswith(".json") or os.path.splitext(f)[0] in segment_dirs))
+
+
+def default_workers():
+    # Whisper сам использует несколько потоков — держим ~4 ядра на процесс
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+def _init_worker(config_path, threads):
+    """
+    Инициализация процесса пула: логирование, конфиг и прогрев моделей,
+    чтобы все файлы этого процесса использовали одну загруженную модель.
+    """
+    global _config
+    setup_logging()
+    _config = load_config(config_path)
+
+    # потоки движка распознавания — как у torch: поровну между процессами
+    tc = _config.setdefault('transcription', {})
+    tc['threads'] = threads
+    if tc.get('mode', 'offline') == 'service':
+        # модели загружены в сервисе — torch в процессе не нужен
+        return
+
+    import torch
+    torch.set_num_threads(threads)
+
+    if tc.get('mode', 'offline') == 'offline':
+        from core.transcriber import load_engine
+        load_engine(_config)
+    from core.speaker_diarizer import get_encoder
+    get_encoder()
+
+
+def _run_one(path, summarize, prompt_text):
+    from core.pipeline import process_file
+    t0 = time.perf_counter()
+    try:
+        return process_file(path, _config, summarize, prompt_text)
+    except Exception as e:
+        logger.exception(f"Failed to process {path}")
+        return {'file': path, 'status': 'error', 'error': str(e),
+                'timings': {'total': time.perf_counter() - t0}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная обработка записей совещаний")
+    parser.add_argument('inputs', nargs='+', help="папки или glob-шаблоны с WAV")
+    parser.add_argument('--config', default='config/settings.yaml')
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument('--prompt', help="идентификатор промпта из секции prompts")
+    parser.add_argument('--no-summary', action='store_true', help="не делать выжимку GPT")
+    parser.add_argument('--report', help="сохранить отчёт по времени в JSON")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    config = load_config(args.config)
+    summarize = not args.no_summary
+    prompt_text = config.get('prompts', {}).get(args.prompt) if args.prompt else None
+
+    from core.pipeline import is_processed
+    files = collect_files(args.inputs)
+    todo = [f for f in files if not is_processed(f, config, summarize)]
+    logger.info(f"Batch: {len(files)} files, {len(files) - len(todo)} already processed, "
+                f"{len(todo)} to do, {args.workers} workers")
+
+    reports = []
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    t0 = time.perf_counter()
+    if todo:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(args.config, threads)) as pool:
+            futures = [pool.submit(_run_one, f, summarize, prompt_text) for f in todo]
+            for fut in as_completed(futures):
+                rep = fut.result()
+                reports.append(rep)
+                print(f"{rep['status']:5}  {rep['timings'].get('total', 0):8.1f}s  {rep['file']}")
+    wall = time.perf_counter() - t0
+
+    failed = [r for r in reports if r['status'] != 'done']
+    audio = sum(r.get('audio_seconds') or 0 for r in reports)
+    print(f"Done: {len(reports) - len(failed)} ok, {len(failed)} failed, "
+          f"{len(files) - len(todo)} skipped, wall {wall:.1f}s, audio {audio:.0f}s")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'wall_seconds': wall, 'workers': args.workers, 'files': reports},
+                      f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
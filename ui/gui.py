@@ -6,11 +6,24 @@ from tkinter import ttk
 import threading
 import sounddevice as sd
 import os
-from core.transcriber import transcribe_audio
 from core.email_sender import send_report_email
+from core.jobs import JobRunner
+from core.gpt_summary import is_summary_error
+from core.search_index import get_search_index, index_transcript, format_result
 import datetime
 import json
 
+# Названия этапов конвейера для строки состояния
+STAGE_NAMES = {
+    'transcribe': 'Распознавание',
+    'upload': 'Отправка в Whisper API',
+    'diarize': 'Определение говорящих',
+    'live': 'Обработка последнего фрагмента',
+    'summary': 'Выжимка GPT',
+    'index': 'Обновление поискового индекса',
+    'queue': 'В очереди сервиса транскрипции',
+}
+
 class VirtualSecretaryGUI:
     def __init__(self, config, gpt_summary_fn, recorder):
         self.config = config
@@ -19,6 +32,13 @@ class VirtualSecretaryGUI:
         self.transcript_text = ""
         self.summary_text = ""
         self.email_selections = {}
+        self.live = None
+        self._segment_job = None
+        # Фоновые задачи: распознавание и GPT не блокируют окно
+        self.jobs = JobRunner(workers=1)
+        self._job_handlers = {}
+        self._token_handlers = {}
+        self._streaming_job = None
 
         self.root = tk.Tk()
         self.root.title("Виртуальный Секретарь")
@@ -38,6 +58,8 @@ class VirtualSecretaryGUI:
             width=40
         )
         self.prompt_combo.grid(row=0, column=1, padx=(5,0))
+        self.no_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(prompt_frame, text="Без кэша", variable=self.no_cache_var).grid(row=0, column=2, padx=(10,0))
 
         # --- выбор микрофона ---
         self.device_blacklist = [b.lower() for b in self.config.get('audio', {}).get(
@@ -49,6 +71,15 @@ class VirtualSecretaryGUI:
         self.text_display = scrolledtext.ScrolledText(self.root, wrap=tk.WORD, height=25)
         self.text_display.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
 
+        # --- строка состояния фоновых задач ---
+        status_frame = tk.Frame(self.root)
+        status_frame.pack(fill=tk.X, padx=10)
+        self.status_var = tk.StringVar(value="Готово")
+        ttk.Label(status_frame, textvariable=self.status_var).pack(side=tk.LEFT)
+        tk.Button(status_frame, text="Отмена", command=self.cancel_jobs).pack(side=tk.RIGHT)
+        self.progress_bar = ttk.Progressbar(status_frame, length=200, maximum=100)
+        self.progress_bar.pack(side=tk.RIGHT, padx=5)
+
         # --- панель кнопок ---
         btn_frame = tk.Frame(self.root)
         btn_frame.pack(pady=10)
@@ -60,6 +91,10 @@ class VirtualSecretaryGUI:
         tk.Button(btn_frame, text="Выжимка (GPT)", command=self.generate_summary).grid(row=0, column=4, padx=5)
         tk.Button(btn_frame, text="Сохранить отчёт", command=self.save_report).grid(row=0, column=5, padx=5)
         tk.Button(btn_frame, text="Отправить Email", command=self.open_recipient_selection).grid(row=0, column=6, padx=5)
+        tk.Button(btn_frame, text="Поиск", command=self.open_search).grid(row=0, column=7, padx=5)
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(100, self._poll_jobs)
 
     def setup_device_selector(self):
         df = tk.Frame(self.root)
@@ -100,6 +135,131 @@ class VirtualSecretaryGUI:
     def run(self):
         self.root.mainloop()
 
+    def on_close(self):
+        self.jobs.shutdown()
+        self.root.destroy()
+
+    # --- фоновые задачи ---
+
+    def submit_job(self, name, fn, on_done, *args, dedicated=False):
+        """
+        Ставит fn(job, *args) в очередь фоновых задач; on_done(result)
+        вызывается в UI-потоке после успешного завершения.
+        dedicated=True — задача в отдельном потоке вне очереди.
+        """
+        if dedicated:
+            job = self.jobs.submit_dedicated(name, fn, *args)
+        else:
+            job = self.jobs.submit(name, fn, *args)
+        self._job_handlers[job.id] = on_done
+        self._update_status()
+        return job
+
+    def cancel_jobs(self):
+        self.jobs.cancel_all()
+        self.status_var.set("Отмена…")
+
+    def _poll_jobs(self):
+        # фрагменты потокового вывода одной задачи за опрос склеиваются
+        # в одну вставку, чтобы не перерисовывать текст на каждый токен
+        tokens = {}
+        for kind, job, data in self.jobs.poll():
+            if kind == 'tokens':
+                tokens.setdefault(job.id, []).append(data)
+                continue
+            self._flush_tokens(tokens)
+            if kind in ('started', 'progress'):
+                self._show_progress(job)
+            elif kind == 'segments':
+                self._append_segments(job, data)
+            elif kind == 'done':
+                self._token_handlers.pop(job.id, None)
+                handler = self._job_handlers.pop(job.id, None)
+                if handler is not None:
+                    handler(data)
+            elif kind == 'error':
+                self._job_handlers.pop(job.id, None)
+                self._token_handlers.pop(job.id, None)
+                messagebox.showerror("Ошибка", f"{job.name}: {data}")
+            elif kind == 'cancelled':
+                self._job_handlers.pop(job.id, None)
+                self._token_handlers.pop(job.id, None)
+            if kind in ('done', 'error', 'cancelled'):
+                if self._streaming_job == job.id:
+                    self._streaming_job = None
+                self._update_status()
+        self._flush_tokens(tokens)
+        self.root.after(100, self._poll_jobs)
+
+    def _flush_tokens(self, tokens):
+        for job_id, parts in tokens.items():
+            handler = self._token_handlers.get(job_id)
+            if handler is not None:
+                handler("".join(parts))
+        tokens.clear()
+
+    def _show_progress(self, job):
+        stage = STAGE_NAMES.get(job.stage, job.stage or "Запуск")
+        queued = sum(1 for j in self.jobs.pending() if j.status == 'queued')
+        text = f"{job.name} — {stage}"
+        if job.fraction is not None:
+            text += f" ({job.fraction:.0%})"
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate', value=job.fraction * 100)
+        else:
+            self.progress_bar.configure(mode='indeterminate')
+            self.progress_bar.start(50)
+        if queued > 0:
+            text += f", в очереди: {queued}"
+        self.status_var.set(text)
+
+    def _update_status(self):
+        pending = self.jobs.pending()
+        if not pending:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate', value=0)
+            self.status_var.set("Готово")
+        else:
+            self.status_var.set(f"Задач в очереди: {len(pending)}")
+
+    def _append_segments(self, job, segments):
+        # Сегменты распознавания выводятся по мере готовности; имена
+        # говорящих появятся после диаризации, когда текст заменится целиком
+        from core.speaker_diarizer import format_timestamp
+        if self._streaming_job != job.id:
+            self._streaming_job = job.id
+            self.text_display.delete(1.0, tk.END)
+        for seg in segments:
+            line = f"[{format_timestamp(seg['start'])}] {seg.get('text', '').strip()}\n"
+            self.text_display.insert(tk.END, line)
+        self.text_display.see(tk.END)
+
+    def _transcribe_job(self, job, path):
+        from core.transcriber import transcribe_audio
+        text = transcribe_audio(path, self.config, progress=job.progress)
+        return self._save_transcript(path, text)
+
+    def _live_finish_job(self, job, live, wav):
+        job.progress('live')
+        return self._save_transcript(wav, live.finish())
+
+    def _save_transcript(self, audio_path, text):
+        txt_path = os.path.splitext(audio_path)[0] + ".txt"
+        try:
+            with open(txt_path, 'w', encoding='utf-8') as tf:
+                tf.write(text)
+        except Exception as e:
+            return text, e
+        index_transcript(txt_path, text, self.config)
+        return text, None
+
+    def _show_transcript(self, result):
+        self.transcript_text, save_error = result
+        self.text_display.delete(1.0, tk.END)
+        self.text_display.insert(tk.END, self.transcript_text)
+        if save_error is not None:
+            messagebox.showwarning("Сохранение транскрипта", f"Не удалось сохранить файл транскрипта: {save_error}")
+
     def load_transcript(self):
         path = filedialog.askopenfilename(filetypes=[("Text Files","*.txt")])
         if not path:
@@ -109,39 +269,114 @@ class VirtualSecretaryGUI:
         self.text_display.delete(1.0, tk.END)
         self.text_display.insert(tk.END, self.transcript_text)
 
-    def load_audio_file(self):
-        path = filedialog.askopenfilename(filetypes=[("Audio Files","*.wav"), ("All Files","*.*")])
-        if not path:
+    def open_search(self):
+        """
+        Окно поиска по всем стенограммам (core.search_index). Перед первым
+        запросом индекс досинхронизируется с папкой записей в фоне.
+        """
+        index = get_search_index(self.config)
+        if index is None:
+            messagebox.showwarning("Поиск", "Поиск выключен в настройках (search.enabled).")
             return
+        win = tk.Toplevel(self.root)
+        win.title("Поиск по стенограммам")
+        win.geometry("820x450")
+        top = tk.Frame(win)
+        top.pack(fill=tk.X, padx=10, pady=(10, 0))
+        query_var = tk.StringVar()
+        entry = ttk.Entry(top, textvariable=query_var, width=70)
+        entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Label(win, text="Пример: бюджет* speaker:Алиса quarter:2024Q3",
+                  foreground="gray").pack(anchor="w", padx=10)
+        results = tk.Listbox(win)
+        results.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        found = []
+
+        def run_search(event=None):
+            try:
+                rows = index.query(query_var.get())
+            except ValueError as e:
+                messagebox.showwarning("Поиск", str(e), parent=win)
+                return
+            found[:] = rows
+            results.delete(0, tk.END)
+            for row in rows:
+                results.insert(tk.END, format_result(row))
+
+        def open_result(event=None):
+            sel = results.curselection()
+            if sel:
+                self._show_search_result(found[sel[0]])
+
+        tk.Button(top, text="Найти", command=run_search).pack(side=tk.LEFT, padx=(5, 0))
+        entry.bind("<Return>", run_search)
+        results.bind("<Double-Button-1>", open_result)
+        entry.focus_set()
+        sources = self.config.get('search', {}).get('transcripts_dir', 'recordings')
+        self.submit_job("Поисковый индекс", lambda job: (job.progress('index'), index.refresh(sources)),
+                        lambda result: None)
+
+    def _show_search_result(self, row):
         try:
-            self.transcript_text = transcribe_audio(path, self.config)
-            self.text_display.delete(1.0, tk.END)
-            self.text_display.insert(tk.END, self.transcript_text)
-            txt_path = os.path.splitext(path)[0] + ".txt"
-            with open(txt_path, 'w', encoding='utf-8') as tf:
-                tf.write(self.transcript_text)
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось обработать аудио: {e}")
+            with open(row['path'], 'r', encoding='utf-8') as f:
+                self.transcript_text = f.read()
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось открыть {row['path']}: {e}")
+            return
+        self.text_display.delete(1.0, tk.END)
+        self.text_display.insert(tk.END, self.transcript_text)
+        line = f"{row['line_no']}.0"
+        self.text_display.tag_remove("found", 1.0, tk.END)
+        self.text_display.tag_add("found", line, f"{line} lineend")
+        self.text_display.tag_configure("found", background="yellow")
+        self.text_display.see(line)
+
+    def load_audio_file(self):
+        # можно выбрать несколько файлов — они встанут в очередь
+        paths = filedialog.askopenfilenames(filetypes=[("Audio Files","*.wav"),
+                                                       ("Segmented Recordings","*.json"),
+                                                       ("All Files","*.*")])
+        for path in paths:
+            self.submit_job(os.path.basename(path), self._transcribe_job, self._show_transcript, path)
 
     def start_recording(self):
         sel = self.device_var.get()
         if sel:
             idx = int(sel.split(" — ")[0])
             self.recorder.device = idx
-        threading.Thread(target=self.recorder.start_recording).start()
+        # Живая транскрипция по фрагментам (только локальный Whisper)
+        tc = self.config.get('transcription', {})
+        if tc.get('live', False) and tc.get('mode', 'offline') == 'offline':
+            from core.live_transcriber import LiveTranscriber
+            self.live = LiveTranscriber(self.config)
+            self.live.attach(self.recorder)
+        else:
+            self.live = None
+            self.recorder.set_chunk_listener(None)
+        if self.recorder.segment_seconds and self.live is None:
+            # Сегментированная запись: распознавание готовых сегментов
+            # начинается сразу, не дожидаясь конца записи. Задача идёт всё
+            # совещание — в своём потоке, чтобы выжимка, открытие файлов
+            # и поиск не ждали за ней
+            self.recorder.start_recording()
+            path = self.recorder.filepath
+            self._segment_job = self.submit_job(os.path.basename(path), self._transcribe_job,
+                                                self._show_transcript, path, dedicated=True)
+        else:
+            threading.Thread(target=self.recorder.start_recording).start()
         messagebox.showinfo("Запись","Запись началась.")
 
     def stop_recording(self):
         wav = self.recorder.stop_recording()
-        self.transcript_text = transcribe_audio(wav, self.config)
-        self.text_display.delete(1.0, tk.END)
-        self.text_display.insert(tk.END, self.transcript_text)
-        txt_path = os.path.splitext(wav)[0] + ".txt"
-        try:
-            with open(txt_path, 'w', encoding='utf-8') as tf:
-                tf.write(self.transcript_text)
-        except Exception as e:
-            messagebox.showwarning("Сохранение транскрипта", f"Не удалось сохранить файл транскрипта: {e}")
+        name = os.path.basename(wav)
+        if self._segment_job is not None:
+            # задача уже идёт и завершится после последнего сегмента
+            self._segment_job = None
+        elif self.live is not None:
+            self.submit_job(name, self._live_finish_job, self._show_transcript, self.live, wav)
+            self.live = None
+        else:
+            self.submit_job(name, self._transcribe_job, self._show_transcript, wav)
 
     def generate_summary(self):
         if not self.transcript_text.strip():
@@ -150,8 +385,33 @@ class VirtualSecretaryGUI:
         # выбираем нужный промпт по идентификатору
         prompt_id = self.prompt_var.get()
         prompt_text = self.config.get('prompts', {}).get(prompt_id, None)
-        self.summary_text = self.gpt_summary_fn(self.transcript_text, self.config, prompt_text)
-        self.text_display.insert(tk.END, f"\n\n--- Выжимка ({prompt_id}) ---\n{self.summary_text}")
+        transcript = self.transcript_text
+        use_cache = not self.no_cache_var.get()
+
+        streamed = []
+
+        def run(job):
+            job.progress('summary')
+            return self.gpt_summary_fn(transcript, self.config, prompt_text, use_cache=use_cache,
+                                       on_token=job.tokens)
+
+        def show_tokens(text):
+            # токены выжимки по мере генерации (склеенные за один опрос)
+            if not streamed:
+                self.text_display.insert(tk.END, f"\n\n--- Выжимка ({prompt_id}) ---\n")
+            streamed.append(text)
+            self.text_display.insert(tk.END, text)
+            self.text_display.see(tk.END)
+
+        def show(summary):
+            self.summary_text = summary
+            if not streamed:
+                self.text_display.insert(tk.END, f"\n\n--- Выжимка ({prompt_id}) ---\n{self.summary_text}")
+            elif is_summary_error(summary):
+                self.text_display.insert(tk.END, f"\n{summary}")
+
+        job = self.submit_job(f"Выжимка ({prompt_id})", run, show)
+        self._token_handlers[job.id] = show_tokens
 
     def save_report(self):
         if not self.transcript_text:
@@ -1,13 +1,44 @@
+import time
+_T0 = time.perf_counter()
+
+import sys
+import json
 from ui.gui import VirtualSecretaryGUI
 from core.config_loader import load_config
 from core.gpt_summary import generate_summary
 from core.recorder import AudioRecorder
 from core.logger_setup import setup_logging
+from core.warmup import start_warmup
 setup_logging()
 
 
+def measure_startup(config_path='config/settings.yaml'):
+    """
+    Время запуска: импорт модулей и показ окна (до первой отрисовки).
+    Окно сразу закрывается; удобно запускать в отдельном процессе:
+        python -m ui.main --measure-startup
+    """
+    t_imports = time.perf_counter() - _T0
+    cfg = load_config(config_path)
+    app = VirtualSecretaryGUI(cfg, generate_summary, AudioRecorder())
+    app.root.update()
+    t_window = time.perf_counter() - _T0
+    app.root.destroy()
+    return {'import_seconds': round(t_imports, 3), 'window_seconds': round(t_window, 3)}
+
+
 if __name__=='__main__':
+    if '--measure-startup' in sys.argv:
+        print(json.dumps(measure_startup()))
+        sys.exit(0)
+
     cfg = load_config('config/settings.yaml')
-    rec = AudioRecorder()
+    ac = cfg.get('audio', {})
+    rec = AudioRecorder(capture_mode=ac.get('capture_mode', 'ring'),
+                        ring_seconds=ac.get('ring_seconds', 60.0),
+                        write_block_seconds=ac.get('write_block_seconds', 1.0),
+                        segment_seconds=ac.get('segment_seconds', 0),
+                        compress_segments=ac.get('compress_segments', True))
     app = VirtualSecretaryGUI(cfg, generate_summary, rec)
+    start_warmup(cfg)
     app.run()